@@ -0,0 +1 @@
+"""GUI-free helpers used by the SSH VPN Manager"""
@@ -0,0 +1,5 @@
+import sys
+
+from sshvpn.cli import main
+
+sys.exit(main())
@@ -0,0 +1,119 @@
+"""Shared asyncio loop running next to the GUI main loop"""
+import asyncio
+import subprocess
+import threading
+
+
+class BackgroundLoop:
+    """One asyncio event loop on a dedicated daemon thread
+
+    Coroutines are submitted from any thread and return
+    concurrent.futures.Future objects, so the caller never blocks unless
+    it asks for the result.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name='sshvpn-loop', daemon=True)
+        self.tasks = set()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, coro, on_error=None):
+        """Schedule a coroutine on the loop and return its future
+
+        on_error, if given, is called with any exception the coroutine
+        raises other than cancellation.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._track(coro), self.loop)
+        if on_error is not None:
+            def report(done):
+                if not done.cancelled() and done.exception() is not None:
+                    on_error(done.exception())
+            future.add_done_callback(report)
+        return future
+
+    async def _track(self, coro):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            return await coro
+        finally:
+            self.tasks.discard(task)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and wait for its result (not from the loop thread)"""
+        return self.submit(coro).result(timeout)
+
+    async def _shutdown(self):
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self, timeout=5):
+        """Cancel outstanding tasks, wait for them to unwind and stop the loop"""
+        if self.loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(5)
+
+
+async def run_command(cmd, timeout=10, check=False, input=None, env=None):
+    """Run a short-lived command without blocking the loop
+
+    Returns a subprocess.CompletedProcess with text output. The child is
+    killed on timeout (raising subprocess.TimeoutExpired) or cancellation.
+    FileNotFoundError propagates if the program does not exist.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env)
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(input.encode() if input is not None else None), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    result = subprocess.CompletedProcess(cmd, process.returncode,
+                                         stdout.decode(errors='replace'), stderr.decode(errors='replace'))
+    if check:
+        result.check_returncode()
+    return result
+
+
+async def gather_all(coros):
+    """Run coroutines as one structured group; a failure cancels the rest
+
+    Uses asyncio.TaskGroup where available (Python 3.11+).
+    """
+    if hasattr(asyncio, 'TaskGroup'):
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(coro) for coro in coros]
+        return [task.result() for task in tasks]
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
@@ -0,0 +1,163 @@
+"""SSH authentication for tunnels without sshpass
+
+Passwords and key passphrases reach ssh through SSH_ASKPASS: a tiny
+helper prints the secret from its environment, so it never appears in
+argv, the process list or the "Executing:" log line, and ssh runs
+without a wrapper process. Key files and ssh-agent skip the password
+round trip entirely and run ssh in BatchMode.
+"""
+import os
+import shlex
+import subprocess
+import sys
+
+from sshvpn import tools
+
+PASSWORD = 'password'
+KEY = 'key'
+AGENT = 'agent'
+METHODS = [PASSWORD, KEY, AGENT]
+
+SECRET_ENV = 'SSH_VPN_SECRET'
+DEFAULT_KEY_FILE = os.path.join(os.path.expanduser('~'), '.ssh', 'ssh_vpn_ed25519')
+
+ASKPASS_SCRIPT = '''#!{python}
+import os, sys
+prompt = sys.argv[1].lower() if len(sys.argv) > 1 else ''
+# Only answer secret prompts; refuse host key and other confirmations
+if 'password' in prompt or 'passphrase' in prompt or not prompt:
+    sys.stdout.write(os.environ.get('{env}', '') + '\\n')
+else:
+    sys.exit(1)
+'''
+
+
+def askpass_path():
+    """Return the askpass helper, writing it on first use"""
+    directory = os.path.join(os.path.expanduser('~'), '.ssh-vpn')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if sys.platform == 'win32':
+        path = os.path.join(directory, 'askpass.cmd')
+        content = f'@"{sys.executable}" -c "import os;print(os.environ.get(\'{SECRET_ENV}\',\'\'))"\r\n'
+    else:
+        path = os.path.join(directory, 'askpass')
+        content = ASKPASS_SCRIPT.format(python=sys.executable, env=SECRET_ENV)
+    try:
+        with open(path, encoding='utf-8') as f:
+            if f.read() == content:
+                return path
+    except OSError:
+        pass
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.chmod(path, 0o700)
+    return path
+
+
+class Credentials:
+    """How one saved VPN authenticates: password, key file or ssh-agent"""
+
+    def __init__(self, method=PASSWORD, password='', key_file=None):
+        if method not in METHODS:
+            raise ValueError(f"unknown auth method '{method}' (choose from {', '.join(METHODS)})")
+        self.method = method
+        self.password = password or ''
+        self.key_file = os.path.expanduser(key_file) if key_file else None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build credentials from a saved VPN; configs without auth_method use the password"""
+        method = config.get('auth_method') or (KEY if config.get('key_file') else PASSWORD)
+        return cls(method, config.get('password', ''), config.get('key_file'))
+
+    def __repr__(self):
+        return f"Credentials({self.method!r}, key_file={self.key_file!r})"
+
+    def validate(self):
+        """Raise ValueError if the credentials cannot work"""
+        if self.method == KEY:
+            if not self.key_file:
+                raise ValueError("key authentication needs a key file")
+            if not os.path.isfile(self.key_file):
+                raise ValueError(f"key file not found: {self.key_file}")
+        elif self.method == AGENT and not os.environ.get('SSH_AUTH_SOCK') and sys.platform != 'win32':
+            raise ValueError("ssh-agent authentication needs SSH_AUTH_SOCK")
+        elif self.method == PASSWORD and not self.password:
+            raise ValueError("password authentication needs a password")
+
+    def ssh_args(self):
+        """ssh options for this method (no secrets)"""
+        if self.method == PASSWORD:
+            return ['-o', 'PreferredAuthentications=password,keyboard-interactive',
+                    '-o', 'NumberOfPasswordPrompts=1']
+        args = ['-o', 'PreferredAuthentications=publickey']
+        if self.method == KEY:
+            args += ['-i', self.key_file, '-o', 'IdentitiesOnly=yes']
+        if not self.password:
+            # Nothing can be typed in, so fail at once instead of prompting
+            args += ['-o', 'BatchMode=yes']
+        return args
+
+    def env(self):
+        """Environment for the ssh child, or None to inherit as is"""
+        if not self.password:
+            return None
+        env = dict(os.environ)
+        env[SECRET_ENV] = self.password
+        env['SSH_ASKPASS'] = askpass_path()
+        env['SSH_ASKPASS_REQUIRE'] = 'force'
+        # OpenSSH before 8.4 only uses askpass when DISPLAY is set and there is no tty
+        env.setdefault('DISPLAY', ':0')
+        return env
+
+
+def public_key(key_file):
+    with open(key_file + '.pub', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def ensure_key(key_file=DEFAULT_KEY_FILE):
+    """Create an ed25519 key pair unless key_file already exists"""
+    if os.path.exists(key_file):
+        return key_file
+    os.makedirs(os.path.dirname(key_file), mode=0o700, exist_ok=True)
+    result = subprocess.run(['ssh-keygen', '-t', 'ed25519', '-N', '', '-C', 'ssh-vpn-manager',
+                             '-f', key_file], capture_output=True, text=True, timeout=30)
+    if result.returncode != 0:
+        raise RuntimeError(f"ssh-keygen failed: {result.stderr.strip()}")
+    return key_file
+
+
+def install_key(ip, port, username, password, ssh_options='', key_file=None, timeout=30):
+    """Append our public key to the server's authorized_keys using the password once
+
+    Returns the key file, after checking that a key-only login works.
+    Raises RuntimeError on failure.
+    """
+    key_file = ensure_key(key_file or DEFAULT_KEY_FILE)
+    login = Credentials(PASSWORD, password)
+    target = ['-p', str(port), f"{username}@{ip}"]
+    remote = ('umask 077; mkdir -p ~/.ssh && touch ~/.ssh/authorized_keys && '
+              'k="$(cat)"; grep -qxF "$k" ~/.ssh/authorized_keys || echo "$k" >> ~/.ssh/authorized_keys')
+    result = subprocess.run(
+        ['ssh', *login.ssh_args(), *shlex.split(ssh_options), *target, remote],
+        input=public_key(key_file) + '\n', env=login.env(), capture_output=True, text=True,
+        timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"could not install key: {result.stderr.strip() or result.returncode}")
+    check = Credentials(KEY, key_file=key_file)
+    result = subprocess.run(['ssh', *check.ssh_args(), *shlex.split(ssh_options), *target, 'true'],
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"key installed but key login failed: {result.stderr.strip()}")
+    return key_file
+
+
+def agent_available():
+    """True if an ssh-agent is reachable and holds at least one key"""
+    if not tools.default_registry.available('ssh-add'):
+        return False
+    try:
+        return subprocess.run(['ssh-add', '-l'], capture_output=True, timeout=5).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
@@ -0,0 +1,262 @@
+"""Throughput and latency benchmark for tunnels
+
+Starts a tunnel with the same command construction as the app, then
+drives bulk transfers and short request/response exchanges through its
+SOCKS port to a local echo/sink server and prints the results as JSON.
+
+Run it offline against a loopback sshd, for example:
+
+    python -m sshvpn.benchmark --host 127.0.0.1 --user me --password secret \
+        --ssh-options "-o StrictHostKeyChecking=no -c aes128-gcm@openssh.com"
+
+The echo server listens on loopback, which the remote side of a loopback
+sshd reaches directly. Use --socks-port with --no-tunnel to measure a
+proxy that is already running, such as the load balancer.
+
+Pass --profiles bulk,interactive,mobile to benchmark each tuning profile
+in turn and report the best one for --goal.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import socket
+import struct
+import sys
+import time
+
+from sshvpn import auth, profiles, readiness, tunnel
+from sshvpn.probe import percentile
+
+CHUNK = 64 * 1024
+BULK = b'B'
+ECHO = b'E'
+
+
+async def handle_target(reader, writer):
+    """Echo/sink server: 'B' swallows a stream and reports its size, 'E' echoes"""
+    try:
+        mode = await reader.readexactly(1)
+        if mode == BULK:
+            total = 0
+            while True:
+                data = await reader.read(CHUNK)
+                if not data:
+                    break
+                total += len(data)
+            writer.write(struct.pack('!Q', total))
+        else:
+            while True:
+                data = await reader.read(CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+        # Cancelled when the suite shuts the server down with clients open
+        pass
+    finally:
+        writer.close()
+
+
+async def socks_open(socks_port, target_host, target_port, socks_host='127.0.0.1'):
+    """Open a connection to target through a SOCKS5 proxy"""
+    reader, writer = await asyncio.open_connection(socks_host, socks_port)
+    writer.write(b'\x05\x01\x00')
+    await writer.drain()
+    if await reader.readexactly(2) != b'\x05\x00':
+        raise ConnectionError("SOCKS5 greeting rejected")
+    address = socket.inet_aton(target_host)
+    writer.write(b'\x05\x01\x00\x01' + address + struct.pack('!H', target_port))
+    await writer.drain()
+    reply = await reader.readexactly(10)
+    if reply[1] != 0:
+        writer.close()
+        raise ConnectionError(f"SOCKS5 CONNECT failed with code {reply[1]}")
+    return reader, writer
+
+
+async def bench_bulk(socks_port, target, total_bytes, streams):
+    """Push total_bytes split over parallel streams; returns MB/s"""
+    per_stream = total_bytes // streams
+    payload = b'\0' * CHUNK
+
+    async def one_stream():
+        reader, writer = await socks_open(socks_port, *target)
+        writer.write(BULK)
+        sent = 0
+        while sent < per_stream:
+            chunk = payload[:min(CHUNK, per_stream - sent)]
+            writer.write(chunk)
+            await writer.drain()
+            sent += len(chunk)
+        writer.write_eof()
+        received = struct.unpack('!Q', await reader.readexactly(8))[0]
+        writer.close()
+        return received
+
+    start = time.perf_counter()
+    received = await asyncio.gather(*(one_stream() for _ in range(streams)))
+    elapsed = time.perf_counter() - start
+    return {
+        'bytes': sum(received),
+        'seconds': elapsed,
+        'mb_per_s': sum(received) / elapsed / 1e6,
+        'streams': streams,
+    }
+
+
+async def bench_requests(socks_port, target, count, concurrency, size):
+    """Open a fresh connection per request/response exchange"""
+    semaphore = asyncio.Semaphore(concurrency)
+    payload = b'x' * size
+    connect_times, ttfb, latencies = [], [], []
+    errors = 0
+
+    async def one_request():
+        nonlocal errors
+        async with semaphore:
+            try:
+                start = time.perf_counter()
+                reader, writer = await socks_open(socks_port, *target)
+                connected = time.perf_counter()
+                writer.write(ECHO + payload)
+                await writer.drain()
+                first = await reader.read(size)
+                first_byte = time.perf_counter()
+                received = len(first)
+                while received < size:
+                    data = await reader.read(size - received)
+                    if not data:
+                        raise ConnectionError("short echo")
+                    received += len(data)
+                done = time.perf_counter()
+                writer.close()
+            except (OSError, asyncio.IncompleteReadError):
+                errors += 1
+                return
+            connect_times.append(connected - start)
+            ttfb.append(first_byte - connected)
+            latencies.append(done - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(count)))
+    elapsed = time.perf_counter() - start
+
+    def ms(values, pct):
+        value = percentile(values, pct)
+        return None if value is None else value * 1000
+
+    return {
+        'requests': count,
+        'errors': errors,
+        'seconds': elapsed,
+        'connections_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'connect_p50_ms': ms(connect_times, 50),
+        'ttfb_p50_ms': ms(ttfb, 50),
+        'ttfb_p99_ms': ms(ttfb, 99),
+        'latency_p50_ms': ms(latencies, 50),
+        'latency_p99_ms': ms(latencies, 99),
+    }
+
+
+async def run_suite(socks_port, bulk_bytes, streams, requests, concurrency, size):
+    server = await asyncio.start_server(handle_target, '127.0.0.1', 0)
+    target = ('127.0.0.1', server.sockets[0].getsockname()[1])
+    try:
+        return {
+            'bulk': await bench_bulk(socks_port, target, bulk_bytes, streams),
+            'requests': await bench_requests(socks_port, target, requests, concurrency, size),
+        }
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def run_benchmark(args):
+    """Start the tunnel (unless --no-tunnel), run the suite and return a result dict"""
+    process = None
+    result = {
+        'host': args.host,
+        'socks_port': args.socks_port,
+        'ssh_options': args.ssh_options,
+    }
+    try:
+        if not args.no_tunnel:
+            credentials = auth.Credentials(args.auth_method, args.password, args.key_file)
+            cmd = tunnel.build_command(args.host, args.port, args.user, credentials,
+                                       args.ssh_options, tunnel.SSH_TUNNEL, args.socks_port)
+            process, _, result['time_to_ready'] = tunnel.launch(cmd, tunnel.SSH_TUNNEL,
+                                                               args.socks_port, args.deadline,
+                                                               env=credentials.env())
+        result.update(asyncio.run(run_suite(
+            args.socks_port, args.bulk_mb * 1024 * 1024, args.streams,
+            args.requests, args.concurrency, args.size)))
+    finally:
+        tunnel.terminate(process)
+    return result
+
+
+def select_profile(args, names, goal='balanced'):
+    """Benchmark each named profile and return (best name, {name: result})
+
+    Profiles that fail validation or whose tunnel does not come up are
+    reported with an 'error' and never selected.
+    """
+    results = {}
+    for name in names:
+        run_args = copy.copy(args)
+        try:
+            run_args.ssh_options = profiles.apply(args.ssh_options, name)
+            result = run_benchmark(run_args)
+        except (ValueError, OSError, readiness.TunnelNotReady) as e:
+            results[name] = {'error': str(e)}
+            continue
+        result['score'] = profiles.score(result, goal)
+        results[name] = result
+    scored = [name for name in results if 'score' in results[name]]
+    best = max(scored, key=lambda name: results[name]['score']) if scored else None
+    return best, results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m sshvpn.benchmark', description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--user', default='')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--auth-method', choices=auth.METHODS, default=auth.PASSWORD)
+    parser.add_argument('--key-file')
+    parser.add_argument('--ssh-options', default='-o StrictHostKeyChecking=no -o ServerAliveInterval=60')
+    parser.add_argument('--socks-port', type=int, default=1080)
+    parser.add_argument('--no-tunnel', action='store_true', help='use an already running SOCKS proxy')
+    parser.add_argument('--deadline', type=float, default=readiness.DEFAULT_DEADLINE)
+    parser.add_argument('--bulk-mb', type=int, default=64)
+    parser.add_argument('--streams', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--profiles', help='comma separated tuning profiles to compare')
+    parser.add_argument('--goal', choices=['throughput', 'latency', 'balanced'], default='balanced')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profiles:
+        best, results = select_profile(args, [p.strip() for p in args.profiles.split(',') if p.strip()],
+                                       args.goal)
+        print(json.dumps({'goal': args.goal, 'selected': best, 'results': results}, indent=2))
+        return 0 if best else 1
+    try:
+        result = run_benchmark(args)
+    except readiness.TunnelNotReady as e:
+        print(f"Tunnel failed: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""Headless command line and daemon entry point
+
+Only the modules a command needs are imported, and Kivy is imported only
+for the gui command, so the CLI starts quickly on machines without a
+display.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+def run_dir():
+    """Directory holding one state file per running daemon tunnel"""
+    path = os.path.join(os.path.expanduser('~'), '.ssh-vpn', 'run')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def state_path(name):
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+    return os.path.join(run_dir(), f"{safe}.json")
+
+
+def read_states():
+    states = []
+    for entry in sorted(os.listdir(run_dir())):
+        if not entry.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(run_dir(), entry), encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        state['file'] = os.path.join(run_dir(), entry)
+        states.append(state)
+    return states
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def cmd_connect(args):
+    """Bring up one or more saved VPNs in the foreground until interrupted"""
+    from concurrent.futures import ThreadPoolExecutor
+    from sshvpn import aioloop, config, dns, readiness, registry, supervisor
+
+    saved_vpns = config.load_vpns(args.config)
+    if args.socks_port and len(args.names) > 1:
+        print("--socks-port can only be used with a single VPN", file=sys.stderr)
+        return 2
+    connect_args = {}
+    for name in args.names:
+        if name not in saved_vpns:
+            print(f"No saved VPN named '{name}'", file=sys.stderr)
+            return 2
+        try:
+            connect_args[name] = config.connection_args(saved_vpns[name])
+        except ValueError as e:
+            print(f"Invalid config for '{name}': {e}", file=sys.stderr)
+            return 2
+        if args.socks_port:
+            connect_args[name]['socks_port'] = args.socks_port
+
+    stopping = []
+
+    def on_event(supervised, state, message):
+        print(f"[{supervised.name}] {state}{': ' + message if message else ''}", flush=True)
+        if state == supervisor.FAILED:
+            stopping.append(True)
+
+    tunnels = registry.TunnelRegistry()
+
+    def connect_one(name):
+        try:
+            return tunnels.connect(name, on_event=on_event, log=print, **connect_args[name])
+        except (ValueError, RuntimeError, readiness.TunnelNotReady) as e:
+            print(f"Connection to '{name}' failed: {e}", file=sys.stderr)
+            return None
+
+    # Tunnels come up in parallel; with keys or an agent no prompts get in the way
+    with ThreadPoolExecutor(max_workers=min(len(args.names), 16)) as pool:
+        records = dict(zip(args.names, pool.map(connect_one, args.names)))
+    if not all(records.values()):
+        tunnels.disconnect_all()
+        return 1
+
+    paths = []
+    for name, record in records.items():
+        state = {'name': name, 'pid': os.getpid(), 'socks_port': record.socks_port,
+                 'connection_type': record.connection_type, 'started': time.time()}
+        path = state_path(name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        paths.append(path)
+        print(f"Connected '{name}' in {record.time_to_ready:.2f}s"
+              + (f", SOCKS on 127.0.0.1:{record.socks_port}" if record.socks_port else ""), flush=True)
+
+    # One DNS cache, resolving through the first tunnel, if asked for here or in its "dns" section
+    loop = None
+    name = args.names[0]
+    stub = dns.stub_for(saved_vpns[name], records[name].socks_port, force=args.dns_cache)
+    if stub is not None:
+        if args.dns_port:
+            stub.port = args.dns_port
+        loop = aioloop.BackgroundLoop().start()
+        try:
+            loop.run(stub.start(), timeout=10)
+            print(f"DNS cache on {stub.address} via {stub.upstream.describe()} through '{name}'", flush=True)
+        except OSError as e:
+            print(f"DNS cache failed to start: {e}", file=sys.stderr)
+            stub = None
+
+    def handle_signal(signum, frame):
+        stopping.append(True)
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    try:
+        while not stopping:
+            time.sleep(0.5)
+    finally:
+        if stub is not None:
+            loop.run(stub.close(), timeout=5)
+        if loop is not None:
+            loop.stop()
+        tunnels.disconnect_all()
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+    print(f"Disconnected {', '.join(repr(name) for name in records)}")
+    return 0
+
+
+def cmd_status(args):
+    """List daemon tunnels and check that their SOCKS ports answer"""
+    from sshvpn import readiness
+
+    states = read_states()
+    if args.json:
+        for state in states:
+            state['alive'] = pid_alive(state['pid'])
+        print(json.dumps(states, indent=2))
+        return 0
+    if not states:
+        print("No tunnels running")
+        return 0
+    for state in states:
+        alive = pid_alive(state['pid'])
+        if not alive:
+            os.unlink(state['file'])
+            status = 'dead (stale state removed)'
+        elif state.get('socks_port'):
+            status = 'up' if readiness.socks5_handshake(state['socks_port']) else 'not answering'
+        else:
+            status = 'up'
+        port = state.get('socks_port') or '-'
+        uptime = time.time() - state.get('started', time.time())
+        print(f"{state['name']:<24} pid {state['pid']:<7} port {port!s:<6} {uptime:>7.0f}s  {status}")
+    return 0
+
+
+def cmd_probe_all(args):
+    """Probe every saved VPN concurrently and print the result table"""
+    from sshvpn import config, probe
+
+    saved_vpns = config.load_vpns(args.config)
+    if not saved_vpns:
+        print("No saved VPNs")
+        return 1
+    start = time.perf_counter()
+    results = probe.run_probe_all(saved_vpns, attempts=args.attempts, timeout=args.timeout,
+                                  concurrency=args.concurrency)
+    if args.json:
+        print(json.dumps([r.to_dict() for r in results.values()], indent=2))
+    else:
+        print(probe.format_probe_table(results))
+        print(f"Probed {len(results)} servers in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def cmd_down(args):
+    """Stop one or all daemon tunnels"""
+    states = [s for s in read_states() if not args.name or s['name'] == args.name]
+    if not states:
+        print("No matching tunnels running")
+        return 1
+    for state in states:
+        if pid_alive(state['pid']):
+            os.kill(state['pid'], signal.SIGTERM)
+            print(f"Stopping '{state['name']}' (pid {state['pid']})")
+        else:
+            os.unlink(state['file'])
+    return 0
+
+
+def cmd_tune(args):
+    """Benchmark tuning profiles against a saved VPN and optionally keep the best"""
+    from sshvpn import auth, benchmark, config, profiles
+
+    saved_vpns = config.load_vpns(args.config)
+    if args.name not in saved_vpns:
+        print(f"No saved VPN named '{args.name}'", file=sys.stderr)
+        return 2
+    vpn = saved_vpns[args.name]
+    bench_args = benchmark.build_parser().parse_args([
+        '--host', vpn.get('ip', ''), '--port', str(vpn.get('port') or 22),
+        '--user', vpn.get('username', ''), '--password', vpn.get('password', ''),
+        '--auth-method', auth.Credentials.from_config(vpn).method,
+        *(['--key-file', vpn['key_file']] if vpn.get('key_file') else []),
+        '--ssh-options', vpn.get('ssh_options', config.DEFAULT_SSH_OPTIONS),
+        '--socks-port', str(args.socks_port), '--bulk-mb', str(args.bulk_mb),
+    ])
+    names = args.profiles.split(',') if args.profiles else list(profiles.PRESETS)
+    best, results = benchmark.select_profile(bench_args, names, args.goal)
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<12} failed: {result['error']}")
+        else:
+            print(f"{name:<12} {result['bulk']['mb_per_s']:8.1f} MB/s  "
+                  f"p50 {result['requests']['latency_p50_ms'] or 0:7.1f} ms  score {result['score']:.2f}")
+    if not best:
+        print("No profile could be benchmarked", file=sys.stderr)
+        return 1
+    print(f"Best profile for {args.goal}: {best}")
+    if args.save:
+        vpn['profile'] = best
+        config.save_vpns(saved_vpns, args.config)
+        print(f"Saved profile '{best}' for '{args.name}'")
+    return 0
+
+
+def cmd_install_key(args):
+    """Install a public key on a saved VPN's server and switch it to key auth"""
+    from sshvpn import auth, config
+
+    saved_vpns = config.load_vpns(args.config)
+    if args.name not in saved_vpns:
+        print(f"No saved VPN named '{args.name}'", file=sys.stderr)
+        return 2
+    vpn = saved_vpns[args.name]
+    try:
+        key_file = auth.install_key(vpn.get('ip', ''), vpn.get('port') or 22, vpn.get('username', ''),
+                                    vpn.get('password', ''), vpn.get('ssh_options', config.DEFAULT_SSH_OPTIONS),
+                                    args.key_file)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+        print(f"Key install failed: {e}", file=sys.stderr)
+        return 1
+    vpn['auth_method'] = auth.KEY
+    vpn['key_file'] = key_file
+    if args.forget_password:
+        vpn['password'] = ''
+    config.save_vpns(saved_vpns, args.config)
+    print(f"'{args.name}' now uses key {key_file}")
+    return 0
+
+
+def cmd_import(args):
+    """Merge a saved_vpns.json file, or bulk import an ssh_config, CSV or ssh:// list"""
+    from sshvpn import config, fleet
+    try:
+        vpn_store = config.open_store(args.config)
+        fmt = args.format or fleet.detect_format(args.path)
+        if fmt == fleet.JSON:
+            count = vpn_store.import_json(args.path)
+            print(f"Imported {count} VPNs from {args.path}")
+            return 0
+        entries, saved, seconds = fleet.import_fleet(
+            vpn_store, args.path, fmt, verify=not args.no_verify, check_auth=not args.no_auth,
+            concurrency=args.concurrency, timeout=args.timeout, keep_failed=args.keep_failed,
+            tags=args.tag or (), dry_run=args.dry_run)
+    except (OSError, ValueError) as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps({'saved': saved, 'seconds': seconds, 'entries': [e.to_dict() for e in entries]},
+                         indent=2))
+    else:
+        print(fleet.format_report(entries, saved, seconds))
+    failed = fleet.counts(entries).keys() - {fleet.OK, fleet.NEW, fleet.DUPLICATE}
+    return 1 if failed else 0
+
+
+def cmd_export(args):
+    """Write the store out in the saved_vpns.json format"""
+    from sshvpn import config
+    try:
+        count = config.open_store(args.config).export_json(args.path)
+    except OSError as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Exported {count} VPNs to {args.path}")
+    return 0
+
+
+def cmd_proxy_restore(args):
+    """Roll back system proxy changes recorded in the proxy journal"""
+    from sshvpn import proxy
+    system_proxy = proxy.SystemProxy()
+    if not system_proxy.engine.pending:
+        print("No proxy changes to restore")
+        return 0
+    restored, errors = system_proxy.engine.restore_all()
+    for name in restored:
+        print(f"{name} proxy settings restored")
+    for error in errors:
+        print(f"Could not restore proxy settings: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def cmd_gui(args):
+    from sshvpn import gui
+    gui.run()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ssh-vpn', description="SSH VPN Manager")
+    parser.add_argument('--config', help='path to saved_vpns.json (its .db store sits beside it)')
+    commands = parser.add_subparsers(dest='command')
+
+    connect = commands.add_parser('connect', help='connect saved VPNs and stay in the foreground')
+    connect.add_argument('names', nargs='+', metavar='name')
+    connect.add_argument('--socks-port', type=int, help='override the saved SOCKS port')
+    connect.add_argument('--dns-cache', action='store_true',
+                         help='serve a caching DNS stub through the first VPN even if its dns section leaves it off')
+    connect.add_argument('--dns-port', type=int, help='port for --dns-cache (default: the saved one)')
+    connect.set_defaults(func=cmd_connect)
+
+    status = commands.add_parser('status', help='show running tunnels')
+    status.add_argument('--json', action='store_true')
+    status.set_defaults(func=cmd_status)
+
+    probe_all = commands.add_parser('probe-all', help='probe every saved VPN')
+    probe_all.add_argument('--attempts', type=int, default=3)
+    probe_all.add_argument('--timeout', type=float, default=5.0)
+    probe_all.add_argument('--concurrency', type=int, default=64)
+    probe_all.add_argument('--json', action='store_true')
+    probe_all.set_defaults(func=cmd_probe_all)
+
+    down = commands.add_parser('down', help='stop running tunnels')
+    down.add_argument('name', nargs='?', help='tunnel to stop (default: all)')
+    down.set_defaults(func=cmd_down)
+
+    tune = commands.add_parser('tune', help='benchmark tuning profiles for a saved VPN')
+    tune.add_argument('name')
+    tune.add_argument('--profiles', help='comma separated profiles (default: all presets)')
+    tune.add_argument('--goal', choices=['throughput', 'latency', 'balanced'], default='balanced')
+    tune.add_argument('--socks-port', type=int, default=1089, help='temporary SOCKS port for the runs')
+    tune.add_argument('--bulk-mb', type=int, default=16)
+    tune.add_argument('--save', action='store_true', help='store the winner in the saved VPN')
+    tune.set_defaults(func=cmd_tune)
+
+    install_key = commands.add_parser('install-key', help='install an SSH key on a saved VPN and use it')
+    install_key.add_argument('name')
+    install_key.add_argument('--key-file', help='key to install (default: create ~/.ssh/ssh_vpn_ed25519)')
+    install_key.add_argument('--forget-password', action='store_true', help='drop the saved password afterwards')
+    install_key.set_defaults(func=cmd_install_key)
+
+    import_cmd = commands.add_parser('import', help='merge saved_vpns.json or bulk import servers')
+    import_cmd.add_argument('path', help='saved_vpns.json, ~/.ssh/config, a CSV or a list of ssh:// URLs')
+    import_cmd.add_argument('--format', choices=['json', 'ssh_config', 'csv', 'urls'],
+                            help='source format (default: guessed from the file)')
+    import_cmd.add_argument('--no-verify', action='store_true', help='save without probing the servers')
+    import_cmd.add_argument('--no-auth', action='store_true', help='check reachability but do not log in')
+    import_cmd.add_argument('--concurrency', type=int, default=100, help='checks in flight at once')
+    import_cmd.add_argument('--timeout', type=float, default=5.0)
+    import_cmd.add_argument('--keep-failed', action='store_true',
+                            help='also save unreachable servers and failed logins')
+    import_cmd.add_argument('--tag', action='append', help='tag every imported VPN (repeatable)')
+    import_cmd.add_argument('--dry-run', action='store_true', help='validate and report, save nothing')
+    import_cmd.add_argument('--json', action='store_true')
+    import_cmd.set_defaults(func=cmd_import)
+
+    export = commands.add_parser('export', help='write all VPNs to a saved_vpns.json file')
+    export.add_argument('path')
+    export.set_defaults(func=cmd_export)
+
+    proxy_restore = commands.add_parser('proxy-restore', help='undo system proxy changes left behind')
+    proxy_restore.set_defaults(func=cmd_proxy_restore)
+
+    gui = commands.add_parser('gui', help='start the graphical interface')
+    gui.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.command:
+        return cmd_gui(args)
+    return args.func(args)
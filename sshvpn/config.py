@@ -0,0 +1,91 @@
+"""Saved VPN configuration storage and parsing"""
+import os
+
+from sshvpn import auth, dns, profiles, readiness, store, tunnel
+
+DEFAULT_SSH_OPTIONS = '-o StrictHostKeyChecking=no -o ServerAliveInterval=60'
+DEFAULT_SOCKS_PORT = 1080
+
+
+def default_path():
+    """Return the saved_vpns.json path next to the application script"""
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_vpns.json")
+
+
+def store_path(path=None):
+    """Return the SQLite store that backs a saved_vpns.json path"""
+    return os.path.splitext(path or default_path())[0] + '.db'
+
+
+def open_store(path=None):
+    """Open the VPN store, importing the legacy JSON file on first use"""
+    path = path or default_path()
+    db_path = store_path(path)
+    fresh = not os.path.exists(db_path)
+    vpn_store = store.VPNStore(db_path)
+    if fresh and os.path.exists(path):
+        try:
+            count = vpn_store.import_json(path)
+            print(f"Imported {count} VPNs from {path} into {db_path}")
+        except Exception as e:
+            print(f"Error importing {path}: {e}")
+    return vpn_store
+
+
+def load_vpns(path=None):
+    """Open saved VPN configurations as a lazily loaded mapping, or {} on error"""
+    try:
+        return store.VPNMapping(open_store(path))
+    except Exception as e:
+        print(f"Error loading VPNs: {e}")
+        return {}
+
+
+def save_vpns(saved_vpns, path=None):
+    """Persist VPN configurations
+
+    Mappings from load_vpns() already write each entry as it changes, so
+    only in-place edits are flushed; a plain dict replaces the store.
+    """
+    try:
+        if isinstance(saved_vpns, store.VPNMapping):
+            saved_vpns.flush()
+        else:
+            open_store(path).replace_all(saved_vpns)
+    except Exception as e:
+        print(f"Error saving VPNs: {e}")
+
+
+def connection_args(config):
+    """Turn a saved VPN dict into keyword arguments for TunnelRegistry.connect
+
+    Raises ValueError for missing fields, non-numeric ports, unusable
+    credentials or an invalid tuning profile.
+    """
+    ip = config.get('ip', '').strip()
+    username = config.get('username', '').strip()
+    if not ip or not username:
+        raise ValueError("username and IP address are required")
+    try:
+        port = int(config.get('port') or 22)
+        socks_port = int(config.get('socks_port') or DEFAULT_SOCKS_PORT)
+        deadline = float(config.get('connect_timeout') or readiness.DEFAULT_DEADLINE)
+    except (TypeError, ValueError):
+        raise ValueError("port, SOCKS port and timeout must be numbers")
+    credentials = auth.Credentials.from_config(config)
+    credentials.validate()
+    ssh_options = profiles.apply(config.get('ssh_options', DEFAULT_SSH_OPTIONS), config.get('profile'))
+    return {
+        'ip': ip,
+        'port': port,
+        'username': username,
+        'password': credentials.password,
+        'auth_method': credentials.method,
+        'key_file': credentials.key_file,
+        'ssh_options': ssh_options,
+        'connection_type': config.get('connection_type', tunnel.SSH_TUNNEL),
+        'socks_port': socks_port,
+        'deadline': deadline,
+        'multiplex': bool(config.get('multiplex', False)),
+        'routes': dns.route_section(config),
+    }
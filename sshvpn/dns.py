@@ -0,0 +1,490 @@
+"""Local DNS stub with a TTL-respecting cache, resolving through the tunnel
+
+A saved VPN may carry a "dns" section:
+
+    "dns": {
+        "cache": true,            # run the stub while the VPN is up (off by default)
+        "port": 5053,             # UDP and TCP on 127.0.0.1
+        "upstream": "1.1.1.1"     # resolver reached through the tunnel
+    }
+
+SOCKS tunnels reach the upstream with DNS over TCP through their own
+SOCKS port, reusing a few idle connections. sshuttle tunnels query it
+over UDP and pass --ns-hosts so sshuttle carries those queries.
+
+Answers are cached until their smallest TTL runs out (NXDOMAIN and
+empty answers by the SOA minimum), ages are subtracted from the TTLs
+handed out, and concurrent queries for the same name share one
+upstream round trip. Cache hits over UDP are answered straight from
+the datagram callback.
+"""
+import asyncio
+import socket
+import struct
+import time
+from collections import OrderedDict
+
+DEFAULT_DNS_PORT = 5053
+DEFAULT_UPSTREAM = '1.1.1.1'
+DNS_PORT = 53
+MAX_ENTRIES = 4096
+MAX_TTL = 86400
+# Used for negative answers without an SOA, and as their upper bound
+NEGATIVE_TTL = 60
+MAX_NEGATIVE_TTL = 900
+UPSTREAM_TIMEOUT = 5.0
+IDLE_CONNECTIONS = 4
+PLAIN_UDP_LIMIT = 512
+EDNS_UDP_LIMIT = 4096
+
+HEADER = struct.Struct('!HHHHHH')
+RR_FIXED = struct.Struct('!HHIH')
+TYPE_SOA = 6
+TYPE_OPT = 41
+RCODE_OK, RCODE_SERVFAIL, RCODE_NXDOMAIN = 0, 2, 3
+FLAG_QR = 0x8000
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+
+
+def _skip_name(message, offset):
+    """Offset just past the (possibly compressed) name starting at offset"""
+    while True:
+        length = message[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def _question_end(message):
+    return _skip_name(message, HEADER.size) + 4
+
+
+def question_key(query):
+    """(name, type, class) of a single-question query, or None"""
+    try:
+        if HEADER.unpack_from(query)[2] != 1:
+            return None
+        end = _skip_name(query, HEADER.size)
+        qtype, qclass = struct.unpack_from('!HH', query, end)
+    except (IndexError, struct.error):
+        return None
+    # Label length bytes are below 64, so lower() only touches letters
+    return bytes(query[HEADER.size:end]).lower(), qtype, qclass
+
+
+def scan_response(response):
+    """TTL field offsets and cache lifetime of an upstream response
+
+    Returns (offsets, ttl), or None for responses that must not be
+    cached (truncated, SERVFAIL and the like, or malformed).
+    """
+    try:
+        _, flags, qdcount, ancount, nscount, arcount = HEADER.unpack_from(response)
+        rcode = flags & 0xF
+        if flags & FLAG_TC or rcode not in (RCODE_OK, RCODE_NXDOMAIN):
+            return None
+        offset = HEADER.size
+        for _ in range(qdcount):
+            offset = _skip_name(response, offset) + 4
+        offsets = []
+        answer_ttls = []
+        negative_ttl = None
+        for index in range(ancount + nscount + arcount):
+            offset = _skip_name(response, offset)
+            rtype, _, ttl, length = RR_FIXED.unpack_from(response, offset)
+            # The OPT pseudo-record keeps EDNS flags where the TTL would be
+            if rtype != TYPE_OPT:
+                offsets.append(offset + 4)
+                if index < ancount:
+                    answer_ttls.append(ttl)
+                elif index < ancount + nscount and rtype == TYPE_SOA:
+                    minimum = struct.unpack_from('!I', response, offset + RR_FIXED.size + length - 4)[0]
+                    negative_ttl = min(ttl, minimum)
+            offset += RR_FIXED.size + length
+        if offset > len(response):
+            return None
+    except (IndexError, struct.error):
+        return None
+    if rcode == RCODE_OK and answer_ttls:
+        ttl = min(answer_ttls)
+    else:
+        ttl = min(NEGATIVE_TTL if negative_ttl is None else negative_ttl, MAX_NEGATIVE_TTL)
+    return offsets, min(ttl, MAX_TTL)
+
+
+def _with_id(response, query_id):
+    return struct.pack('!H', query_id) + response[2:]
+
+
+def error_response(query, rcode, truncated=False):
+    """Header-and-question reply carrying rcode (or TC) for query"""
+    query_id, flags = struct.unpack_from('!HH', query)
+    flags = FLAG_QR | FLAG_RA | (flags & FLAG_RD) | (FLAG_TC if truncated else 0) | rcode
+    try:
+        question = query[HEADER.size:_question_end(query)]
+    except IndexError:
+        return HEADER.pack(query_id, flags, 0, 0, 0, 0)
+    return HEADER.pack(query_id, flags, 1, 0, 0, 0) + question
+
+
+def udp_limit(query):
+    """Largest UDP reply the client can take; EDNS queries carry an OPT record"""
+    return EDNS_UDP_LIMIT if HEADER.unpack_from(query)[5] else PLAIN_UDP_LIMIT
+
+
+class DnsCache:
+    """LRU of wire-format responses keyed by question, expiring by TTL"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, query_id):
+        """Cached response re-addressed to query_id with aged TTLs, or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        response, offsets, stored, expires = entry
+        now = time.monotonic()
+        if now >= expires:
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        elapsed = int(now - stored)
+        if not elapsed:
+            return _with_id(response, query_id)
+        aged = bytearray(response)
+        struct.pack_into('!H', aged, 0, query_id)
+        for offset in offsets:
+            ttl = struct.unpack_from('!I', aged, offset)[0]
+            struct.pack_into('!I', aged, offset, max(ttl - elapsed, 0))
+        return bytes(aged)
+
+    def put(self, key, response):
+        """Store an upstream response; returns False if it is not cacheable"""
+        scanned = scan_response(response)
+        if scanned is None or scanned[1] <= 0:
+            return False
+        offsets, ttl = scanned
+        now = time.monotonic()
+        self.entries[key] = (bytes(response), offsets, now, now + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+        }
+
+
+async def socks_open_connection(socks_port, host, port, timeout=UPSTREAM_TIMEOUT):
+    """Open a stream to host:port through a local SOCKS5 port"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', socks_port), timeout)
+    try:
+        writer.write(b'\x05\x01\x00')
+        await writer.drain()
+        if await asyncio.wait_for(reader.readexactly(2), timeout) != b'\x05\x00':
+            raise ConnectionError("SOCKS5 greeting rejected")
+        try:
+            address = b'\x01' + socket.inet_aton(host)
+        except OSError:
+            address = b'\x03' + bytes([len(host)]) + host.encode('idna')
+        writer.write(b'\x05\x01\x00' + address + struct.pack('!H', port))
+        await writer.drain()
+        reply = await asyncio.wait_for(reader.readexactly(4), timeout)
+        if reply[1] != 0:
+            raise ConnectionError(f"SOCKS5 CONNECT failed with code {reply[1]}")
+        skip = {1: 4, 4: 16}.get(reply[3])
+        if skip is None:
+            skip = (await reader.readexactly(1))[0]
+        await reader.readexactly(skip + 2)
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+class TcpUpstream:
+    """DNS over TCP (RFC 7766) through any stream opener, reusing idle connections"""
+
+    def __init__(self, open_connection, server=DEFAULT_UPSTREAM, port=DNS_PORT,
+                 timeout=UPSTREAM_TIMEOUT, idle_connections=IDLE_CONNECTIONS):
+        self.open_connection = open_connection
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.idle_connections = idle_connections
+        self.idle = []
+
+    async def query(self, message):
+        while True:
+            reused = bool(self.idle)
+            if reused:
+                reader, writer = self.idle.pop()
+            else:
+                reader, writer = await asyncio.wait_for(self.open_connection(self.server, self.port),
+                                                        self.timeout)
+            try:
+                writer.write(struct.pack('!H', len(message)) + message)
+                await writer.drain()
+                length = struct.unpack('!H', await asyncio.wait_for(reader.readexactly(2), self.timeout))[0]
+                response = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+            except (OSError, EOFError, asyncio.TimeoutError):
+                writer.close()
+                if reused:
+                    # The server closed it while idle; try the next one
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if len(self.idle) < self.idle_connections:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+    def describe(self):
+        return f"{self.server}:{self.port} over TCP"
+
+
+class _UdpReply(asyncio.DatagramProtocol):
+    def __init__(self, future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class UdpUpstream:
+    """Plain DNS over UDP, retrying truncated answers over TCP"""
+
+    def __init__(self, server=DEFAULT_UPSTREAM, port=DNS_PORT, timeout=UPSTREAM_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.tcp = TcpUpstream(asyncio.open_connection, server, port, timeout)
+
+    async def query(self, message):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _UdpReply(future),
+                                                           remote_addr=(self.server, self.port))
+        try:
+            transport.sendto(message)
+            response = await asyncio.wait_for(future, self.timeout)
+        finally:
+            transport.close()
+        if len(response) >= 4 and struct.unpack_from('!H', response, 2)[0] & FLAG_TC:
+            return await self.tcp.query(message)
+        return response
+
+    def close(self):
+        self.tcp.close()
+
+    def describe(self):
+        return f"{self.server}:{self.port} over UDP"
+
+
+class _StubProtocol(asyncio.DatagramProtocol):
+    def __init__(self, stub):
+        self.stub = stub
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        response = self.stub.cached(data)
+        if response is not None:
+            self._send(data, response, addr)
+        else:
+            self.stub.spawn(self._answer(data, addr))
+
+    async def _answer(self, data, addr):
+        response = await self.stub.answer(data)
+        if response is not None and self.transport is not None:
+            self._send(data, response, addr)
+
+    def _send(self, query, response, addr):
+        if len(response) > udp_limit(query):
+            response = error_response(query, RCODE_OK, truncated=True)
+        self.transport.sendto(response, addr)
+
+
+class DnsStub:
+    """UDP and TCP DNS listener on loopback in front of a cache and an upstream"""
+
+    def __init__(self, upstream, port=DEFAULT_DNS_PORT, host='127.0.0.1', cache=None):
+        self.upstream = upstream
+        self.host = host
+        self.port = port
+        self.cache = cache or DnsCache()
+        self.inflight = {}
+        self.tasks = set()
+        self.udp = None
+        self.tcp = None
+        self.upstream_queries = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.udp, _ = await loop.create_datagram_endpoint(lambda: _StubProtocol(self),
+                                                          local_addr=(self.host, self.port))
+        self.port = self.udp.get_extra_info('sockname')[1]
+        try:
+            self.tcp = await asyncio.start_server(self._handle_tcp, self.host, self.port)
+        except OSError:
+            self.udp.close()
+            raise
+        return self
+
+    def spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def cached(self, query):
+        """Answer from the cache without awaiting anything, or None"""
+        key = question_key(query)
+        if key is None:
+            return None
+        return self.cache.get(key, struct.unpack_from('!H', query)[0])
+
+    async def answer(self, query):
+        """Response for one wire-format query; None drops unparseable input"""
+        key = question_key(query)
+        if key is None:
+            return error_response(query, RCODE_SERVFAIL) if len(query) >= HEADER.size else None
+        query_id = struct.unpack_from('!H', query)[0]
+        response = self.cache.get(key, query_id)
+        if response is not None:
+            return response
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return _with_id(await asyncio.shield(future), query_id)
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        response = error_response(query, RCODE_SERVFAIL)
+        try:
+            self.upstream_queries += 1
+            response = await self.upstream.query(query)
+            self.cache.put(key, response)
+        except (OSError, EOFError, asyncio.TimeoutError):
+            self.failures += 1
+        finally:
+            # Waiters get SERVFAIL rather than hanging if this query was cancelled
+            del self.inflight[key]
+            future.set_result(response)
+        return _with_id(response, query_id)
+
+    async def _handle_tcp(self, reader, writer):
+        try:
+            while True:
+                length = struct.unpack('!H', await reader.readexactly(2))[0]
+                response = await self.answer(await reader.readexactly(length))
+                if response is None:
+                    break
+                writer.write(struct.pack('!H', len(response)) + response)
+                await writer.drain()
+        except (EOFError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self.udp is not None:
+            self.udp.close()
+        if self.tcp is not None:
+            self.tcp.close()
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.upstream.close()
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def stats(self):
+        return {
+            **self.cache.stats(),
+            'upstream_queries': self.upstream_queries,
+            'coalesced': self.coalesced,
+            'failures': self.failures,
+            'inflight': len(self.inflight),
+        }
+
+
+def settings(config):
+    """The "dns" section of a saved VPN with defaults filled in"""
+    section = (config or {}).get('dns') or {}
+    try:
+        port = int(section.get('port') or DEFAULT_DNS_PORT)
+    except (TypeError, ValueError):
+        port = DEFAULT_DNS_PORT
+    return {
+        'cache': bool(section.get('cache', False)),
+        'port': port,
+        'upstream': section.get('upstream') or DEFAULT_UPSTREAM,
+    }
+
+
+def route_section(config):
+    """The VPN's "routes" section, telling sshuttle to carry the stub's upstream"""
+    routes = dict((config or {}).get('routes') or {})
+    routes.setdefault('ns_hosts', [settings(config)['upstream']])
+    return routes
+
+
+def stub_for(config, socks_port, force=False):
+    """An unstarted DnsStub for a connected VPN, or None if it should not run
+
+    socks_port is the tunnel's SOCKS port, or None for sshuttle, which
+    only gets a stub when it forwards DNS. force starts it even when the
+    VPN's "dns" section does not turn the cache on.
+    """
+    options = settings(config)
+    if not (options['cache'] or force):
+        return None
+    if socks_port:
+        upstream = TcpUpstream(lambda host, port: socks_open_connection(socks_port, host, port),
+                               options['upstream'])
+    elif route_section(config).get('dns', True):
+        upstream = UdpUpstream(options['upstream'])
+    else:
+        return None
+    return DnsStub(upstream, options['port'])
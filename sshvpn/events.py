@@ -0,0 +1,59 @@
+"""Thread-safe UI event queue drained once per frame"""
+import collections
+
+STATUS = 'status'
+CONNECTED = 'connected'
+ROW = 'row'
+CALL = 'call'
+
+
+class EventBus:
+    """Collect UI events from worker threads and coalesce them on drain
+
+    deque.append and deque.popleft are atomic, so posting never takes a
+    lock and never blocks a worker.
+    """
+
+    def __init__(self):
+        self.queue = collections.deque()
+
+    def post(self, kind, *payload):
+        self.queue.append((kind, payload))
+
+    def drain(self):
+        """Pop everything queued so far and coalesce it into one batch
+
+        Only the latest status and connected state survive; row refreshes
+        are de-duplicated; calls run in the order they were posted.
+        """
+        batch = Batch()
+        while True:
+            try:
+                kind, payload = self.queue.popleft()
+            except IndexError:
+                break
+            if kind == STATUS:
+                batch.status = payload
+            elif kind == CONNECTED:
+                batch.connected = payload[0]
+            elif kind == ROW:
+                batch.rows[payload[0]] = None
+            elif kind == CALL:
+                batch.calls.append(payload)
+        return batch
+
+    def __len__(self):
+        return len(self.queue)
+
+
+class Batch:
+    """Coalesced result of one EventBus.drain"""
+
+    def __init__(self):
+        self.status = None
+        self.connected = None
+        self.rows = {}
+        self.calls = []
+
+    def __bool__(self):
+        return bool(self.status or self.connected is not None or self.rows or self.calls)
@@ -0,0 +1,1417 @@
+import asyncio
+import os
+import time
+from kivy.app import App
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
+from kivy.uix.textinput import TextInput
+from kivy.uix.button import Button
+from kivy.uix.spinner import Spinner
+from kivy.uix.popup import Popup
+from kivy.uix.modalview import ModalView
+from kivy.uix.togglebutton import ToggleButton
+from kivy.uix.checkbox import CheckBox
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.core.window import Window
+from kivy.clock import Clock
+from kivy.properties import StringProperty, BooleanProperty, ObjectProperty
+from kivy.config import Config
+
+from sshvpn import aioloop, auth, config, dns, events, fleet, logstore, metrics, pac, probe, profiles, proxy, proxy_engine, readiness, registry, selection, serverlist, socks_lb, standby, store, supervisor, tools, tunnel
+
+DEFAULT_SSH_OPTIONS = config.DEFAULT_SSH_OPTIONS
+
+# Maximum number of ssh -D tunnels started behind the load balancer
+LB_MAX_BACKENDS = 8
+
+# تنظیم اندازه پنجره
+Config.set('graphics', 'width', '900')
+Config.set('graphics', 'height', '700')
+Config.set('graphics', 'resizable', '1')
+
+class LogLine(Label):
+    """One row of the output console"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.halign = 'left'
+        self.valign = 'middle'
+        self.font_size = '13sp'
+        self.bind(width=lambda instance, width: setattr(instance, 'text_size', (width, None)))
+
+class LogConsole(RecycleView):
+    """Virtualized console that only creates widgets for visible lines"""
+    
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+        self.last_seq = 0
+        self.viewclass = LogLine
+        layout = RecycleBoxLayout(default_size=(None, 20), default_size_hint=(1, None),
+                                  size_hint_y=None, orientation='vertical')
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+    
+    def sync(self, *args):
+        """Pull new lines from the store, dropping rows beyond its cap"""
+        self.last_seq, lines = self.store.since(self.last_seq)
+        if not lines:
+            return
+        follow = self.scroll_y <= 0.01 or not self.data
+        self.data.extend({'text': line} for line in lines)
+        overflow = len(self.data) - self.store.max_lines
+        if overflow > 0:
+            del self.data[:overflow]
+        self.refresh_from_data()
+        if follow:
+            self.scroll_y = 0
+
+class VPNRow(RecycleDataViewBehavior, BoxLayout):
+    """A recycled server row; its content comes entirely from RecycleView data"""
+    name = StringProperty('')
+    text = StringProperty('')
+    tunnel_text = StringProperty('Up')
+    selected = BooleanProperty(False)
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.list_view = None
+        self.orientation = 'horizontal'
+        
+        self.label = Label(size_hint_x=0.6)
+        self.add_widget(self.label)
+        
+        self.select_btn = ToggleButton(text='Select', size_hint_x=0.2, on_press=self.on_select)
+        self.add_widget(self.select_btn)
+        
+        self.tunnel_btn = Button(text='Up', size_hint_x=0.2, on_press=self.on_tunnel)
+        self.add_widget(self.tunnel_btn)
+        
+        self.bind(text=self.label.setter('text'), tunnel_text=self.tunnel_btn.setter('text'))
+        self.bind(selected=lambda instance, value: setattr(self.select_btn, 'state', 'down' if value else 'normal'))
+    
+    def refresh_view_attrs(self, rv, index, data):
+        self.list_view = rv
+        return super().refresh_view_attrs(rv, index, data)
+    
+    def on_select(self, instance):
+        if self.list_view:
+            self.list_view.select(self.name)
+    
+    def on_tunnel(self, instance):
+        if self.list_view:
+            self.list_view.on_tunnel_callback(self.name)
+
+class VPNGroupHeader(Label):
+    """Group title row in the server list"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.bold = True
+        self.halign = 'left'
+        self.bind(width=lambda instance, width: setattr(instance, 'text_size', (width, None)))
+
+class VPNListView(RecycleView):
+    """Virtualized server list backed by a ServerList"""
+    
+    def __init__(self, server_list, on_select_callback, on_tunnel_callback, **kwargs):
+        super().__init__(**kwargs)
+        self.server_list = server_list
+        self.on_select_callback = on_select_callback
+        self.on_tunnel_callback = on_tunnel_callback
+        self.viewclass = serverlist.ROW_VIEW
+        layout = RecycleBoxLayout(default_size=(None, 40), default_size_hint=(1, None),
+                                  size_hint_y=None, orientation='vertical', spacing=5)
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+    
+    def refresh(self):
+        """Rebuild the visible rows after a filter, sort or membership change"""
+        self.data = self.server_list.rows()
+    
+    def patch(self, name):
+        """Update one server's rows in place without rebuilding the list"""
+        for index, row in self.server_list.rows_for(name):
+            if index < len(self.data):
+                self.data[index] = row
+    
+    def select(self, name):
+        previous = self.server_list.selected
+        self.server_list.selected = name
+        if previous and previous != name:
+            self.patch(previous)
+        self.patch(name)
+        self.on_select_callback(name)
+
+class SSHVPNManager(App):
+    ssh_process = None
+    active_tunnel = None
+    balancer = None
+    is_connected = BooleanProperty(False)
+    status_text = StringProperty('Ready to connect')
+    
+    def __init__(self, log_max_lines=logstore.DEFAULT_MAX_LINES, **kwargs):
+        super().__init__(**kwargs)
+        self.log_store = logstore.LogStore(log_max_lines)
+        self.ui_events = events.EventBus()
+        # All background work runs as tasks on this loop instead of ad-hoc threads
+        self.aio = aioloop.BackgroundLoop().start()
+        proxy_engine.use_loop(self.aio)
+        self.saved_vpns = {}
+        self.current_vpn = None
+        self.system_proxy = proxy.SystemProxy(self.append_output)
+        self.probe_results = {}
+        self.failover_pool = None
+        self.tunnels = registry.TunnelRegistry()
+        self.balancer_tunnels = []
+        self.metrics = metrics.MetricsCollector(self.tunnels, lambda: self.balancer)
+        self.metrics_server = None
+        self.pac_server = None
+        self.dns_stub = None
+        self.front_door = None
+        self.standby_pool = None
+        self.standby_filling = False
+        self.pac_default_port = config.DEFAULT_SOCKS_PORT
+        self.server_list = serverlist.ServerList()
+        
+        # مسیر فایل ذخیره‌سازی
+        self.saved_vpns_file = config.default_path()
+        self.load_saved_vpns()
+        # Undo proxy settings a crashed session left applied
+        self.submit(asyncio.to_thread(self.system_proxy.recover))
+    
+    def load_saved_vpns(self):
+        """Load saved VPN configurations from file"""
+        self.saved_vpns = config.load_vpns(self.saved_vpns_file)
+    
+    def save_vpns(self):
+        """Save VPN configurations to file"""
+        config.save_vpns(self.saved_vpns, self.saved_vpns_file)
+    
+    def build(self):
+        self.title = "SSH VPN Manager"
+        
+        # Main layout
+        main_layout = BoxLayout(orientation='horizontal', padding=10, spacing=10)
+        
+        # Left panel for saved VPNs
+        left_panel = BoxLayout(orientation='vertical', size_hint_x=0.3, spacing=10)
+        
+        left_panel.add_widget(Label(text='Saved VPNs:', size_hint_y=0.05))
+        
+        # Search, sort and grouping for the server list
+        self.search_input = TextInput(hint_text='Filter by name, host or tag', multiline=False,
+                                      size_hint_y=None, height=30)
+        self.search_input.bind(text=self.on_search)
+        left_panel.add_widget(self.search_input)
+        
+        view_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=30, spacing=5)
+        self.sort_spinner = Spinner(text=serverlist.SORT_NAME, values=serverlist.SORTS)
+        self.sort_spinner.bind(text=self.on_list_view_change)
+        view_layout.add_widget(self.sort_spinner)
+        self.group_spinner = Spinner(text=serverlist.GROUP_NONE, values=serverlist.GROUPS)
+        self.group_spinner.bind(text=self.on_list_view_change)
+        view_layout.add_widget(self.group_spinner)
+        left_panel.add_widget(view_layout)
+        
+        # Only rows on screen get widgets, so large fleets scroll smoothly
+        self.vpn_list_view = VPNListView(self.server_list, self.load_vpn_config, self.toggle_row_tunnel,
+                                         size_hint_y=0.7)
+        left_panel.add_widget(self.vpn_list_view)
+        
+        # Save name input
+        save_layout = BoxLayout(orientation='horizontal', size_hint_y=0.1, spacing=5)
+        save_layout.add_widget(Label(text='Save as:', size_hint_x=0.3))
+        self.save_name_input = TextInput(hint_text='Enter VPN name', multiline=False, size_hint_x=0.7)
+        save_layout.add_widget(self.save_name_input)
+        left_panel.add_widget(save_layout)
+        
+        # Save and Delete buttons
+        btn_layout = BoxLayout(orientation='horizontal', size_hint_y=0.1, spacing=5)
+        self.save_btn = Button(text='Save VPN', on_press=self.save_current_vpn)
+        self.delete_btn = Button(text='Delete VPN', on_press=self.delete_vpn)
+        btn_layout.add_widget(self.save_btn)
+        btn_layout.add_widget(self.delete_btn)
+        left_panel.add_widget(btn_layout)
+        
+        left_panel.add_widget(BoxLayout(size_hint_y=0.05))  # Spacer
+        
+        # Right panel for connection details
+        right_panel = BoxLayout(orientation='vertical', size_hint_x=0.7, spacing=10)
+        
+        # Connection details form
+        form_layout = GridLayout(cols=2, spacing=10, size_hint_y=0.5)
+        
+        form_layout.add_widget(Label(text='Connection Type:'))
+        self.connection_type = Spinner(
+            text='SSH Tunnel',
+            values=tunnel.CONNECTION_TYPES,
+            size_hint_y=None, height=30
+        )
+        form_layout.add_widget(self.connection_type)
+        
+        form_layout.add_widget(Label(text='Username:'))
+        self.username_input = TextInput(hint_text='Enter username', multiline=False, size_hint_y=None, height=30)
+        form_layout.add_widget(self.username_input)
+        
+        form_layout.add_widget(Label(text='IP Address:'))
+        self.ip_input = TextInput(hint_text='Enter server IP address', multiline=False, size_hint_y=None, height=30)
+        form_layout.add_widget(self.ip_input)
+        
+        form_layout.add_widget(Label(text='Password:'))
+        self.password_input = TextInput(hint_text='Password or key passphrase', password=True, multiline=False, size_hint_y=None, height=30)
+        form_layout.add_widget(self.password_input)
+        
+        form_layout.add_widget(Label(text='Authentication:'))
+        self.auth_spinner = Spinner(text=auth.PASSWORD, values=auth.METHODS, size_hint_y=None, height=30)
+        form_layout.add_widget(self.auth_spinner)
+        
+        form_layout.add_widget(Label(text='Key File:'))
+        self.key_file_input = TextInput(hint_text='Private key for key authentication', multiline=False,
+                                        size_hint_y=None, height=30)
+        form_layout.add_widget(self.key_file_input)
+        
+        form_layout.add_widget(Label(text='Port:'))
+        self.port_input = TextInput(text='22', hint_text='SSH port (default: 22)', multiline=False, size_hint_y=None, height=30)
+        form_layout.add_widget(self.port_input)
+        
+        form_layout.add_widget(Label(text='SSH Options:'))
+        self.ssh_options = TextInput(
+            text=DEFAULT_SSH_OPTIONS,
+            hint_text='Additional SSH options', 
+            multiline=False, size_hint_y=None, height=30
+        )
+        form_layout.add_widget(self.ssh_options)
+        
+        form_layout.add_widget(Label(text='Tags:'))
+        self.tags_input = TextInput(hint_text='Comma separated, e.g. eu, fast', multiline=False,
+                                    size_hint_y=None, height=30)
+        form_layout.add_widget(self.tags_input)
+        
+        form_layout.add_widget(Label(text='Tuning Profile:'))
+        self.profile_spinner = Spinner(text=profiles.CUSTOM, values=[profiles.CUSTOM] + list(profiles.PRESETS),
+                                       size_hint_y=None, height=30)
+        form_layout.add_widget(self.profile_spinner)
+        
+        form_layout.add_widget(Label(text='SOCKS Port:'))
+        self.socks_port_input = TextInput(text='1080', hint_text='SOCKS proxy port', multiline=False, size_hint_y=None, height=30)
+        form_layout.add_widget(self.socks_port_input)
+        
+        form_layout.add_widget(Label(text='Connect Timeout (s):'))
+        self.connect_timeout_input = TextInput(text=str(int(readiness.DEFAULT_DEADLINE)), hint_text='Seconds to wait for the tunnel',
+                                               multiline=False, size_hint_y=None, height=30)
+        form_layout.add_widget(self.connect_timeout_input)
+        
+        form_layout.add_widget(Label(text='Connection Sharing:'))
+        self.multiplex_checkbox = CheckBox(active=False, size_hint_y=None, height=30)
+        form_layout.add_widget(self.multiplex_checkbox)
+        
+        form_layout.add_widget(Label(text='Hot Standby:'))
+        self.standby_spinner = Spinner(text='Off', values=['Off'] + [str(n) for n in range(1, 4)],
+                                       size_hint_y=None, height=30)
+        form_layout.add_widget(self.standby_spinner)
+        
+        form_layout.add_widget(Label(text='Standby Idle (s):'))
+        self.standby_idle_input = TextInput(text=str(int(standby.DEFAULT_IDLE_TIMEOUT)),
+                                            hint_text='Drop unused standbys after', multiline=False,
+                                            size_hint_y=None, height=30)
+        form_layout.add_widget(self.standby_idle_input)
+        
+        form_layout.add_widget(Label(text='Balancer Policy:'))
+        self.balancer_policy = Spinner(text=socks_lb.ROUND_ROBIN, values=socks_lb.POLICIES,
+                                       size_hint_y=None, height=30)
+        form_layout.add_widget(self.balancer_policy)
+        
+        right_panel.add_widget(form_layout)
+        
+        # Buttons
+        btn_layout2 = BoxLayout(orientation='horizontal', size_hint_y=0.1, spacing=10)
+        self.connect_btn = Button(text='Connect VPN', on_press=self.toggle_connection)
+        self.ping_btn = Button(text='Ping Server', on_press=self.ping_server)
+        self.probe_all_btn = Button(text='Probe All', on_press=self.probe_all_servers)
+        self.best_btn = Button(text='Connect Best', on_press=self.connect_best_server)
+        self.balance_btn = Button(text='Load Balance', on_press=self.toggle_balancer)
+        self.set_proxy_btn = Button(text='Set System Proxy', on_press=self.set_system_proxy)
+        self.auto_proxy_btn = Button(text='Auto System Proxy', on_press=self.toggle_auto_proxy)
+        btn_layout2.add_widget(self.connect_btn)
+        btn_layout2.add_widget(self.ping_btn)
+        btn_layout2.add_widget(self.probe_all_btn)
+        btn_layout2.add_widget(self.best_btn)
+        btn_layout2.add_widget(self.balance_btn)
+        btn_layout2.add_widget(self.set_proxy_btn)
+        btn_layout2.add_widget(self.auto_proxy_btn)
+        self.install_key_btn = Button(text='Install Key', on_press=self.install_key)
+        btn_layout2.add_widget(self.install_key_btn)
+        self.import_btn = Button(text='Import Fleet', on_press=self.show_import_popup)
+        btn_layout2.add_widget(self.import_btn)
+        right_panel.add_widget(btn_layout2)
+        
+        # Status bar
+        self.status_label = Label(text=self.status_text, size_hint_y=0.05)
+        right_panel.add_widget(self.status_label)
+        
+        # Live per-tunnel metrics
+        self.metrics_label = Label(text='No active tunnels', size_hint_y=0.08, font_size='12sp',
+                                   halign='left', valign='top')
+        self.metrics_label.bind(size=self.metrics_label.setter('text_size'))
+        right_panel.add_widget(self.metrics_label)
+        
+        # Output console
+        self.output_console = LogConsole(self.log_store, size_hint_y=0.35)
+        right_panel.add_widget(self.output_console)
+        # One callback per frame applies everything worker threads posted
+        Clock.schedule_interval(self.flush_events, 0)
+        
+        # Add panels to main layout
+        main_layout.add_widget(left_panel)
+        main_layout.add_widget(right_panel)
+        
+        # Load saved VPNs
+        self.refresh_vpn_list()
+        
+        self.start_metrics_server()
+        self.submit(self.sample_metrics_loop())
+        
+        return main_layout
+    
+    def start_metrics_server(self):
+        """Expose tunnel metrics on a local /metrics endpoint"""
+        try:
+            self.metrics_server = metrics.MetricsServer(self.metrics)
+            self.metrics_server.start()
+            self.append_output(f"Metrics available at http://127.0.0.1:{self.metrics_server.port}/metrics")
+        except OSError as e:
+            self.metrics_server = None
+            self.append_output(f"Metrics endpoint disabled: {e}")
+    
+    async def sample_metrics_loop(self, interval=2):
+        """Sample tunnel metrics off the UI thread and post the panel text"""
+        while True:
+            try:
+                summary = await asyncio.to_thread(self.metrics.summary)
+                self.post_call(setattr, self.metrics_label, 'text', summary)
+            except Exception as e:
+                self.append_output(f"Metrics error: {str(e)}")
+            await asyncio.sleep(interval)
+    
+    def refresh_vpn_list(self):
+        """Reload the server list from the store (names, hosts and tags only)"""
+        self.server_list.load(serverlist.summaries(self.saved_vpns))
+        for vpn_name in self.tunnels.names():
+            record = self.tunnels.get(vpn_name)
+            if record:
+                self.server_list.set_tunnel(vpn_name, record.state, record.socks_port)
+        for vpn_name, result in self.probe_results.items():
+            self.server_list.set_probe(vpn_name, result)
+        self.vpn_list_view.refresh()
+    
+    def update_vpn_entry(self, vpn_name):
+        """Add, update or drop one saved VPN in the list without a full reload"""
+        vpn = self.saved_vpns.get(vpn_name)
+        if vpn is None:
+            self.server_list.remove(vpn_name)
+        else:
+            self.server_list.upsert(vpn_name, str(vpn.get('ip', '')), store.tags_of(vpn))
+        self.vpn_list_view.refresh()
+    
+    def on_search(self, instance, text):
+        self.server_list.set_query(text)
+        self.vpn_list_view.refresh()
+    
+    def on_list_view_change(self, instance, value):
+        self.server_list.sort = self.sort_spinner.text
+        self.server_list.group = self.group_spinner.text
+        self.vpn_list_view.refresh()
+    
+    def apply_probe_results(self, results):
+        """Show new probe results in the list (UI thread)"""
+        for vpn_name, result in results.items():
+            self.server_list.set_probe(vpn_name, result)
+        self.vpn_list_view.refresh()
+    
+    def update_row_state(self, vpn_name):
+        """Refresh the connect/disconnect button of a VPN row"""
+        record = self.tunnels.get(vpn_name)
+        changed = self.server_list.set_tunnel(vpn_name, record.state if record else supervisor.STOPPED,
+                                              record.socks_port if record else None)
+        if not changed:
+            return
+        if self.server_list.order_depends_on_live_state():
+            self.vpn_list_view.refresh()
+        else:
+            self.vpn_list_view.patch(vpn_name)
+    
+    def append_output(self, message):
+        """Append message to output console (safe from any thread)"""
+        self.log_store.append(message)
+    
+    def post_status(self, message, is_error=False):
+        """Queue a status bar update from any thread"""
+        self.ui_events.post(events.STATUS, message, is_error)
+    
+    def post_connected(self, value):
+        """Queue a change of the connected flag from any thread"""
+        self.ui_events.post(events.CONNECTED, value)
+    
+    def post_row(self, vpn_name):
+        """Queue a refresh of a VPN row's tunnel button from any thread"""
+        self.ui_events.post(events.ROW, vpn_name)
+    
+    def post_call(self, func, *args):
+        """Queue a function call to run on the UI thread"""
+        self.ui_events.post(events.CALL, func, *args)
+    
+    def submit(self, coro):
+        """Run a coroutine on the background loop, reporting any error it raises"""
+        return self.aio.submit(coro, on_error=self.report_error)
+    
+    def report_error(self, error):
+        """Log an error from a background task and show it in the status bar"""
+        message = f"Error: {str(error) or error.__class__.__name__}"
+        self.append_output(message)
+        self.post_status(message, True)
+    
+    def flush_events(self, dt):
+        """Apply queued worker events and new log lines in a single UI update"""
+        batch = self.ui_events.drain()
+        if batch.connected is not None:
+            self.is_connected = batch.connected
+        if batch.status:
+            self.update_status(*batch.status)
+        for vpn_name in batch.rows:
+            self.update_row_state(vpn_name)
+        for func, *args in batch.calls:
+            func(*args)
+        self.output_console.sync()
+    
+    def update_status(self, message, is_error=False):
+        """Update status bar with message"""
+        self.status_text = message
+        self.status_label.text = message
+        if is_error:
+            self.status_label.color = (1, 0, 0, 1)  # Red for errors
+        else:
+            self.status_label.color = (0, 0, 0, 1)  # Black for normal
+    
+    def save_current_vpn(self, instance):
+        """Save current configuration as a VPN"""
+        vpn_name = self.save_name_input.text.strip()
+        if not vpn_name:
+            self.show_popup("Warning", "Please enter a name for the VPN")
+            return
+            
+        username = self.username_input.text.strip()
+        ip = self.ip_input.text.strip()
+        password = self.password_input.text
+        port = self.port_input.text.strip()
+        ssh_options = self.ssh_options.text.strip()
+        socks_port = self.socks_port_input.text.strip()
+        connect_timeout = self.connect_timeout_input.text.strip()
+        connection_type = self.connection_type.text
+        
+        if not all([username, ip]):
+            self.show_popup("Warning", "Please fill all required fields")
+            return
+        try:
+            credentials = self.form_credentials()
+            credentials.validate()
+        except ValueError as e:
+            self.show_popup("Warning", str(e))
+            return
+            
+        profile = self.profile_spinner.text
+        existing = self.saved_vpns.get(vpn_name, {})
+        if profile != profiles.CUSTOM and isinstance(existing.get('profile'), dict) \
+                and existing['profile'].get('base') == profile:
+            # Keep hand-edited overrides on top of the same preset
+            profile = existing['profile']
+        try:
+            profiles.apply(ssh_options, profile)
+        except ValueError as e:
+            self.show_popup("Warning", f"Invalid tuning profile: {e}")
+            return
+            
+        # Save VPN configuration, keeping sections the form does not edit (pac, routes)
+        self.saved_vpns[vpn_name] = {
+            **existing,
+            'username': username,
+            'ip': ip,
+            'password': password,
+            'port': port,
+            'ssh_options': ssh_options,
+            'socks_port': socks_port,
+            'connect_timeout': connect_timeout,
+            'multiplex': self.multiplex_checkbox.active,
+            'profile': profile,
+            'auth_method': credentials.method,
+            'key_file': credentials.key_file,
+            'tags': store.tags_of({'tags': self.tags_input.text}),
+            'connection_type': connection_type
+        }
+        
+        self.save_vpns()
+        self.update_vpn_entry(vpn_name)
+        self.append_output(f"VPN '{vpn_name}' saved successfully!")
+    
+    def delete_vpn(self, instance):
+        """Delete selected VPN"""
+        if not self.current_vpn:
+            self.show_popup("Warning", "Please select a VPN to delete")
+            return
+            
+        vpn_name = self.current_vpn
+        self.show_confirm_popup("Confirm Delete", 
+                              f"Are you sure you want to delete '{vpn_name}'?",
+                              self.confirm_delete)
+    
+    def confirm_delete(self):
+        """Confirm and delete VPN"""
+        if self.current_vpn:
+            del self.saved_vpns[self.current_vpn]
+            self.save_vpns()
+            self.update_vpn_entry(self.current_vpn)
+            self.append_output(f"VPN '{self.current_vpn}' deleted successfully!")
+            self.current_vpn = None
+    
+    def load_vpn_config(self, vpn_name):
+        """Load VPN configuration from selected item"""
+        self.current_vpn = vpn_name
+        config = self.saved_vpns.get(vpn_name)
+        
+        if config:
+            self.username_input.text = config.get('username', '')
+            self.ip_input.text = config.get('ip', '')
+            self.password_input.text = config.get('password', '')
+            self.port_input.text = config.get('port', '22')
+            self.ssh_options.text = config.get('ssh_options', DEFAULT_SSH_OPTIONS)
+            self.socks_port_input.text = config.get('socks_port', '1080')
+            self.connect_timeout_input.text = config.get('connect_timeout', str(int(readiness.DEFAULT_DEADLINE)))
+            self.multiplex_checkbox.active = bool(config.get('multiplex', False))
+            self.tags_input.text = ', '.join(store.tags_of(config))
+            credentials = auth.Credentials.from_config(config)
+            self.auth_spinner.text = credentials.method
+            self.key_file_input.text = credentials.key_file or ''
+            profile = config.get('profile') or profiles.CUSTOM
+            if isinstance(profile, dict):
+                profile = profile.get('base') or profiles.CUSTOM
+            self.profile_spinner.text = profile if profile in self.profile_spinner.values else profiles.CUSTOM
+            self.save_name_input.text = vpn_name
+            
+            # Set connection type if available
+            connection_type = config.get('connection_type', 'SSH Tunnel')
+            if connection_type in self.connection_type.values:
+                self.connection_type.text = connection_type
+                
+            self.append_output(f"Loaded VPN configuration: {vpn_name}")
+    
+    def form_credentials(self):
+        """Credentials from the form; raises ValueError for an unknown method"""
+        return auth.Credentials(self.auth_spinner.text, self.password_input.text,
+                                self.key_file_input.text.strip() or None)
+    
+    def install_key(self, instance):
+        """Copy a public key to the selected server and switch it to key auth"""
+        if not self.current_vpn or self.current_vpn not in self.saved_vpns:
+            self.show_popup("Warning", "Please save and select a VPN first")
+            return
+        if not self.password_input.text:
+            self.show_popup("Warning", "The password is needed once to install the key")
+            return
+        self.append_output(f"Installing SSH key on '{self.current_vpn}'...")
+        self.submit(self.execute_install_key(self.current_vpn, self.password_input.text,
+                                                 self.key_file_input.text.strip() or None))
+    
+    async def execute_install_key(self, vpn_name, password, key_file):
+        """Install the key off the UI thread and store the key auth settings"""
+        vpn = self.saved_vpns[vpn_name]
+        try:
+            key_file = await asyncio.to_thread(
+                auth.install_key, vpn.get('ip', ''), vpn.get('port') or 22, vpn.get('username', ''),
+                password, vpn.get('ssh_options', DEFAULT_SSH_OPTIONS), key_file)
+        except Exception as e:
+            self.append_output(f"Key install failed: {e}")
+            self.post_status("Key install failed", True)
+            return
+        self.saved_vpns[vpn_name] = {**vpn, 'auth_method': auth.KEY, 'key_file': key_file}
+        self.append_output(f"Key {key_file} installed; '{vpn_name}' now uses key authentication")
+        self.post_status("Key installed")
+        self.post_call(self.load_vpn_config, vpn_name)
+    
+    def show_import_popup(self, instance):
+        """Ask for an ssh_config, CSV or ssh:// list to bulk import"""
+        content = BoxLayout(orientation='vertical', spacing=10)
+        path_input = TextInput(text=os.path.expanduser('~/.ssh/config'), multiline=False,
+                               size_hint_y=None, height=30)
+        verify_checkbox = CheckBox(active=True, size_hint_x=0.2)
+        verify_row = BoxLayout(size_hint_y=None, height=30)
+        verify_row.add_widget(verify_checkbox)
+        verify_row.add_widget(Label(text='Check reachability and login before saving'))
+        content.add_widget(Label(text='ssh_config, CSV (name,host,port,user,...) or ssh://user@host:port list'))
+        content.add_widget(path_input)
+        content.add_widget(verify_row)
+        
+        btn_layout = BoxLayout(size_hint_y=0.4, spacing=10)
+        popup = Popup(title='Import Fleet', content=content, size_hint=(0.8, 0.5))
+        
+        def start(_):
+            popup.dismiss()
+            path = path_input.text.strip()
+            if path:
+                self.append_output(f"Importing servers from {path}...")
+                self.update_status("Importing...")
+                self.submit(self.execute_import(os.path.expanduser(path), verify_checkbox.active))
+        
+        btn_layout.add_widget(Button(text='Import', on_press=start))
+        btn_layout.add_widget(Button(text='Cancel', on_press=lambda x: popup.dismiss()))
+        content.add_widget(btn_layout)
+        popup.open()
+    
+    async def execute_import(self, path, verify=True):
+        """Parse and de-duplicate in a thread, validate on the loop, then save in one go"""
+        try:
+            start = time.perf_counter()
+            vpn_store = self.saved_vpns.store
+            if fleet.detect_format(path) == fleet.JSON:
+                count = await asyncio.to_thread(vpn_store.import_json, path)
+                self.append_output(f"Imported {count} VPNs from {path}")
+                self.post_call(self.refresh_vpn_list)
+                self.post_status(f"Imported {count} servers")
+                return
+            entries = await asyncio.to_thread(
+                lambda: fleet.plan(fleet.read_source(path), vpn_store.items()))
+            if verify:
+                pending = sum(1 for entry in entries if entry.status == fleet.NEW)
+                self.append_output(f"Checking {pending} new servers...")
+                await fleet.validate(entries)
+            saved = await asyncio.to_thread(fleet.commit, vpn_store, entries)
+            self.append_output(fleet.format_report(entries, saved, time.perf_counter() - start))
+            self.post_call(self.refresh_vpn_list)
+            self.post_status(f"Imported {saved} servers")
+        except (OSError, ValueError) as e:
+            self.append_output(f"Import failed: {e}")
+            self.post_status("Import failed", True)
+    
+    def ping_server(self, instance):
+        """Probe the server's SSH port to check connectivity"""
+        ip = self.ip_input.text.strip()
+        if not ip:
+            self.show_popup("Warning", "Please enter an IP address")
+            return
+            
+        try:
+            port = int(self.port_input.text.strip() or 22)
+        except ValueError:
+            port = 22
+            
+        self.append_output(f"Probing {ip}:{port}...")
+        self.update_status(f"Probing {ip}...")
+        
+        # Run probe on the background loop to avoid blocking the UI
+        self.submit(self.execute_ping(ip, port))
+    
+    async def execute_ping(self, ip, port=22):
+        """Measure TCP connect and SSH banner time for a single server"""
+        try:
+            name = self.current_vpn or ip
+            results = await probe.probe_all({name: {'ip': ip, 'port': str(port)}})
+            result = results[name]
+            self.probe_results[name] = result
+            self.post_call(self.apply_probe_results, {name: result})
+            
+            if result.reachable:
+                self.append_output(f"Server is reachable: {result.banner}")
+                self.append_output(probe.format_probe_table(results))
+                self.post_status("Ping successful")
+            else:
+                self.append_output("Probe failed! Server may be unreachable.")
+                self.append_output(f"Error: {', '.join(sorted(set(result.errors)))}")
+                self.post_status("Ping failed", True)
+                
+        except Exception as e:
+            self.append_output(f"Ping error: {str(e)}")
+            self.post_status("Ping error", True)
+    
+    def probe_all_servers(self, instance):
+        """Probe every saved VPN at the same time"""
+        if not self.saved_vpns:
+            self.show_popup("Warning", "No saved VPNs to probe")
+            return
+            
+        self.append_output(f"Probing {len(self.saved_vpns)} saved servers...")
+        self.update_status("Probing all servers...")
+        self.submit(self.execute_probe_all())
+    
+    async def execute_probe_all(self):
+        """Run the concurrent probe engine over all saved VPNs"""
+        try:
+            start = time.perf_counter()
+            results = await probe.probe_all(self.saved_vpns)
+            self.probe_results.update(results)
+            self.post_call(self.apply_probe_results, results)
+            elapsed = time.perf_counter() - start
+            
+            reachable = sum(1 for r in results.values() if r.reachable)
+            self.append_output(probe.format_probe_table(results))
+            self.append_output(f"Probed {len(results)} servers in {elapsed:.1f}s, {reachable} reachable")
+            self.post_status(f"{reachable}/{len(results)} servers reachable")
+        except Exception as e:
+            self.append_output(f"Probe error: {str(e)}")
+            self.post_status("Probe error", True)
+    
+    def connect_best_server(self, instance):
+        """Connect to the best-ranked saved VPN with automatic failover"""
+        if self.is_connected:
+            self.show_popup("Warning", "Please disconnect first")
+            return
+        if not self.saved_vpns:
+            self.show_popup("Warning", "No saved VPNs to choose from")
+            return
+            
+        self.update_status("Selecting best server...")
+        self.submit(self.execute_best_selection())
+    
+    async def execute_best_selection(self):
+        """Rank servers, probing first if there are no fresh measurements"""
+        try:
+            if not selection.has_fresh_results(self.saved_vpns, self.probe_results):
+                self.append_output("No recent probe data, probing all servers...")
+                results = await probe.probe_all(self.saved_vpns)
+                self.probe_results.update(results)
+                self.post_call(self.apply_probe_results, results)
+            
+            ranked = selection.rank_servers(self.saved_vpns, self.probe_results)
+            if not ranked:
+                self.append_output("No reachable servers found")
+                self.post_status("No reachable servers", True)
+                return
+            
+            self.append_output(f"Server ranking: {', '.join(ranked)}")
+            self.failover_pool = selection.FailoverPool(ranked)
+            self.post_call(self.failover_to_next)
+        except Exception as e:
+            self.append_output(f"Server selection error: {str(e)}")
+            self.post_status("Server selection error", True)
+    
+    def failover_to_next(self):
+        """Load and connect the next candidate from the failover pool"""
+        if not self.failover_pool:
+            if self.failover_pool is not None:
+                self.append_output("All ranked servers failed")
+                self.update_status("All servers failed", True)
+                self.failover_pool = None
+            return
+            
+        vpn_name = self.failover_pool.next()
+        self.append_output(f"Best server mode: connecting to '{vpn_name}'")
+        self.load_vpn_config(vpn_name)
+        self.connect_ssh()
+    
+    def on_tunnel_failed(self):
+        """Called from worker threads when a connect fails or a tunnel dies"""
+        # With hot standby, fail over by repointing the front door at a warm tunnel
+        if self.front_door is not None and self.standby_pool is not None:
+            name = self.standby_pool.first()
+            if name:
+                self.append_output(f"Failing over to standby '{name}'")
+                self.submit(self.execute_switch(name))
+                return
+        if self.failover_pool is not None:
+            self.post_call(self.failover_to_next)
+    
+    def toggle_balancer(self, instance):
+        """Start or stop the load-balancing SOCKS front-end"""
+        if self.balancer:
+            self.disconnect_ssh()
+            return
+        if self.is_connected:
+            self.show_popup("Warning", "Please disconnect first")
+            return
+            
+        # Prefer the best-ranked servers, otherwise every saved SOCKS tunnel
+        candidates = [name for name, vpn in self.saved_vpns.items()
+                      if vpn.get('connection_type', tunnel.SSH_TUNNEL) != tunnel.SSHUTTLE]
+        ranked = [name for name in selection.rank_servers(self.saved_vpns, self.probe_results)
+                  if name in candidates]
+        names = (ranked or candidates)[:LB_MAX_BACKENDS]
+        if not names:
+            self.show_popup("Warning", "No saved SOCKS tunnel VPNs to balance across")
+            return
+            
+        try:
+            listen_port = int(self.socks_port_input.text.strip())
+        except ValueError:
+            listen_port = 1080
+            
+        self.append_output(f"Starting load balancer on port {listen_port} across {len(names)} servers...")
+        self.update_status("Starting load balancer...")
+        self.submit(self.execute_balancer(listen_port, names, self.balancer_policy.text))
+    
+    async def execute_balancer(self, listen_port, names, policy):
+        """Bring up one backend tunnel per server and serve SOCKS5 on listen_port"""
+        allocator = self.tunnels.allocator
+        reserved = allocator.allocate(listen_port)
+        if reserved != listen_port:
+            allocator.release(reserved)
+            self.append_output(f"Port {listen_port} is already in use")
+            self.post_status("Load balancer failed", True)
+            return
+            
+        def start_backend(name):
+            if name in self.tunnels:
+                return name, self.tunnels.get(name), False
+            args = config.connection_args(self.saved_vpns[name])
+            args.update(socks_port=None)
+            record = self.tunnels.connect(name, on_event=self.on_supervisor_event, **args)
+            return name, record, True
+        
+        async def try_backend(name):
+            # Failures are returned, not raised, so one bad server does not cancel the group
+            try:
+                return await asyncio.to_thread(start_backend, name)
+            except Exception as e:
+                return e
+        
+        backends = []
+        started = []
+        for result in await aioloop.gather_all(try_backend(name) for name in names):
+            if isinstance(result, Exception):
+                self.append_output(f"Backend failed: {result}")
+                continue
+            name, record, is_new = result
+            if is_new:
+                started.append(name)
+            ssh_port = probe.server_port(self.saved_vpns[name])
+            backends.append(socks_lb.Backend(name, record.socks_port, probe_target=('127.0.0.1', ssh_port)))
+            self.append_output(f"Backend '{name}' on port {record.socks_port}")
+            self.post_row(name)
+        
+        allocator.release(listen_port)
+        try:
+            if not backends:
+                raise RuntimeError("no backend tunnel came up")
+            balancer = socks_lb.LoadBalancer(listen_port, backends, policy)
+            await balancer.start()
+        except Exception as e:
+            for name in started:
+                await asyncio.to_thread(self.tunnels.disconnect, name)
+            self.append_output(f"Load balancer failed: {e}")
+            self.post_status("Load balancer failed", True)
+            return
+            
+        self.balancer = balancer
+        self.balancer_tunnels = started
+        self.append_output(f"Load balancer ({policy}) listening on localhost:{listen_port} "
+                           f"with {len(backends)} backends")
+        self.post_connected(True)
+        self.post_status(f"Balancing across {len(backends)} servers")
+    
+    def toggle_row_tunnel(self, vpn_name):
+        """Bring a saved VPN's own tunnel up or down from its list row"""
+        if vpn_name in self.tunnels:
+            if vpn_name == self.active_tunnel:
+                self.disconnect_ssh()
+            else:
+                self.submit(self.execute_row_disconnect(vpn_name))
+            return
+            
+        if vpn_name not in self.saved_vpns:
+            return
+        try:
+            args = config.connection_args(self.saved_vpns[vpn_name])
+        except ValueError as e:
+            self.show_popup("Warning", f"'{vpn_name}': {e}")
+            return
+            
+        self.append_output(f"Starting tunnel '{vpn_name}'...")
+        self.submit(self.execute_row_connection(vpn_name, args))
+    
+    async def execute_row_connection(self, vpn_name, args):
+        """Start an additional tunnel for a saved VPN on its own SOCKS port"""
+        try:
+            record = await asyncio.to_thread(self.tunnels.connect, vpn_name, on_event=self.on_supervisor_event,
+                                             log=self.append_output, **args)
+            where = f"SOCKS port {record.socks_port}" if record.socks_port else "sshuttle"
+            self.append_output(f"Tunnel '{vpn_name}' up on {where} in {record.time_to_ready:.2f}s")
+        except (ValueError, RuntimeError, readiness.TunnelNotReady) as e:
+            self.append_output(f"Tunnel '{vpn_name}' failed: {e}")
+        except Exception as e:
+            self.append_output(f"Tunnel '{vpn_name}' error: {str(e)}")
+        self.post_row(vpn_name)
+    
+    async def execute_row_disconnect(self, vpn_name):
+        """Stop a row's tunnel without blocking the UI on process shutdown"""
+        await asyncio.to_thread(self.tunnels.disconnect, vpn_name)
+        self.append_output(f"Tunnel '{vpn_name}' disconnected")
+        self.post_row(vpn_name)
+    
+    def toggle_connection(self, instance):
+        """Toggle SSH connection"""
+        if (self.front_door is not None and self.current_vpn in self.saved_vpns
+                and self.current_vpn != self.active_tunnel):
+            # Another VPN is loaded: switch to it instead of disconnecting
+            self.ensure_standby_pool()
+            self.submit(self.execute_switch(self.current_vpn))
+            return
+        if self.is_connected:
+            self.disconnect_ssh()
+        else:
+            self.connect_ssh()
+    
+    def set_system_proxy(self, instance):
+        """Set system proxy to use SOCKS proxy"""
+        if not self.is_connected:
+            self.show_popup("Warning", "Please connect to VPN first")
+            return
+            
+        try:
+            socks_port = int(self.socks_port_input.text.strip())
+        except ValueError:
+            socks_port = 1080
+            
+        # gsettings/registry calls never run on the UI thread
+        self.submit(asyncio.to_thread(self.system_proxy.set_system_proxy, socks_port))
+    
+    def toggle_auto_proxy(self, instance):
+        """Toggle automatic system proxy setting"""
+        if not self.is_connected:
+            self.show_popup("Warning", "Please connect to VPN first")
+            return
+            
+        try:
+            socks_port = int(self.socks_port_input.text.strip())
+        except ValueError:
+            socks_port = 1080
+            
+        self.submit(self.execute_auto_proxy(socks_port))
+    
+    def tunnel_ports(self):
+        """Return (active tunnel port, {tunnel name: port}) for PAC routing"""
+        ports = {}
+        for name in self.tunnels.names():
+            record = self.tunnels.get(name)
+            if record and record.socks_port:
+                ports[name] = record.socks_port
+        active = ports.get(self.active_tunnel) or self.pac_default_port
+        return active, ports
+    
+    async def execute_auto_proxy(self, socks_port):
+        """Serve a split-tunnel PAC built from the active VPN's rules and install it"""
+        self.pac_default_port = socks_port
+        if self.pac_server is None:
+            source = pac.PacSource(lambda: self.saved_vpns.get(self.active_tunnel),
+                                   self.tunnel_ports, os.path.dirname(self.saved_vpns_file))
+            try:
+                self.pac_server = pac.PacServer(source).start()
+            except OSError as e:
+                self.append_output(f"PAC server failed to start: {e}")
+                await asyncio.to_thread(self.system_proxy.set_auto_proxy, socks_port)
+                return
+            self.append_output(f"PAC served at {self.pac_server.url} (reloads when rules change)")
+        script, _ = self.pac_server.source.current()
+        await asyncio.to_thread(self.system_proxy.set_auto_proxy, socks_port, script, self.pac_server.url)
+    
+    def connect_ssh(self):
+        """Establish SSH connection"""
+        username = self.username_input.text.strip()
+        ip = self.ip_input.text.strip()
+        password = self.password_input.text
+        port = self.port_input.text.strip()
+        ssh_options = self.ssh_options.text.strip()
+        connection_type = self.connection_type.text
+        
+        try:
+            socks_port = int(self.socks_port_input.text.strip())
+        except ValueError:
+            socks_port = 1080
+            
+        if not all([username, ip]):
+            self.show_popup("Warning", "Please fill all required fields")
+            return
+        if (self.standby_count() and self.current_vpn in self.saved_vpns
+                and connection_type != tunnel.SSHUTTLE):
+            # Hot standby works from saved VPNs so it can warm the next ones too
+            self.append_output(f"Connecting '{self.current_vpn}' with hot standby (saved settings)...")
+            self.update_status("Connecting...")
+            self.ensure_standby_pool()
+            self.submit(self.execute_switch(self.current_vpn, socks_port))
+            return
+        try:
+            credentials = self.form_credentials()
+            credentials.validate()
+        except ValueError as e:
+            self.show_popup("Warning", str(e))
+            return
+            
+        try:
+            port = int(port) if port else 22
+        except ValueError:
+            self.show_popup("Warning", "Port must be a valid number")
+            return
+            
+        try:
+            deadline = float(self.connect_timeout_input.text.strip())
+        except ValueError:
+            deadline = readiness.DEFAULT_DEADLINE
+            
+        profile = self.profile_spinner.text
+        saved_profile = self.saved_vpns.get(self.current_vpn, {}).get('profile')
+        if isinstance(saved_profile, dict) and saved_profile.get('base') == profile:
+            profile = saved_profile
+        try:
+            ssh_options = profiles.apply(ssh_options, profile)
+        except ValueError as e:
+            self.show_popup("Warning", f"Invalid tuning profile: {e}")
+            return
+            
+        self.append_output(f"Connecting to {username}@{ip}:{port}...")
+        self.update_status("Connecting...")
+        
+        # Connect on the background loop
+        self.submit(self.execute_ssh_connection(ip, port, username, password, ssh_options,
+                                                    connection_type, socks_port, deadline, credentials))
+    
+    async def execute_ssh_connection(self, ip, port, username, password, ssh_options, connection_type, socks_port,
+                               deadline=readiness.DEFAULT_DEADLINE, credentials=None):
+        """Execute SSH connection and wait until the tunnel is actually usable"""
+        try:
+            # Check if sshuttle is available
+            if connection_type == tunnel.SSHUTTLE:
+                if not tools.default_registry.available("sshuttle"):
+                    self.append_output("sshuttle not found. Please install it first.")
+                    self.append_output("On Ubuntu/Debian: sudo apt install sshuttle")
+                    self.append_output("Or using pip: pip install sshuttle")
+                    self.post_status("sshuttle not installed", True)
+                    return
+            
+            name = self.current_vpn or f"{username}@{ip}"
+            record = self.tunnels.get(name)
+            if record:
+                # Already running from its list row, just make it the active tunnel
+                self.append_output(f"Tunnel '{name}' is already running, using it")
+            else:
+                try:
+                    record = await asyncio.to_thread(
+                        self.tunnels.connect,
+                        name, ip, port, username, password, ssh_options, connection_type,
+                        socks_port, deadline, self.on_supervisor_event, self.append_output,
+                        multiplex=self.multiplex_checkbox.active,
+                        routes=dns.route_section(self.saved_vpns.get(name)),
+                        auth_method=credentials.method if credentials else None,
+                        key_file=credentials.key_file if credentials else None)
+                except (ValueError, RuntimeError, readiness.TunnelNotReady) as e:
+                    # Connection failed
+                    self.append_output(f"Connection failed: {e}")
+                    self.post_status("Connection failed", True)
+                    self.on_tunnel_failed()
+                    return
+            
+            self.active_tunnel = name
+            self.ssh_process = record.process
+            self.post_connected(True)
+            if record.time_to_ready is not None:
+                self.append_output(f"SSH VPN connection established successfully in {record.time_to_ready:.2f}s!")
+            
+            if connection_type == tunnel.SSHUTTLE:
+                self.append_output("Full VPN tunnel active using sshuttle")
+                self.append_output("Planned subnets are now routed through the VPN")
+            else:
+                if record.socks_port != socks_port:
+                    self.append_output(f"Port {socks_port} is busy, using {record.socks_port} instead")
+                    self.post_call(setattr, self.socks_port_input, 'text', str(record.socks_port))
+                self.append_output(f"SOCKS proxy running on localhost:{record.socks_port}")
+                self.append_output("Configure your browser or system to use this proxy")
+            await self.start_dns_cache(name, record.socks_port)
+            
+            self.post_status("Connected")
+            self.post_row(name)
+                
+        except Exception as e:
+            self.append_output(f"Connection error: {str(e)}")
+            self.post_status("Connection error", True)
+            self.on_tunnel_failed()
+    
+    async def start_dns_cache(self, name, socks_port):
+        """Serve a caching DNS stub on loopback that resolves through the tunnel"""
+        await self.stop_dns_cache()
+        stub = dns.stub_for(self.saved_vpns.get(name), socks_port)
+        if stub is None:
+            return
+        try:
+            self.dns_stub = await stub.start()
+        except OSError as e:
+            self.append_output(f"DNS cache failed to start on port {stub.port}: {e}")
+            return
+        self.append_output(f"DNS cache on {stub.address} (UDP/TCP), resolving via {stub.upstream.describe()} "
+                           f"through the tunnel; point your resolver at it")
+    
+    def standby_count(self):
+        text = self.standby_spinner.text
+        return int(text) if text.isdigit() else 0
+    
+    def ensure_standby_pool(self):
+        """The standby pool, created or updated from the Hot Standby settings (UI thread)"""
+        try:
+            idle_timeout = float(self.standby_idle_input.text.strip())
+        except ValueError:
+            idle_timeout = standby.DEFAULT_IDLE_TIMEOUT
+        if self.standby_pool is None:
+            self.standby_pool = standby.StandbyPool(
+                self.tunnels, lambda name: config.connection_args(self.saved_vpns[name]),
+                self.standby_count(), idle_timeout, self.on_supervisor_event, self.append_output)
+            self.submit(self.standby_reap_loop(self.standby_pool))
+        else:
+            self.standby_pool.size = self.standby_count()
+            self.standby_pool.idle_timeout = idle_timeout
+        return self.standby_pool
+    
+    async def execute_switch(self, name, socks_port=None):
+        """Make name the active tunnel behind the front door, warm if possible"""
+        start = time.perf_counter()
+        pool = self.standby_pool
+        if pool is None:
+            return
+        if self.front_door is None:
+            # Bound before any tunnel so the port allocator cannot hand it out
+            front_door = standby.FrontDoor(socks_port or config.DEFAULT_SOCKS_PORT)
+            try:
+                await front_door.start()
+            except OSError as e:
+                self.append_output(f"SOCKS port {front_door.listen_port} unavailable: {e}")
+                self.post_status("Connection failed", True)
+                return
+            self.front_door = front_door
+        record = await asyncio.to_thread(pool.take, name)
+        warm = record is not None
+        if record is None:
+            record = self.tunnels.get(name)
+        if record is None:
+            try:
+                args = config.connection_args(self.saved_vpns[name])
+                args['socks_port'] = None
+                record = await asyncio.to_thread(self.tunnels.connect, name, on_event=self.on_supervisor_event,
+                                                 log=self.append_output, **args)
+            except (KeyError, ValueError, RuntimeError, readiness.TunnelNotReady) as e:
+                self.append_output(f"Connection to '{name}' failed: {e}")
+                self.post_status("Connection failed", True)
+                self.on_tunnel_failed()
+                return
+        if record.connection_type == tunnel.SSHUTTLE:
+            self.append_output(f"'{name}' is already running as a full VPN and cannot sit behind the SOCKS port")
+            return
+        if self.front_door is None:
+            # Disconnected while the tunnel was coming up
+            return
+            
+        self.front_door.switch(name, record.socks_port, probe.server_port(self.saved_vpns.get(name) or {}))
+        previous, self.active_tunnel = self.active_tunnel, name
+        self.ssh_process = record.process
+        self.post_connected(True)
+        elapsed = time.perf_counter() - start
+        if warm:
+            self.append_output(f"Switched to warm standby '{name}' in {elapsed * 1000:.1f} ms")
+        else:
+            self.append_output(f"Connected '{name}' in {elapsed:.2f}s")
+        self.append_output(f"SOCKS proxy running on localhost:{self.front_door.listen_port} "
+                           f"(tunnel port {record.socks_port})")
+        self.post_status("Connected")
+        self.post_row(name)
+        
+        if previous and previous != name:
+            # The old tunnel stays up as a standby if there is room, finishing its open sessions
+            if not pool.adopt(previous):
+                await asyncio.to_thread(self.tunnels.disconnect, previous)
+            self.post_row(previous)
+        if self.dns_stub is None:
+            # Resolving through the front door keeps the cache across switches
+            await self.start_dns_cache(name, self.front_door.listen_port)
+        await self.refill_standby()
+    
+    async def refill_standby(self):
+        """Warm the next-best saved VPNs after the active one"""
+        pool = self.standby_pool
+        if pool is None or self.standby_filling:
+            return
+        self.standby_filling = True
+        try:
+            candidates = selection.rank_servers(self.saved_vpns, self.probe_results) or list(self.saved_vpns)
+            started = await asyncio.to_thread(pool.fill, candidates, [self.active_tunnel])
+            for name in started:
+                self.post_row(name)
+        finally:
+            self.standby_filling = False
+    
+    async def standby_reap_loop(self, pool):
+        """Drop standbys that have sat unused past the idle timeout"""
+        while pool is self.standby_pool:
+            await asyncio.sleep(standby.REAP_INTERVAL)
+            for name in await asyncio.to_thread(pool.reap):
+                self.append_output(f"Standby '{name}' idle for {pool.idle_timeout:.0f}s, disconnected")
+                self.post_row(name)
+    
+    async def stop_dns_cache(self):
+        stub, self.dns_stub = self.dns_stub, None
+        if stub is None:
+            return
+        stats = stub.stats()
+        await stub.close()
+        self.append_output(f"DNS cache stopped: {stats['hits']} hits, {stats['upstream_queries']} upstream "
+                           f"queries, {stats['coalesced']} coalesced")
+    
+    def on_supervisor_event(self, supervised, state, message):
+        """Reflect supervisor state changes in the UI (called from its thread)"""
+        name = supervised.name
+        self.post_row(name)
+        if state == supervisor.STOPPED:
+            return
+        if state == supervisor.FAILED:
+            self.append_output(f"Tunnel '{name}' gave up: {message}")
+            self.tunnels.disconnect(name)
+        elif state == supervisor.RESTARTING and message:
+            self.append_output(f"Tunnel '{name}' dropped ({message}), reconnecting...")
+        elif state == supervisor.RUNNING and supervised.restart_count:
+            self.append_output(f"Tunnel '{name}' reconnected (restart #{supervised.restart_count})")
+            
+        if name != self.active_tunnel:
+            return
+        if state == supervisor.RUNNING:
+            self.ssh_process = supervised.process
+            if supervised.restart_count:
+                self.post_connected(True)
+                self.post_status("Connected")
+        elif state == supervisor.RESTARTING:
+            self.ssh_process = None
+            self.post_status("Reconnecting...")
+        elif state == supervisor.FAILED:
+            self.ssh_process = None
+            self.active_tunnel = None
+            self.post_connected(False)
+            self.post_status("Tunnel failed", True)
+            self.on_tunnel_failed()
+    
+    def disconnect_ssh(self):
+        """Disconnect SSH connection"""
+        # A manual disconnect ends best server mode
+        self.failover_pool = None
+        if self.ssh_process or self.active_tunnel or self.balancer or self.front_door:
+            self.append_output("Disconnecting SSH VPN...")
+            self.update_status("Disconnecting...")
+            
+            front_door, self.front_door = self.front_door, None
+            standby_pool, self.standby_pool = self.standby_pool, None
+            balancer, self.balancer = self.balancer, None
+            backend_names, self.balancer_tunnels = self.balancer_tunnels, []
+            name, self.active_tunnel = self.active_tunnel, None
+            process, self.ssh_process = self.ssh_process, None
+            self.is_connected = False
+            
+            # Process shutdown and proxy restore run on the background loop
+            self.submit(self.execute_disconnect(name, process, balancer, backend_names,
+                                                    front_door, standby_pool))
+    
+    async def execute_disconnect(self, name, process, balancer, backend_names, front_door=None,
+                                 standby_pool=None):
+        """Tear down the active tunnel or balancer and restore the system proxy"""
+        try:
+            if front_door:
+                await front_door.close()
+            if standby_pool:
+                for standby_name in await asyncio.to_thread(standby_pool.clear):
+                    self.post_row(standby_name)
+            if balancer:
+                await balancer.close()
+                for backend_name in backend_names:
+                    await asyncio.to_thread(self.tunnels.disconnect, backend_name)
+                    self.post_row(backend_name)
+            
+            # Stopping the registry entry also stops its supervisor
+            if name:
+                await asyncio.to_thread(self.tunnels.disconnect, name)
+                self.post_row(name)
+            await asyncio.to_thread(tunnel.terminate, process)
+            await self.stop_dns_cache()
+        except Exception as e:
+            self.append_output(f"Error during disconnect: {str(e)}")
+        self.append_output("SSH VPN disconnected")
+        
+        # Reset system proxy
+        await asyncio.to_thread(self.system_proxy.restore)
+        
+        self.post_status("Disconnected")
+    
+    def show_popup(self, title, message):
+        """Show a simple popup message"""
+        popup = Popup(title=title,
+                     content=Label(text=message),
+                     size_hint=(0.8, 0.4))
+        popup.open()
+    
+    def show_confirm_popup(self, title, message, callback):
+        """Show a confirmation popup"""
+        content = BoxLayout(orientation='vertical')
+        content.add_widget(Label(text=message))
+        
+        btn_layout = BoxLayout(size_hint_y=0.4, spacing=10)
+        yes_btn = Button(text='Yes', on_press=lambda x: self.confirm_popup_action(popup, callback))
+        no_btn = Button(text='No', on_press=lambda x: popup.dismiss())
+        btn_layout.add_widget(yes_btn)
+        btn_layout.add_widget(no_btn)
+        
+        content.add_widget(btn_layout)
+        
+        popup = Popup(title=title, content=content, size_hint=(0.8, 0.4))
+        popup.open()
+    
+    def confirm_popup_action(self, popup, callback):
+        """Handle confirmation popup action"""
+        popup.dismiss()
+        callback()
+    
+    def on_stop(self):
+        """Tear down every running tunnel when the app closes"""
+        self.failover_pool = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.pac_server:
+            self.pac_server.stop()
+        if self.dns_stub:
+            try:
+                self.aio.run(self.dns_stub.close(), timeout=5)
+            except Exception:
+                pass
+        if self.front_door:
+            try:
+                self.aio.run(self.front_door.close(), timeout=5)
+            except Exception:
+                pass
+        if self.balancer:
+            try:
+                self.aio.run(self.balancer.close(), timeout=5)
+            except Exception:
+                pass
+        self.tunnels.disconnect_all()
+        proxy_engine.use_loop(None)
+        self.aio.stop()
+    
+    def on_is_connected(self, instance, value):
+        """Update UI when connection status changes"""
+        if value:
+            self.connect_btn.text = "Disconnect VPN"
+            self.connect_btn.background_color = (1, 0.5, 0.5, 1)  # Light red
+        else:
+            self.connect_btn.text = "Connect VPN"
+            self.connect_btn.background_color = (0.5, 1, 0.5, 1)  # Light green
+        self.balance_btn.text = "Stop Balancer" if value and self.balancer else "Load Balance"
+
+def run():
+    """Start the Kivy GUI"""
+    # Passwords go through SSH_ASKPASS, so only the OpenSSH client is needed
+    if not tools.default_registry.available("ssh"):
+        print("ssh not found. Please install the OpenSSH client.")
+        print("On Ubuntu/Debian: sudo apt install openssh-client")
+    
+    # Version probes happen off the startup path
+    tools.default_registry.warm_up_in_background()
+    SSHVPNManager().run()
@@ -0,0 +1,45 @@
+"""Bounded, thread-safe log line store"""
+import collections
+import threading
+
+DEFAULT_MAX_LINES = 5000
+
+
+class LogStore:
+    """Ring buffer of log lines with monotonically increasing sequence numbers
+
+    Writers on any thread call append(); readers poll since(seq) for the
+    lines they have not seen yet. Memory stays bounded by max_lines.
+    """
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES):
+        self.max_lines = max_lines
+        self.lines = collections.deque(maxlen=max_lines)
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def append(self, message, source=None):
+        """Add a message, splitting it into one entry per line"""
+        prefix = f"[{source}] " if source else ''
+        with self.lock:
+            for line in str(message).split('\n'):
+                self.seq += 1
+                self.lines.append((self.seq, prefix + line))
+
+    def since(self, seq):
+        """Return (last_seq, lines) for entries newer than seq that are still stored"""
+        with self.lock:
+            if seq >= self.seq:
+                return self.seq, []
+            missing = self.seq - seq
+            if missing >= len(self.lines):
+                return self.seq, [line for _, line in self.lines]
+            return self.seq, [line for _, line in list(self.lines)[-missing:]]
+
+    def tail(self, count):
+        with self.lock:
+            return [line for _, line in list(self.lines)[-count:]]
+
+    def clear(self):
+        with self.lock:
+            self.lines.clear()
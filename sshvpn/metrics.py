@@ -0,0 +1,287 @@
+"""Per-tunnel traffic and latency metrics with a Prometheus text exporter"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sshvpn import tunnel
+
+DEFAULT_METRICS_PORT = 9105
+HANDSHAKE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TCP_ESTABLISHED = '01'
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=HANDSHAKE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def render(self, metric, labels):
+        lines = []
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{metric}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{metric}_count{{{labels}}} {self.count}')
+        return lines
+
+
+def process_tree(pid):
+    """Return pid and all of its descendants, read from /proc"""
+    children = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return [pid]
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, so split after ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def process_io(pids):
+    """Sum rchar/wchar over pids; returns (read_bytes, write_bytes)"""
+    read_total = write_total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/io') as f:
+                fields = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        read_total += int(fields.get('rchar', 0))
+        write_total += int(fields.get('wchar', 0))
+    return read_total, write_total
+
+
+def socks_sessions(port):
+    """Return the set of established client connections on a local SOCKS port"""
+    sessions = set()
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table) as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 4 or fields[3] != TCP_ESTABLISHED:
+                        continue
+                    local_port = int(fields[1].rsplit(':', 1)[1], 16)
+                    if local_port == port:
+                        sessions.add(fields[2])
+        except OSError:
+            continue
+    return sessions
+
+
+class TunnelMetrics:
+    """Accumulated metrics for one tunnel name"""
+
+    def __init__(self, name):
+        self.name = name
+        self.handshakes = Histogram()
+        self.seen_launches = 0
+        self.seen_initial = False
+        self.sessions = set()
+        self.connects_total = 0
+        self.connects_per_s = 0.0
+        self.io_read = 0
+        self.io_write = 0
+        self.snapshot = {}
+        self.channels = {}
+        self.sampled_at = None
+
+
+class MetricsCollector:
+    """Sample tunnel registry and balancer state into TunnelMetrics"""
+
+    def __init__(self, tunnels, balancer_getter=None):
+        self.tunnels = tunnels
+        self.balancer_getter = balancer_getter
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def sample(self):
+        """Refresh all tunnel metrics and return them keyed by name"""
+        with self.lock:
+            now = time.monotonic()
+            active = set()
+            for record in list(self.tunnels.tunnels.values()):
+                active.add(record.name)
+                m = self.metrics.get(record.name)
+                if m is None:
+                    m = self.metrics[record.name] = TunnelMetrics(record.name)
+                self._sample_record(m, record, now)
+            for name in list(self.metrics):
+                if name not in active:
+                    del self.metrics[name]
+            return dict(self.metrics)
+
+    def _sample_record(self, m, record, now):
+        m.snapshot = record.stats()
+        if not m.seen_initial and record.time_to_ready is not None:
+            m.handshakes.observe(record.time_to_ready)
+            m.seen_initial = True
+        supervised = record.supervisor
+        if supervised is not None and supervised.launch_count > m.seen_launches:
+            m.handshakes.observe(supervised.launch_seconds)
+            m.seen_launches = supervised.launch_count
+
+        process = record.process
+        if record.connection_type == tunnel.IN_PROCESS and process is not None:
+            # Exact per-channel counters instead of /proc guesses for the whole app
+            m.channels = process.stats()
+            m.io_read, m.io_write = process.bytes_down, process.bytes_up
+        elif process is not None and process.poll() is None:
+            m.io_read, m.io_write = process_io(process_tree(process.pid))
+
+        if record.socks_port:
+            sessions = socks_sessions(record.socks_port)
+            new = len(sessions - m.sessions)
+            m.connects_total += new
+            if m.sampled_at is not None and now > m.sampled_at:
+                m.connects_per_s = new / (now - m.sampled_at)
+            m.sessions = sessions
+        m.sampled_at = now
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        metrics = self.sample()
+        lines = [
+            '# HELP sshvpn_tunnel_up Whether the tunnel process is running',
+            '# TYPE sshvpn_tunnel_up gauge',
+        ]
+        for m in metrics.values():
+            lines.append(f'sshvpn_tunnel_up{{{_labels(m)}}} {int(m.snapshot.get("state") == "running")}')
+        _section(lines, 'sshvpn_tunnel_uptime_seconds', 'gauge', 'Seconds since the tunnel last came up',
+                 metrics, lambda m: m.snapshot.get('uptime', 0.0))
+        _section(lines, 'sshvpn_tunnel_reconnects_total', 'counter', 'Supervisor restarts of the tunnel',
+                 metrics, lambda m: m.snapshot.get('restarts', 0))
+        _section(lines, 'sshvpn_tunnel_stalls_total', 'counter', 'Stalled SOCKS listener detections',
+                 metrics, lambda m: m.snapshot.get('stalls', 0))
+        _section(lines, 'sshvpn_tunnel_socks_sessions', 'gauge', 'Established SOCKS client connections',
+                 metrics, lambda m: len(m.sessions))
+        _section(lines, 'sshvpn_tunnel_socks_connects_total', 'counter', 'SOCKS client connections seen',
+                 metrics, lambda m: m.connects_total)
+        _section(lines, 'sshvpn_tunnel_io_read_bytes_total', 'counter',
+                 'Bytes read by the tunnel process tree (all fds)', metrics, lambda m: m.io_read)
+        _section(lines, 'sshvpn_tunnel_io_write_bytes_total', 'counter',
+                 'Bytes written by the tunnel process tree (all fds)', metrics, lambda m: m.io_write)
+        in_process = {name: m for name, m in metrics.items() if m.channels}
+        _section(lines, 'sshvpn_tunnel_channels_open', 'gauge', 'Open SSH channels (in-process transport)',
+                 in_process, lambda m: m.channels['channels_open'])
+        _section(lines, 'sshvpn_tunnel_channels_total', 'counter', 'SSH channels opened (in-process transport)',
+                 in_process, lambda m: m.channels['channels_total'])
+        _section(lines, 'sshvpn_tunnel_channel_errors_total', 'counter', 'Rejected channel opens (in-process transport)',
+                 in_process, lambda m: m.channels['channel_errors'])
+        _section(lines, 'sshvpn_tunnel_channel_open_p50_seconds', 'gauge', 'Median channel open latency',
+                 in_process, lambda m: (m.channels['open_latency_p50_ms'] or 0) / 1000)
+        _section(lines, 'sshvpn_tunnel_flow_waits_total', 'counter', 'Writes that waited on the SSH window',
+                 in_process, lambda m: m.channels['flow_waits'])
+        lines.append('# HELP sshvpn_tunnel_handshake_seconds Time from launch to a usable tunnel')
+        lines.append('# TYPE sshvpn_tunnel_handshake_seconds histogram')
+        for m in metrics.values():
+            lines.extend(m.handshakes.render('sshvpn_tunnel_handshake_seconds', _labels(m)))
+
+        balancer = self.balancer_getter() if self.balancer_getter else None
+        if balancer is not None:
+            lines.append('# TYPE sshvpn_balancer_bytes_total counter')
+            lines.append(f'sshvpn_balancer_bytes_total{{direction="in"}} {balancer.bytes_in}')
+            lines.append(f'sshvpn_balancer_bytes_total{{direction="out"}} {balancer.bytes_out}')
+            lines.append('# TYPE sshvpn_balancer_backend_sessions gauge')
+            for backend in balancer.backends:
+                lines.append(f'sshvpn_balancer_backend_sessions{{backend="{_escape(backend.name)}"}} {backend.active}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Compact one-line-per-tunnel text for the UI panel"""
+        lines = []
+        for m in self.sample().values():
+            s = m.snapshot
+            lines.append(
+                f"{m.name}: {s.get('state')} up {s.get('uptime', 0):.0f}s  "
+                f"sessions {len(m.sessions)}  {m.connects_per_s:.1f} conn/s  "
+                f"io {_human(m.io_read)}/{_human(m.io_write)}  restarts {s.get('restarts', 0)}"
+            )
+        return '\n'.join(lines) or 'No active tunnels'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(m):
+    return f'tunnel="{_escape(m.name)}"'
+
+
+def _section(lines, metric, kind, help_text, metrics, value):
+    lines.append(f'# HELP {metric} {help_text}')
+    lines.append(f'# TYPE {metric} {kind}')
+    for m in metrics.values():
+        lines.append(f'{metric}{{{_labels(m)}}} {value(m)}')
+
+
+def _human(n):
+    for unit in ('B', 'K', 'M', 'G'):
+        if n < 1024:
+            return f"{n:.0f}{unit}"
+        n /= 1024
+    return f"{n:.1f}T"
+
+
+class MetricsServer:
+    """Serve a collector's /metrics endpoint on loopback from a background thread"""
+
+    def __init__(self, collector, port=DEFAULT_METRICS_PORT, host='127.0.0.1'):
+        collector_ref = collector
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = collector_ref.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
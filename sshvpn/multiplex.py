@@ -0,0 +1,217 @@
+"""SSH ControlMaster connection sharing for tunnels and health checks"""
+import hashlib
+import os
+import shlex
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from sshvpn import readiness
+
+DEFAULT_PERSIST = 600.0
+
+
+def control_dir():
+    """Return a private directory for control sockets, creating it if needed"""
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    path = os.path.join(tempfile.gettempdir(), f"ssh-vpn-{uid}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def control_path(username, ip, port):
+    """Return a short, stable control socket path for a server
+
+    Unix socket paths are limited to about 104 bytes, so the server
+    identity is hashed rather than embedded.
+    """
+    digest = hashlib.sha1(f"{username}@{ip}:{port}".encode()).hexdigest()[:16]
+    return os.path.join(control_dir(), f"cm-{digest}")
+
+
+def is_alive(path):
+    """Return True if a master is accepting connections on its control socket"""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1.0)
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def remove_stale(path):
+    """Delete a control socket left behind by a dead master"""
+    if os.path.exists(path) and not is_alive(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def master_command(ip, port, username, credentials, ssh_options, path):
+    """Build the command for a foreground ControlMaster with no session"""
+    return [
+        "ssh",
+        *credentials.ssh_args(),
+        *shlex.split(ssh_options),
+        "-o", "ControlMaster=yes",
+        "-o", f"ControlPath={path}",
+        "-N",
+        "-p", str(port),
+        f"{username}@{ip}"
+    ]
+
+
+def control_command(path, username, ip, operation, *args):
+    """Build an ssh -O command that talks to an existing master"""
+    return ["ssh", "-S", path, "-O", operation, *args, f"{username}@{ip}"]
+
+
+class Master:
+    """One persistent ControlMaster process for a server"""
+
+    def __init__(self, ip, port, username, credentials, ssh_options):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.credentials = credentials
+        self.ssh_options = ssh_options
+        self.path = control_path(username, ip, port)
+        self.process = None
+        self.forwards = set()
+        self.idle_timer = None
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None and is_alive(self.path)
+
+    def ensure(self, deadline=readiness.DEFAULT_DEADLINE, on_line=None):
+        """Start the master if needed and wait for its control socket
+
+        Returns the seconds spent, which is close to zero when the master
+        is already up.
+        """
+        start = time.monotonic()
+        with self.lock:
+            self.cancel_idle()
+            if self.running:
+                return time.monotonic() - start
+            if self.process is not None and self.process.poll() is None:
+                self.process.kill()
+            remove_stale(self.path)
+            self.forwards.clear()
+            self.process = subprocess.Popen(
+                master_command(self.ip, self.port, self.username, self.credentials, self.ssh_options, self.path),
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                env=self.credentials.env())
+            collector = readiness.StreamCollector(self.process.stderr, on_line=on_line)
+            while not is_alive(self.path):
+                if self.process.poll() is not None:
+                    collector.closed.wait(1.0)
+                    raise readiness.TunnelNotReady(collector.text().strip() or
+                                                   f"master exited with code {self.process.returncode}")
+                if time.monotonic() - start >= deadline:
+                    self.process.kill()
+                    raise readiness.TunnelNotReady(f"control master not ready after {deadline:.0f}s")
+                time.sleep(readiness.POLL_INTERVAL)
+        return time.monotonic() - start
+
+    def run_control(self, operation, *args, timeout=10):
+        return subprocess.run(control_command(self.path, self.username, self.ip, operation, *args),
+                              capture_output=True, text=True, timeout=timeout)
+
+    def add_dynamic_forward(self, socks_port):
+        """Ask the master to open a -D SOCKS listener on socks_port"""
+        result = self.run_control("forward", "-D", str(socks_port))
+        if result.returncode != 0:
+            raise readiness.TunnelNotReady(result.stderr.strip() or "forward request rejected")
+        self.forwards.add(socks_port)
+
+    def cancel_dynamic_forward(self, socks_port):
+        if socks_port not in self.forwards:
+            return
+        self.forwards.discard(socks_port)
+        if self.running:
+            self.run_control("cancel", "-D", str(socks_port))
+
+    def check(self):
+        """Health check over the existing connection, no new handshake"""
+        if not self.running:
+            return False
+        try:
+            return self.run_control("check", timeout=5).returncode == 0
+        except (subprocess.TimeoutExpired, OSError):
+            return False
+
+    def schedule_idle_exit(self, persist):
+        """Exit the master after persist seconds unless it is reused"""
+        self.cancel_idle()
+        self.idle_timer = threading.Timer(persist, self.close)
+        self.idle_timer.daemon = True
+        self.idle_timer.start()
+
+    def cancel_idle(self):
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def close(self):
+        """Stop the master and remove its control socket"""
+        self.cancel_idle()
+        if self.running:
+            try:
+                self.run_control("exit", timeout=5)
+            except (subprocess.TimeoutExpired, OSError):
+                pass
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        self.forwards.clear()
+        remove_stale(self.path)
+
+
+class MasterPool:
+    """Masters keyed by VPN name, kept alive for persist seconds when idle"""
+
+    def __init__(self, persist=DEFAULT_PERSIST):
+        self.persist = persist
+        self.masters = {}
+        self.lock = threading.Lock()
+
+    def get(self, name, ip, port, username, credentials, ssh_options):
+        with self.lock:
+            master = self.masters.get(name)
+            if master is None or (master.ip, master.port, master.username) != (ip, port, username):
+                if master is not None:
+                    master.close()
+                master = Master(ip, port, username, credentials, ssh_options)
+                self.masters[name] = master
+            master.credentials = credentials
+            master.ssh_options = ssh_options
+            return master
+
+    def release(self, name, socks_port=None):
+        """Drop a tunnel's forward and let the master idle out"""
+        master = self.masters.get(name)
+        if master is None:
+            return
+        if socks_port:
+            master.cancel_dynamic_forward(socks_port)
+        if not master.forwards:
+            master.schedule_idle_exit(self.persist)
+
+    def close_all(self):
+        with self.lock:
+            masters, self.masters = list(self.masters.values()), {}
+        for master in masters:
+            master.close()
@@ -0,0 +1,318 @@
+"""Split-tunnel PAC generation and a local PAC server
+
+Rules come from the "pac" section of a saved VPN:
+
+    "pac": {
+        "default": "proxy",                  # or "direct"
+        "direct": ["10.0.0.0/8", ".lan"],    # never tunnelled
+        "proxy": ["example.com"],            # via this VPN's tunnel
+        "routes": {"Other VPN": [".corp"]},  # via another running tunnel
+        "lists": [{"path": "cn.txt", "action": "direct"}]
+    }
+
+Patterns are IPv4 CIDRs or domain suffixes. They compile into two hash
+tables inside the PAC script: domains are matched label by label and
+networks by one lookup per distinct prefix length, so large lists cost
+the same per request as small ones.
+"""
+import hashlib
+import ipaddress
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIRECT = 'DIRECT'
+PROXY = 'proxy'
+DEFAULT_PAC_PORT = 8087
+# Never worth a round trip through the tunnel
+LOCAL_NETWORKS = ('10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '127.0.0.0/8', '169.254.0.0/16')
+LOCAL_DOMAINS = ('localhost', 'local')
+
+
+def socks_directive(port):
+    return f"SOCKS5 127.0.0.1:{port}; SOCKS 127.0.0.1:{port}"
+
+
+def parse_pattern(pattern):
+    """Return ('net', IPv4Network) or ('domain', suffix), or None if unusable"""
+    pattern = pattern.strip().lower()
+    if not pattern or pattern.startswith('#'):
+        return None
+    try:
+        network = ipaddress.ip_network(pattern, strict=False)
+    except ValueError:
+        suffix = pattern.lstrip('*').lstrip('.')
+        return ('domain', suffix) if suffix else None
+    # PAC's dnsResolve() only returns IPv4, so IPv6 rules could never match
+    return ('net', network) if network.version == 4 else None
+
+
+def read_list(path):
+    """Read one pattern per line from an imported list file"""
+    try:
+        with open(os.path.expanduser(path), encoding='utf-8') as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+class PacRules:
+    """Compiled include/exclude rules mapping hosts to a target
+
+    A target is DIRECT, PROXY (the owning VPN's tunnel) or the name of
+    another tunnel. The most specific domain suffix or network wins.
+    """
+
+    def __init__(self, default=PROXY):
+        self.default = default
+        self.domains = {}
+        self.networks = {}
+
+    def add(self, pattern, target):
+        parsed = parse_pattern(pattern)
+        if parsed is None:
+            return False
+        kind, value = parsed
+        if kind == 'domain':
+            self.domains[value] = target
+        else:
+            self.networks[value] = target
+        return True
+
+    def add_all(self, patterns, target):
+        return sum(1 for pattern in patterns if self.add(pattern, target))
+
+    @classmethod
+    def from_config(cls, vpn_config, base_dir=None):
+        """Build rules from a saved VPN's "pac" section"""
+        section = vpn_config.get('pac') or {}
+        rules = cls(DIRECT if section.get('default') == 'direct' else PROXY)
+        rules.add_all(LOCAL_NETWORKS, DIRECT)
+        rules.add_all(LOCAL_DOMAINS, DIRECT)
+        for entry in section.get('lists', []):
+            path = entry.get('path', '')
+            if base_dir and not os.path.isabs(os.path.expanduser(path)):
+                path = os.path.join(base_dir, path)
+            action = entry.get('action', PROXY)
+            rules.add_all(read_list(path), DIRECT if action == 'direct' else action)
+        for tunnel, patterns in (section.get('routes') or {}).items():
+            rules.add_all(patterns, tunnel)
+        # Explicit rules are added last so they override imported lists
+        rules.add_all(section.get('proxy', []), PROXY)
+        rules.add_all(section.get('direct', []), DIRECT)
+        return rules
+
+    @staticmethod
+    def list_paths(vpn_config, base_dir=None):
+        paths = []
+        for entry in (vpn_config.get('pac') or {}).get('lists', []):
+            path = os.path.expanduser(entry.get('path', ''))
+            if base_dir and not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            paths.append(path)
+        return paths
+
+    def resolve_target(self, target, tunnel_ports, own_port):
+        """Turn a rule target into a PAC return value"""
+        if target == DIRECT:
+            return DIRECT
+        if target == PROXY:
+            return socks_directive(own_port)
+        port = tunnel_ports.get(target)
+        # A route to a tunnel that is not running falls back to this VPN
+        return socks_directive(port if port else own_port)
+
+    def lookup(self, host, tunnel_ports, own_port):
+        """Python twin of FindProxyForURL (without the DNS fallback)"""
+        host = host.lower()
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            address = None
+        if address is None:
+            labels = host.split('.')
+            for i in range(len(labels)):
+                target = self.domains.get('.'.join(labels[i:]))
+                if target is not None:
+                    return self.resolve_target(target, tunnel_ports, own_port)
+            if '.' not in host:
+                return DIRECT
+        elif address.version == 4:
+            for network in sorted(self.networks, key=lambda n: -n.prefixlen):
+                if address in network:
+                    return self.resolve_target(self.networks[network], tunnel_ports, own_port)
+        return self.resolve_target(self.default, tunnel_ports, own_port)
+
+    def compile(self, tunnel_ports, own_port):
+        """Generate the PAC script for the given tunnel ports"""
+        results = []
+        index = {}
+
+        def result_id(target):
+            value = self.resolve_target(target, tunnel_ports, own_port)
+            if value not in index:
+                index[value] = len(results)
+                results.append(value)
+            return index[value]
+
+        domains = {suffix: result_id(target) for suffix, target in self.domains.items()}
+        by_prefix = {}
+        for network, target in self.networks.items():
+            by_prefix.setdefault(network.prefixlen, {})[str(int(network.network_address))] = result_id(target)
+        prefixes = sorted(by_prefix, reverse=True)
+        nets = {str(length): by_prefix[length] for length in prefixes}
+        default = result_id(self.default)
+        return PAC_TEMPLATE % {
+            'results': json.dumps(results),
+            'domains': json.dumps(domains, separators=(',', ':')),
+            'prefixes': json.dumps(prefixes),
+            'nets': json.dumps(nets, separators=(',', ':')),
+            'default': default,
+        }
+
+
+PAC_TEMPLATE = """var RESULTS = %(results)s;
+var DOMAINS = %(domains)s;
+var PREFIXES = %(prefixes)s;
+var NETS = %(nets)s;
+var DEFAULT = %(default)d;
+var IPV4 = /^\\d{1,3}\\.\\d{1,3}\\.\\d{1,3}\\.\\d{1,3}$/;
+
+function ipToInt(ip) {
+    var p = ip.split(".");
+    return ((+p[0] << 24) | (+p[1] << 16) | (+p[2] << 8) | +p[3]) >>> 0;
+}
+
+function matchNet(ip) {
+    var n = ipToInt(ip);
+    for (var i = 0; i < PREFIXES.length; i++) {
+        var len = PREFIXES[i];
+        var mask = len === 0 ? 0 : (0xFFFFFFFF << (32 - len)) >>> 0;
+        var hit = NETS[len][((n & mask) >>> 0).toString()];
+        if (hit !== undefined) return hit;
+    }
+    return -1;
+}
+
+function FindProxyForURL(url, host) {
+    host = host.toLowerCase();
+    if (IPV4.test(host)) {
+        var direct = matchNet(host);
+        return RESULTS[direct >= 0 ? direct : DEFAULT];
+    }
+    var labels = host.split(".");
+    for (var i = 0; i < labels.length; i++) {
+        var hit = DOMAINS[labels.slice(i).join(".")];
+        if (hit !== undefined) return RESULTS[hit];
+    }
+    if (isPlainHostName(host)) return "DIRECT";
+    if (PREFIXES.length) {
+        var ip = dnsResolve(host);
+        if (ip && IPV4.test(ip)) {
+            var byIp = matchNet(ip);
+            if (byIp >= 0) return RESULTS[byIp];
+        }
+    }
+    return RESULTS[DEFAULT];
+}
+"""
+
+
+class PacSource:
+    """Produce the current PAC script, recompiling only when inputs change
+
+    vpn_getter returns the saved VPN dict the rules belong to;
+    ports_getter returns (own_port, {tunnel name: socks port}). Imported
+    list files are watched by mtime so edits apply on the next request.
+    """
+
+    def __init__(self, vpn_getter, ports_getter, base_dir=None):
+        self.vpn_getter = vpn_getter
+        self.ports_getter = ports_getter
+        self.base_dir = base_dir
+        self.lock = threading.Lock()
+        self.key = None
+        self.script = ''
+        self.etag = '""'
+
+    @staticmethod
+    def _mtimes(paths):
+        stamps = []
+        for path in paths:
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def current(self):
+        """Return (script, etag), recompiling if rules, lists or ports changed
+
+        The ETag hashes the compiled script (ports included), so it stays
+        valid across restarts instead of restarting from a counter.
+        """
+        vpn_config = self.vpn_getter() or {}
+        own_port, tunnel_ports = self.ports_getter()
+        paths = PacRules.list_paths(vpn_config, self.base_dir)
+        key = (json.dumps(vpn_config.get('pac') or {}, sort_keys=True), self._mtimes(paths),
+               own_port, tuple(sorted(tunnel_ports.items())))
+        with self.lock:
+            if key != self.key:
+                rules = PacRules.from_config(vpn_config, self.base_dir)
+                self.script = rules.compile(tunnel_ports, own_port)
+                self.key = key
+                digest = hashlib.sha1(self.script.encode('utf-8')).hexdigest()[:16]
+                self.etag = f'"{digest}"'
+            return self.script, self.etag
+
+
+class PacRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        script, etag = self.server.source.current()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = script.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ns-proxy-autoconfig')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PacServer:
+    """Serve a PacSource on 127.0.0.1 from a daemon thread"""
+
+    def __init__(self, source, port=DEFAULT_PAC_PORT):
+        self.source = source
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/proxy.pac"
+
+    def start(self):
+        if self.httpd is not None:
+            return self
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', self.port), PacRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.source = self.source
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
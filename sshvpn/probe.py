@@ -0,0 +1,180 @@
+"""Concurrent TCP/SSH health probes for saved VPN servers"""
+import asyncio
+import statistics
+import time
+
+DEFAULT_ATTEMPTS = 3
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_CONCURRENCY = 64
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values using linear interpolation"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def server_port(config):
+    """Return the SSH port of a saved VPN config as an int"""
+    try:
+        return int(config.get('port') or 22)
+    except (TypeError, ValueError):
+        return 22
+
+
+class ProbeResult:
+    """Aggregated probe measurements for one server"""
+
+    def __init__(self, name, host, port):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.connect_times = []
+        self.banner_times = []
+        self.banner = ''
+        self.attempts = 0
+        self.errors = []
+        self.timestamp = time.time()
+
+    @property
+    def successes(self):
+        return len(self.banner_times)
+
+    @property
+    def loss(self):
+        """Fraction of attempts that did not complete the banner exchange"""
+        if not self.attempts:
+            return 1.0
+        return 1.0 - self.successes / self.attempts
+
+    @property
+    def median_rtt(self):
+        return statistics.median(self.connect_times) if self.connect_times else None
+
+    @property
+    def p95_rtt(self):
+        return percentile(self.connect_times, 95)
+
+    @property
+    def median_banner(self):
+        return statistics.median(self.banner_times) if self.banner_times else None
+
+    @property
+    def reachable(self):
+        return self.successes > 0
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'host': self.host,
+            'port': self.port,
+            'attempts': self.attempts,
+            'loss': self.loss,
+            'median_rtt': self.median_rtt,
+            'p95_rtt': self.p95_rtt,
+            'median_banner': self.median_banner,
+            'banner': self.banner,
+            'errors': list(self.errors),
+            'timestamp': self.timestamp,
+        }
+
+
+async def probe_once(host, port, timeout=DEFAULT_TIMEOUT):
+    """Open one TCP connection and read the SSH banner
+
+    Returns (connect_seconds, banner_seconds, banner_line). Both timings are
+    measured from the start of the attempt.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    connect_time = time.perf_counter() - start
+    try:
+        remaining = max(deadline - loop.time(), 0.001)
+        line = await asyncio.wait_for(reader.readline(), remaining)
+        banner_time = time.perf_counter() - start
+        banner = line.decode('utf-8', 'replace').strip()
+        if not banner.startswith('SSH-'):
+            raise ConnectionError(f"Unexpected banner: {banner[:40]!r}")
+        return connect_time, banner_time, banner
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def probe_server(name, host, port, attempts=DEFAULT_ATTEMPTS,
+                       timeout=DEFAULT_TIMEOUT, semaphore=None):
+    """Probe a server several times in parallel and aggregate the results"""
+    result = ProbeResult(name, host, port)
+    result.attempts = attempts
+
+    async def attempt():
+        if semaphore is None:
+            return await probe_once(host, port, timeout)
+        async with semaphore:
+            return await probe_once(host, port, timeout)
+
+    outcomes = await asyncio.gather(*(attempt() for _ in range(attempts)),
+                                    return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, asyncio.TimeoutError):
+                result.errors.append('timeout')
+            else:
+                result.errors.append(str(outcome) or type(outcome).__name__)
+            continue
+        connect_time, banner_time, banner = outcome
+        result.connect_times.append(connect_time)
+        result.banner_times.append(banner_time)
+        result.banner = banner
+    result.timestamp = time.time()
+    return result
+
+
+async def probe_all(saved_vpns, attempts=DEFAULT_ATTEMPTS, timeout=DEFAULT_TIMEOUT,
+                    concurrency=DEFAULT_CONCURRENCY):
+    """Probe every saved VPN concurrently, bounded by a shared semaphore"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = []
+    for name, config in saved_vpns.items():
+        host = config.get('ip', '').strip()
+        if not host:
+            continue
+        tasks.append(probe_server(name, host, server_port(config), attempts,
+                                  timeout, semaphore))
+    results = await asyncio.gather(*tasks)
+    return {result.name: result for result in results}
+
+
+def run_probe_all(saved_vpns, **kwargs):
+    """Blocking wrapper around probe_all for worker threads"""
+    return asyncio.run(probe_all(saved_vpns, **kwargs))
+
+
+def _ms(value):
+    return '-' if value is None else f"{value * 1000:.1f}"
+
+
+def format_probe_table(results):
+    """Render probe results as a fixed-width text table, best servers first"""
+    rows = sorted(results.values(),
+                  key=lambda r: (not r.reachable, r.median_rtt or float('inf')))
+    name_width = max([len('Name')] + [len(r.name) for r in rows])
+    lines = [f"{'Name':<{name_width}}  {'Median ms':>9}  {'p95 ms':>8}  {'Banner ms':>9}  {'Loss':>5}"]
+    for r in rows:
+        lines.append(
+            f"{r.name:<{name_width}}  {_ms(r.median_rtt):>9}  {_ms(r.p95_rtt):>8}  "
+            f"{_ms(r.median_banner):>9}  {r.loss * 100:>4.0f}%"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,183 @@
+"""Tunnel tuning profiles turned into ssh -o options
+
+A saved VPN picks a preset by name ("profile": "bulk") or overrides
+fields of one ("profile": {"base": "mobile", "server_alive_count": 8}).
+Profile options replace the same keys in the free-text ssh_options, so
+other options there (host key checking etc.) still apply.
+"""
+import functools
+import shlex
+import subprocess
+
+from sshvpn import tools
+
+CUSTOM = 'Custom'
+IPQOS_VALUES = {'af11', 'af12', 'af13', 'af21', 'af22', 'af23', 'af31', 'af32', 'af33',
+                'af41', 'af42', 'af43', 'cs0', 'cs1', 'cs2', 'cs3', 'cs4', 'cs5', 'cs6', 'cs7',
+                'ef', 'le', 'lowdelay', 'throughput', 'reliability', 'none'}
+# Offered when `ssh -Q cipher` cannot be run
+KNOWN_CIPHERS = {'aes128-gcm@openssh.com', 'aes256-gcm@openssh.com', 'chacha20-poly1305@openssh.com',
+                 'aes128-ctr', 'aes192-ctr', 'aes256-ctr'}
+
+PRESETS = {
+    'bulk': {
+        'label': 'Bulk throughput',
+        'ciphers': ['aes128-gcm@openssh.com', 'aes256-gcm@openssh.com', 'chacha20-poly1305@openssh.com'],
+        'compression': False,
+        'ipqos': 'throughput',
+        'server_alive_interval': 30,
+        'server_alive_count': 3,
+        'tcp_keepalive': False,
+        'connect_timeout': 10,
+    },
+    'interactive': {
+        'label': 'Interactive low-latency',
+        'ciphers': ['chacha20-poly1305@openssh.com', 'aes128-gcm@openssh.com'],
+        'compression': False,
+        'ipqos': 'lowdelay',
+        'server_alive_interval': 15,
+        'server_alive_count': 3,
+        'tcp_keepalive': False,
+        'connect_timeout': 10,
+    },
+    'mobile': {
+        'label': 'Lossy mobile',
+        'ciphers': ['chacha20-poly1305@openssh.com', 'aes128-gcm@openssh.com'],
+        'compression': True,
+        'ipqos': 'lowdelay',
+        # Ride out short radio gaps instead of tearing the session down
+        'server_alive_interval': 10,
+        'server_alive_count': 6,
+        'tcp_keepalive': False,
+        'connect_timeout': 20,
+    },
+}
+FIELDS = ('ciphers', 'compression', 'ipqos', 'server_alive_interval', 'server_alive_count',
+          'tcp_keepalive', 'connect_timeout')
+
+
+@functools.lru_cache(maxsize=4)
+def _query_ciphers(ssh_path):
+    try:
+        result = subprocess.run([ssh_path, '-Q', 'cipher'], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    ciphers = set(result.stdout.split())
+    return frozenset(ciphers) if result.returncode == 0 and ciphers else None
+
+
+def supported_ciphers():
+    """Ciphers the local ssh client supports (asked once per binary)"""
+    path = tools.default_registry.path('ssh')
+    return (path and _query_ciphers(path)) or frozenset(KNOWN_CIPHERS)
+
+
+def resolve(spec):
+    """Turn a saved "profile" value into a full field dict, or None for custom"""
+    if not spec or spec == CUSTOM:
+        return None
+    if isinstance(spec, str):
+        spec = {'base': spec}
+    base = spec.get('base')
+    if base is not None and base not in PRESETS:
+        raise ValueError(f"unknown profile '{base}' (choose from {', '.join(PRESETS)})")
+    profile = dict(PRESETS.get(base, {}))
+    profile.update({key: value for key, value in spec.items() if key in FIELDS})
+    return profile
+
+
+def validate(profile):
+    """Raise ValueError describing every invalid field"""
+    errors = []
+    ciphers = profile.get('ciphers')
+    if ciphers is not None:
+        if isinstance(ciphers, str):
+            ciphers = ciphers.split(',')
+        if not ciphers:
+            errors.append("ciphers must not be empty")
+        unsupported = [c for c in ciphers if c not in supported_ciphers()]
+        if unsupported:
+            errors.append(f"ciphers not supported by ssh: {', '.join(unsupported)}")
+    ipqos = profile.get('ipqos')
+    if ipqos is not None and ipqos not in IPQOS_VALUES:
+        errors.append(f"invalid IPQoS value '{ipqos}'")
+    limits = {'server_alive_interval': (0, 3600), 'server_alive_count': (1, 100), 'connect_timeout': (1, 600)}
+    for field, (low, high) in limits.items():
+        value = profile.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+            errors.append(f"{field} must be an integer between {low} and {high}")
+    for field in ('compression', 'tcp_keepalive'):
+        if field in profile and not isinstance(profile[field], bool):
+            errors.append(f"{field} must be true or false")
+    if errors:
+        raise ValueError('; '.join(errors))
+
+
+def to_options(profile):
+    """Return {ssh option name: value} for a validated profile"""
+    options = {}
+    ciphers = profile.get('ciphers')
+    if ciphers:
+        options['Ciphers'] = ciphers if isinstance(ciphers, str) else ','.join(ciphers)
+    if 'compression' in profile:
+        options['Compression'] = 'yes' if profile['compression'] else 'no'
+    if profile.get('ipqos'):
+        options['IPQoS'] = profile['ipqos']
+    if profile.get('server_alive_interval') is not None:
+        options['ServerAliveInterval'] = str(profile['server_alive_interval'])
+    if profile.get('server_alive_count') is not None:
+        options['ServerAliveCountMax'] = str(profile['server_alive_count'])
+    if 'tcp_keepalive' in profile:
+        options['TCPKeepAlive'] = 'yes' if profile['tcp_keepalive'] else 'no'
+    if profile.get('connect_timeout') is not None:
+        options['ConnectTimeout'] = str(profile['connect_timeout'])
+    return options
+
+
+def merge_options(ssh_options, options):
+    """Replace -o Key=Value entries of ssh_options with options, keeping the rest"""
+    managed = {key.lower() for key in options}
+    kept = []
+    tokens = shlex.split(ssh_options or '')
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == '-o' and i + 1 < len(tokens):
+            value = tokens[i + 1]
+            i += 2
+        elif token.startswith('-o') and len(token) > 2:
+            value = token[2:]
+            i += 1
+        else:
+            kept.append(token)
+            i += 1
+            continue
+        key = value.replace(' ', '=').split('=', 1)[0].strip().lower()
+        if key not in managed:
+            kept += ['-o', value]
+    kept += [item for key, value in options.items() for item in ('-o', f"{key}={value}")]
+    return shlex.join(kept)
+
+
+def apply(ssh_options, spec):
+    """Validate the profile spec and fold it into ssh_options"""
+    profile = resolve(spec)
+    if profile is None:
+        return ssh_options
+    validate(profile)
+    return merge_options(ssh_options, to_options(profile))
+
+
+def score(result, goal):
+    """Rank a benchmark result for goal ('throughput', 'latency' or 'balanced')"""
+    bulk = result.get('bulk', {}).get('mb_per_s') or 0.0
+    latency = result.get('requests', {}).get('latency_p50_ms')
+    if goal == 'throughput':
+        return bulk
+    if latency is None:
+        return 0.0
+    if goal == 'latency':
+        return 1000.0 / latency
+    return bulk / latency
@@ -0,0 +1,90 @@
+"""System proxy configuration for Windows and Linux desktops"""
+import os
+import sys
+
+from sshvpn import tools
+from sshvpn.proxy_engine import (
+    EnvironmentFileBackend, GSettingsBackend, NetworkManagerBackend, PacFileBackend,
+    ProxyEngine, WindowsRegistryBackend, pac_script,
+)
+
+USER_ENVIRONMENT_FILE = os.path.expanduser('~/.config/environment.d/ssh-vpn.conf')
+
+
+class SystemProxy:
+    """Apply and restore system proxy settings, reporting through log"""
+    
+    def __init__(self, log=print, journal_path=None):
+        self.log = log
+        self.engine = ProxyEngine(journal_path)
+    
+    def recover(self):
+        """Roll back proxy changes left behind by a previous crash"""
+        if not self.engine.pending:
+            return
+        self.log(f"Restoring proxy settings left by a previous session: {', '.join(self.engine.pending)}")
+        self._restore()
+    
+    def system_backends(self):
+        """Backends that set a SOCKS proxy for the whole desktop"""
+        if sys.platform == 'win32':
+            return [WindowsRegistryBackend()]
+        if self.is_command_available('gsettings'):
+            return [GSettingsBackend()]
+        system_wide = EnvironmentFileBackend()
+        if system_wide.available():
+            return [system_wide]
+        os.makedirs(os.path.dirname(USER_ENVIRONMENT_FILE), exist_ok=True)
+        return [EnvironmentFileBackend(USER_ENVIRONMENT_FILE)]
+    
+    def _apply(self, backends, settings):
+        try:
+            for backend in self.engine.apply(backends, settings):
+                self.log(backend.describe(settings))
+            return True
+        except Exception as e:
+            self.log(f"Proxy configuration rolled back: {e}")
+            return False
+    
+    def set_system_proxy(self, socks_port):
+        """Set the system proxy for the current platform"""
+        if self._apply(self.system_backends(), {'socks_port': socks_port}):
+            self.log("Note: Some applications may need to be restarted to use the proxy")
+            return
+        self.log("Manual configuration:")
+        self.log(f"export http_proxy=socks5://127.0.0.1:{socks_port}")
+        self.log(f"export https_proxy=socks5://127.0.0.1:{socks_port}")
+        self.log(f"export ALL_PROXY=socks5://127.0.0.1:{socks_port}")
+    
+    def set_auto_proxy(self, socks_port, script=None, pac_url=None):
+        """Publish a PAC file and point NetworkManager at it (Linux only)
+
+        script replaces the send-everything PAC with a generated one;
+        pac_url points NetworkManager at a served PAC instead of the file.
+        """
+        if sys.platform == 'win32':
+            return
+        pac = PacFileBackend(script=(lambda port: script) if script else pac_script)
+        backends = [pac]
+        nm = NetworkManagerBackend()
+        if nm.available():
+            backends.append(nm)
+        settings = {'socks_port': socks_port, 'pac_url': pac_url or pac.url}
+        if self._apply(backends, settings):
+            self.log("\nFor specific applications:")
+            self.log(f"curl --socks5 127.0.0.1:{socks_port} http://example.com")
+    
+    def _restore(self):
+        restored, errors = self.engine.restore_all()
+        for name in restored:
+            self.log(f"{name} proxy settings restored")
+        for error in errors:
+            self.log(f"Could not restore proxy settings: {error}")
+    
+    def restore(self):
+        """Undo system proxy changes made by this manager"""
+        self._restore()
+    
+    def is_command_available(self, command):
+        """Check if a command is available in the system (cached PATH lookup)"""
+        return tools.default_registry.available(command)
@@ -0,0 +1,443 @@
+"""Transactional system proxy backends with an on-disk rollback journal
+
+Every backend snapshots the state it is about to change, applies all of
+its keys in one batched operation and can restore the snapshot exactly.
+Snapshots are written to a journal before anything is changed, so a
+crash mid-session is undone by recover() on the next start.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+
+from sshvpn import aioloop, tools
+
+LOOPBACK = '127.0.0.1'
+COMMAND_TIMEOUT = 15
+
+# BackgroundLoop that runs gsettings/dconf/nmcli, set by use_loop()
+_command_loop = None
+
+
+class ProxyError(Exception):
+    """Raised when a backend cannot apply or restore its settings"""
+
+
+def atomic_write(path, content, mode=None):
+    """Replace path with content via a temporary file and rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.ssh-vpn-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def use_loop(loop):
+    """Run backend commands as asyncio subprocesses on loop (an aioloop.BackgroundLoop)
+
+    Callers still block on the result, so backends stay synchronous, but
+    the child is owned by the loop: it is killed on timeout and when the
+    loop shuts down with the command still running. None goes back to
+    plain subprocess.run.
+    """
+    global _command_loop
+    _command_loop = loop
+
+
+def _run(cmd, input=None):
+    loop = _command_loop
+    if loop is not None and threading.current_thread() is not loop.thread:
+        result = loop.run(aioloop.run_command(cmd, COMMAND_TIMEOUT, input=input))
+    else:
+        # No loop, or already on it, where blocking on it would deadlock
+        result = subprocess.run(cmd, input=input, capture_output=True, text=True, timeout=COMMAND_TIMEOUT)
+    if result.returncode != 0:
+        raise ProxyError(f"{' '.join(cmd[:3])} failed: {result.stderr.strip() or result.returncode}")
+    return result.stdout
+
+
+def pac_script(socks_port):
+    """PAC script that sends everything through the local SOCKS port"""
+    return (
+        "function FindProxyForURL(url, host) {\n"
+        f"    return \"SOCKS5 {LOOPBACK}:{socks_port}; SOCKS {LOOPBACK}:{socks_port}\";\n"
+        "}\n"
+    )
+
+
+class ProxyBackend:
+    """Interface for one place where system proxy settings live"""
+
+    name = ''
+
+    def available(self):
+        return True
+
+    def snapshot(self):
+        """Return a JSON-serialisable description of the current state"""
+        raise NotImplementedError
+
+    def apply(self, settings):
+        """Apply settings ({'socks_port', 'pac_url'}) in one batched operation"""
+        raise NotImplementedError
+
+    def restore(self, snapshot):
+        """Put back exactly what snapshot() returned"""
+        raise NotImplementedError
+
+    def describe(self, settings):
+        return f"{self.name} proxy set"
+
+
+class GSettingsBackend(ProxyBackend):
+    """GNOME proxy settings, written in one dconf load"""
+
+    name = 'gsettings'
+    # (dconf group, key) pairs this backend manages, relative to /system/proxy/
+    KEYS = (('/', 'mode'), ('socks', 'host'), ('socks', 'port'))
+    SCHEMAS = {'org.gnome.system.proxy': '/', 'org.gnome.system.proxy.socks': 'socks'}
+
+    def available(self):
+        return tools.default_registry.available('gsettings')
+
+    def snapshot(self):
+        # One spawn lists every key with its current (or default) GVariant value
+        output = _run(['gsettings', 'list-recursively', 'org.gnome.system.proxy'])
+        values = {}
+        for line in output.splitlines():
+            parts = line.split(' ', 2)
+            if len(parts) != 3 or parts[0] not in self.SCHEMAS:
+                continue
+            group = self.SCHEMAS[parts[0]]
+            if (group, parts[1]) in self.KEYS:
+                values[f"{group}|{parts[1]}"] = parts[2]
+        return {'values': values}
+
+    def _load(self, values):
+        """Write {'group|key': gvariant_text} with one process"""
+        groups = {}
+        for compound, value in values.items():
+            group, key = compound.split('|', 1)
+            groups.setdefault(group, []).append(f"{key}={value}")
+        if tools.default_registry.available('dconf'):
+            keyfile = '\n\n'.join(f"[{group}]\n" + '\n'.join(lines) for group, lines in groups.items())
+            _run(['dconf', 'load', '/system/proxy/'], input=keyfile + '\n')
+            return
+        # Without dconf fall back to one gsettings call per key
+        schemas = {group: schema for schema, group in self.SCHEMAS.items()}
+        for compound, value in values.items():
+            group, key = compound.split('|', 1)
+            _run(['gsettings', 'set', schemas[group], key, value])
+
+    def apply(self, settings):
+        self._load({
+            '/|mode': "'manual'",
+            'socks|host': f"'{LOOPBACK}'",
+            'socks|port': str(int(settings['socks_port'])),
+        })
+
+    def restore(self, snapshot):
+        if snapshot.get('values'):
+            self._load(snapshot['values'])
+
+    def describe(self, settings):
+        return f"GNOME system proxy configured: SOCKS {LOOPBACK}:{settings['socks_port']}"
+
+
+class EnvironmentFileBackend(ProxyBackend):
+    """Proxy variables kept in a marked block of an environment file
+
+    The block is replaced in place, so repeated connects never add
+    duplicate lines. Lines appended by older versions are cleaned up too.
+    """
+
+    name = 'environment'
+    BEGIN = '# BEGIN ssh-vpn-manager'
+    END = '# END ssh-vpn-manager'
+    LEGACY_LINE = re.compile(r'^(http|https|ftp|all)_proxy="socks5://127\.0\.0\.1:\d+"$')
+    VARIABLES = ('http_proxy', 'https_proxy', 'ftp_proxy', 'all_proxy')
+
+    def __init__(self, path='/etc/environment'):
+        self.path = path
+
+    def available(self):
+        directory = os.path.dirname(self.path)
+        if os.path.exists(self.path):
+            return os.access(self.path, os.W_OK) and os.access(directory, os.W_OK)
+        return os.access(directory, os.W_OK)
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def _strip(self, lines):
+        kept, inside = [], False
+        for line in lines:
+            if line.strip() == self.BEGIN:
+                inside = True
+            elif line.strip() == self.END:
+                inside = False
+            elif not inside and not self.LEGACY_LINE.match(line.strip()):
+                kept.append(line)
+        while kept and not kept[-1].strip():
+            kept.pop()
+        return kept
+
+    def snapshot(self):
+        return {'path': self.path}
+
+    def apply(self, settings):
+        url = f"socks5://{LOOPBACK}:{int(settings['socks_port'])}"
+        block = [self.BEGIN] + [f'{name}="{url}"' for name in self.VARIABLES] + [self.END]
+        lines = self._strip(self._read()) + block
+        try:
+            atomic_write(self.path, '\n'.join(lines) + '\n')
+        except PermissionError:
+            raise ProxyError(f"Need write access to {self.path}")
+
+    def restore(self, snapshot):
+        lines = self._strip(self._read())
+        atomic_write(self.path, '\n'.join(lines) + '\n' if lines else '')
+
+    def describe(self, settings):
+        return f"Proxy environment written to {self.path} (log out/in to take effect)"
+
+
+class PacFileBackend(ProxyBackend):
+    """A proxy auto-config file on disk"""
+
+    name = 'pac'
+
+    def __init__(self, path=None, script=pac_script):
+        self.path = path or os.path.expanduser('~/.ssh-vpn-proxy.pac')
+        self.script = script
+
+    @property
+    def url(self):
+        return f"file://{self.path}"
+
+    def snapshot(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return {'path': self.path, 'content': f.read()}
+        except FileNotFoundError:
+            return {'path': self.path, 'content': None}
+
+    def apply(self, settings):
+        atomic_write(self.path, self.script(settings['socks_port']))
+
+    def restore(self, snapshot):
+        if snapshot.get('content') is None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        else:
+            atomic_write(self.path, snapshot['content'])
+
+    def describe(self, settings):
+        return f"PAC file written: {self.url}"
+
+
+class NetworkManagerBackend(ProxyBackend):
+    """Proxy auto-config URL on the active NetworkManager connection"""
+
+    name = 'networkmanager'
+
+    def __init__(self, uuid=None):
+        self.uuid = uuid
+
+    def available(self):
+        return tools.default_registry.available('nmcli')
+
+    def _active_uuid(self):
+        output = _run(['nmcli', '-t', '-f', 'UUID,TYPE', 'connection', 'show', '--active'])
+        for line in output.splitlines():
+            uuid, _, kind = line.partition(':')
+            if kind not in ('loopback', 'bridge', 'tun'):
+                return uuid
+        raise ProxyError("No active NetworkManager connection")
+
+    def snapshot(self):
+        self.uuid = self.uuid or self._active_uuid()
+        output = _run(['nmcli', '-g', 'proxy.method,proxy.pac-url', 'connection', 'show', self.uuid])
+        method, _, pac_url = output.strip().partition('\n')
+        return {'uuid': self.uuid, 'method': method or 'none', 'pac_url': pac_url}
+
+    def apply(self, settings):
+        self.uuid = self.uuid or self._active_uuid()
+        _run(['nmcli', 'connection', 'modify', self.uuid,
+              'proxy.method', 'auto', 'proxy.pac-url', settings['pac_url']])
+
+    def restore(self, snapshot):
+        _run(['nmcli', 'connection', 'modify', snapshot['uuid'],
+              'proxy.method', snapshot['method'], 'proxy.pac-url', snapshot['pac_url']])
+
+    def describe(self, settings):
+        return f"NetworkManager connection uses PAC {settings['pac_url']}"
+
+
+class WindowsRegistryBackend(ProxyBackend):
+    """WinINet proxy settings in the current user's registry hive"""
+
+    name = 'windows'
+    KEY = r"Software\Microsoft\Windows\CurrentVersion\Internet Settings"
+
+    def available(self):
+        return sys.platform == 'win32'
+
+    def _open(self, access):
+        import winreg
+        reg = winreg.ConnectRegistry(None, winreg.HKEY_CURRENT_USER)
+        return winreg.OpenKey(reg, self.KEY, 0, access)
+
+    def snapshot(self):
+        import winreg
+        values = {}
+        key = self._open(winreg.KEY_READ)
+        try:
+            for name in ('ProxyEnable', 'ProxyServer'):
+                try:
+                    values[name] = winreg.QueryValueEx(key, name)[0]
+                except FileNotFoundError:
+                    values[name] = None
+        finally:
+            winreg.CloseKey(key)
+        return values
+
+    def _write(self, enable, server):
+        import winreg
+        key = self._open(winreg.KEY_WRITE)
+        try:
+            winreg.SetValueEx(key, "ProxyEnable", 0, winreg.REG_DWORD, enable)
+            if server is None:
+                try:
+                    winreg.DeleteValue(key, "ProxyServer")
+                except FileNotFoundError:
+                    pass
+            else:
+                winreg.SetValueEx(key, "ProxyServer", 0, winreg.REG_SZ, server)
+        finally:
+            winreg.CloseKey(key)
+
+    def apply(self, settings):
+        self._write(1, f"socks={LOOPBACK}:{settings['socks_port']}")
+
+    def restore(self, snapshot):
+        self._write(snapshot.get('ProxyEnable') or 0, snapshot.get('ProxyServer'))
+
+    def describe(self, settings):
+        return f"System proxy set to use SOCKS on {LOOPBACK}:{settings['socks_port']}"
+
+
+def backend_from_snapshot(name, snapshot):
+    """Rebuild the backend that produced a journal entry"""
+    if name == GSettingsBackend.name:
+        return GSettingsBackend()
+    if name == EnvironmentFileBackend.name:
+        return EnvironmentFileBackend(snapshot['path'])
+    if name == PacFileBackend.name:
+        return PacFileBackend(snapshot['path'])
+    if name == NetworkManagerBackend.name:
+        return NetworkManagerBackend(snapshot['uuid'])
+    if name == WindowsRegistryBackend.name:
+        return WindowsRegistryBackend()
+    raise ProxyError(f"Unknown proxy backend in journal: {name}")
+
+
+def default_journal_path():
+    return os.path.join(os.path.expanduser('~'), '.ssh-vpn', 'proxy-journal.json')
+
+
+class ProxyEngine:
+    """Apply backends as one transaction and roll them back from a journal"""
+
+    def __init__(self, journal_path=None):
+        self.journal_path = journal_path or default_journal_path()
+        self.journal = self._load_journal()
+
+    def _load_journal(self):
+        try:
+            with open(self.journal_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_journal(self):
+        if not self.journal:
+            try:
+                os.unlink(self.journal_path)
+            except FileNotFoundError:
+                pass
+            return
+        os.makedirs(os.path.dirname(self.journal_path), mode=0o700, exist_ok=True)
+        atomic_write(self.journal_path, json.dumps(self.journal, indent=2), mode=0o600)
+
+    @property
+    def pending(self):
+        """Names of backends whose original state has not been restored yet"""
+        return list(self.journal)
+
+    def apply(self, backends, settings):
+        """Apply every backend or none of them
+
+        The original state of each backend is journalled before its first
+        change; re-applying keeps the first snapshot, so repeated
+        connects stay idempotent and restore the true original.
+        """
+        applied = []
+        for backend in backends:
+            try:
+                if backend.name not in self.journal:
+                    self.journal[backend.name] = backend.snapshot()
+                    self._save_journal()
+                backend.apply(settings)
+                applied.append(backend)
+            except Exception as e:
+                for done in reversed(applied + [backend]):
+                    try:
+                        self._restore_one(done.name, done)
+                    except Exception:
+                        # Left in the journal so recover() can retry later
+                        pass
+                raise ProxyError(f"{backend.name}: {e}") from e
+        return applied
+
+    def _restore_one(self, name, backend=None):
+        snapshot = self.journal.get(name)
+        if snapshot is None:
+            return
+        backend = backend or backend_from_snapshot(name, snapshot)
+        backend.restore(snapshot)
+        del self.journal[name]
+        self._save_journal()
+
+    def restore_all(self):
+        """Restore every journalled backend; returns (restored, errors)"""
+        restored, errors = [], []
+        for name in list(self.journal):
+            try:
+                self._restore_one(name)
+                restored.append(name)
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+        return restored, errors
@@ -0,0 +1,100 @@
+"""Active readiness detection for freshly spawned tunnel processes"""
+import collections
+import socket
+import threading
+import time
+
+DEFAULT_DEADLINE = 20.0
+POLL_INTERVAL = 0.05
+SSHUTTLE_READY_MARKER = 'Connected'
+
+
+class TunnelNotReady(Exception):
+    """Raised when a tunnel exits or misses its readiness deadline"""
+
+
+class StreamCollector:
+    """Drain a child's pipe line by line and watch for a marker string
+
+    on_line, if given, is called with every decoded line as it arrives.
+    """
+
+    def __init__(self, stream, marker=None, max_lines=200, on_line=None):
+        self.stream = stream
+        self.marker = marker
+        self.on_line = on_line
+        self.lines = collections.deque(maxlen=max_lines)
+        self.marker_seen = threading.Event()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            for raw in iter(self.stream.readline, b''):
+                line = raw.decode('utf-8', 'replace').rstrip()
+                self.lines.append(line)
+                if self.on_line:
+                    self.on_line(line)
+                if self.marker and self.marker in line:
+                    self.marker_seen.set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.closed.set()
+
+    def text(self):
+        return '\n'.join(self.lines)
+
+
+def socks5_handshake(port, host='127.0.0.1', timeout=1.0):
+    """Return True if a SOCKS5 no-auth greeting succeeds on host:port"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            sock.sendall(b'\x05\x01\x00')
+            reply = sock.recv(2)
+            return reply == b'\x05\x00'
+    except OSError:
+        return False
+
+
+def _describe_exit(process, collector):
+    output = collector.text().strip() if collector else ''
+    return output or f"process exited with code {process.returncode}"
+
+
+def wait_for_socks(process, socks_port, deadline=DEFAULT_DEADLINE, collector=None):
+    """Block until the ssh -D listener completes a SOCKS5 handshake
+
+    Returns the seconds it took to become ready.
+    """
+    start = time.monotonic()
+    while True:
+        if process.poll() is not None:
+            if collector:
+                collector.closed.wait(1.0)
+            raise TunnelNotReady(_describe_exit(process, collector))
+        if socks5_handshake(socks_port):
+            return time.monotonic() - start
+        if time.monotonic() - start >= deadline:
+            raise TunnelNotReady(f"SOCKS port {socks_port} not ready after {deadline:.0f}s")
+        time.sleep(POLL_INTERVAL)
+
+
+def wait_for_marker(process, collector, deadline=DEFAULT_DEADLINE):
+    """Block until the collector sees its marker on the child's output
+
+    Returns the seconds it took to become ready.
+    """
+    start = time.monotonic()
+    while True:
+        if collector.marker_seen.wait(POLL_INTERVAL):
+            return time.monotonic() - start
+        if process.poll() is not None:
+            collector.closed.wait(1.0)
+            if collector.marker_seen.is_set():
+                return time.monotonic() - start
+            raise TunnelNotReady(_describe_exit(process, collector))
+        if time.monotonic() - start >= deadline:
+            raise TunnelNotReady(f"'{collector.marker}' not seen after {deadline:.0f}s")
@@ -0,0 +1,270 @@
+"""Registry of simultaneously running tunnels and local port allocation"""
+import socket
+import threading
+import time
+
+from sshvpn import auth, multiplex, readiness, routes as route_planner, supervisor, tunnel
+
+DEFAULT_PORT_RANGE = (1080, 1180)
+
+
+def is_port_free(port, host='127.0.0.1'):
+    """Return True if nothing is bound to host:port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+
+class PortAllocator:
+    """Hand out local SOCKS ports that are neither reserved nor already bound"""
+
+    def __init__(self, start=DEFAULT_PORT_RANGE[0], end=DEFAULT_PORT_RANGE[1]):
+        self.start = start
+        self.end = end
+        self.reserved = set()
+        self.lock = threading.Lock()
+
+    def allocate(self, preferred=None):
+        """Reserve preferred if it is available, otherwise the first free port in range"""
+        with self.lock:
+            candidates = range(self.start, self.end + 1)
+            if preferred:
+                candidates = [preferred, *candidates]
+            for port in candidates:
+                if port not in self.reserved and is_port_free(port):
+                    self.reserved.add(port)
+                    return port
+        raise RuntimeError(f"No free local port in {self.start}-{self.end}")
+
+    def release(self, port):
+        with self.lock:
+            self.reserved.discard(port)
+
+
+class TunnelRecord:
+    """State and statistics of one registered tunnel"""
+
+    def __init__(self, name, connection_type, socks_port, multiplexed=False):
+        self.name = name
+        self.connection_type = connection_type
+        self.socks_port = socks_port
+        self.multiplexed = multiplexed
+        self.supervisor = None
+        # Set by disconnect(), possibly while the first launch is still in progress
+        self.cancelled = threading.Event()
+        self.time_to_ready = None
+        self.connected_at = None
+        # sshuttle subnet list files, kept for restarts and removed with the record
+        self.temp_files = []
+
+    @property
+    def process(self):
+        return self.supervisor.process if self.supervisor else None
+
+    @property
+    def state(self):
+        return self.supervisor.state if self.supervisor else supervisor.STARTING
+
+    @property
+    def restart_count(self):
+        return self.supervisor.restart_count if self.supervisor else 0
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'connection_type': self.connection_type,
+            'socks_port': self.socks_port,
+            'time_to_ready': self.time_to_ready,
+            'uptime': self.supervisor.uptime if self.supervisor else 0.0,
+            'restarts': self.restart_count,
+            'stalls': self.supervisor.stall_count if self.supervisor else 0,
+            'multiplexed': self.multiplexed,
+        }
+
+
+class TunnelRegistry:
+    """Tunnels keyed by VPN name, each with its own process, port and supervisor"""
+
+    def __init__(self, allocator=None, masters=None):
+        self.allocator = allocator or PortAllocator()
+        self.masters = masters or multiplex.MasterPool()
+        self.tunnels = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        return self.tunnels.get(name)
+
+    def names(self):
+        return list(self.tunnels)
+
+    def __contains__(self, name):
+        return name in self.tunnels
+
+    def connect(self, name, ip, port, username, password, ssh_options, connection_type,
+                socks_port=None, deadline=readiness.DEFAULT_DEADLINE, on_event=None, log=None,
+                multiplex=False, routes=None, auth_method=None, key_file=None):
+        """Start a supervised tunnel and block until it is ready
+
+        With multiplex, SOCKS tunnels are added as -D forwards on a shared
+        ControlMaster, so reconnects skip the SSH handshake while the
+        master is alive. Returns the TunnelRecord. Raises ValueError if the name is already
+        connected, a second sshuttle tunnel is requested or the credentials are unusable, and
+        TunnelNotReady if the tunnel does not come up.
+        """
+        credentials = auth.Credentials(auth_method or auth.PASSWORD, password, key_file)
+        credentials.validate()
+        with self.lock:
+            if name in self.tunnels:
+                raise ValueError(f"Tunnel '{name}' is already connected")
+            if connection_type == tunnel.SSHUTTLE and any(
+                    t.connection_type == tunnel.SSHUTTLE for t in self.tunnels.values()):
+                raise ValueError("Only one sshuttle tunnel can run at a time")
+            if connection_type == tunnel.SSHUTTLE:
+                allocated = None
+            else:
+                allocated = self.allocator.allocate(socks_port)
+            # The in-process transport already carries every channel on one connection
+            multiplexed = multiplex and connection_type == tunnel.SSH_TUNNEL
+            record = TunnelRecord(name, connection_type, allocated, multiplexed)
+            self.tunnels[name] = record
+
+        if connection_type == tunnel.IN_PROCESS:
+            return self._connect_in_process(record, ip, port, username, credentials, ssh_options,
+                                            deadline, on_event, log)
+        if multiplexed:
+            return self._connect_multiplexed(record, ip, port, username, credentials, ssh_options,
+                                             deadline, on_event, log)
+
+        # Child output is streamed into the log, one prefixed line at a time
+        on_line = (lambda line: log(f"[{name}] {line}")) if log else None
+        try:
+            cmd = tunnel.build_command(ip, port, username, credentials, ssh_options, connection_type, allocated,
+                                      routes, record.temp_files)
+            env = credentials.env()
+            if log:
+                log(f"Executing: {' '.join(cmd)}")
+            process, collector, record.time_to_ready = tunnel.launch(cmd, connection_type, allocated,
+                                                                     deadline, on_line, env)
+        except BaseException:
+            self._forget(name, record)
+            raise
+
+        record.connected_at = time.time()
+        relaunch = lambda: tunnel.launch(cmd, connection_type, allocated, deadline, on_line, env)[0]
+        check = supervisor.socks_check(allocated) if allocated else None
+        return self._supervise(record, supervisor.SupervisedTunnel(name, relaunch, check, on_event),
+                               process, lambda: tunnel.terminate(process))
+
+    def _connect_multiplexed(self, record, ip, port, username, credentials, ssh_options,
+                             deadline, on_event, log):
+        name = record.name
+        socks_port = record.socks_port
+        master = self.masters.get(name, ip, port, username, credentials, ssh_options)
+        on_line = (lambda line: log(f"[{name}] {line}")) if log else None
+
+        def launch():
+            start = time.monotonic()
+            master.ensure(deadline, on_line)
+            if socks_port in master.forwards:
+                master.cancel_dynamic_forward(socks_port)
+            master.add_dynamic_forward(socks_port)
+            remaining = max(deadline - (time.monotonic() - start), readiness.POLL_INTERVAL)
+            readiness.wait_for_socks(master.process, socks_port, remaining)
+            return master.process, time.monotonic() - start
+
+        try:
+            if log:
+                log(f"Using control master {master.path} for '{name}'")
+            process, record.time_to_ready = launch()
+        except BaseException:
+            self._forget(name, record)
+            self.masters.release(name, socks_port)
+            raise
+
+        record.connected_at = time.time()
+        # The master answering on its control socket, then its forward answering SOCKS
+        check = lambda: master.check() and readiness.socks5_handshake(socks_port)
+        stop_process = lambda process: self.masters.release(name, socks_port)
+        supervised = supervisor.SupervisedTunnel(name, lambda: launch()[0], check, on_event,
+                                                 stop_process=stop_process)
+        return self._supervise(record, supervised, process, lambda: stop_process(process))
+
+    def _connect_in_process(self, record, ip, port, username, credentials, ssh_options,
+                            deadline, on_event, log):
+        name = record.name
+        socks_port = record.socks_port
+        on_line = (lambda line: log(f"[{name}] {line}")) if log else None
+        # asyncssh is slow to import, so only tunnels that use it pay for it
+        from sshvpn import transport
+
+        def launch():
+            engine = transport.InProcessTunnel(ip, port, username, credentials, socks_port,
+                                               ssh_options, on_line)
+            engine.start(deadline)
+            return engine
+
+        try:
+            process = launch()
+        except BaseException:
+            self._forget(name, record)
+            raise
+        record.time_to_ready = process.time_to_ready
+        record.connected_at = time.time()
+        supervised = supervisor.SupervisedTunnel(name, launch, supervisor.socks_check(socks_port), on_event)
+        return self._supervise(record, supervised, process, lambda: tunnel.terminate(process))
+
+    def _supervise(self, record, supervised, process, discard):
+        """Hand a launched child to its supervisor, unless the tunnel was disconnected meanwhile
+
+        discard() stops the child when nobody is left to own it.
+        """
+        with self.lock:
+            live = self.tunnels.get(record.name) is record and not record.cancelled.is_set()
+            if live:
+                # Started under the lock so disconnect() sees either no supervisor or a running one
+                record.supervisor = supervised
+                supervised.start(process)
+        if not live:
+            discard()
+            self._forget(record.name, record)
+            raise readiness.TunnelNotReady(f"Tunnel '{record.name}' was disconnected while connecting")
+        return record
+
+    def disconnect(self, name):
+        """Stop a tunnel and release its port; returns False if it was not running"""
+        with self.lock:
+            record = self.tunnels.get(name)
+            if record is None:
+                return False
+            record.cancelled.set()
+            supervised = record.supervisor
+        if supervised is None:
+            # Still launching: connect() stops the new child and then releases the port
+            return True
+        # The child must be gone before its port can be handed to another tunnel
+        supervised.stop()
+        return self._forget(name, record) is record
+
+    def disconnect_all(self):
+        """Stop every tunnel and close all control masters"""
+        for name in self.names():
+            self.disconnect(name)
+        self.masters.close_all()
+
+    def stats(self):
+        return [record.stats() for record in list(self.tunnels.values())]
+
+    def _forget(self, name, record):
+        """Unregister record and free its port and files; None if name now belongs to another record"""
+        with self.lock:
+            if self.tunnels.get(name) is not record:
+                return None
+            del self.tunnels[name]
+        if record.socks_port:
+            self.allocator.release(record.socks_port)
+        route_planner.remove_files(record.temp_files)
+        return record
@@ -0,0 +1,265 @@
+"""Subnet planning for sshuttle tunnels
+
+A saved VPN may carry a "routes" section:
+
+    "routes": {
+        "include": ["0.0.0.0/0"],          # default when empty
+        "exclude": ["203.0.113.0/24"],
+        "include_lists": ["corp-nets.txt"],
+        "exclude_lists": ["domestic.txt"],
+        "dns": true,                       # forward DNS through the tunnel (default)
+        "ns_hosts": ["1.1.1.1"],           # resolvers sshuttle also captures
+        "exclude_local": true              # keep private/LAN ranges direct
+    }
+
+Lists are merged as integer intervals (sort + sweep), excludes are
+clipped to what is actually included, and the result is summarised
+back into the fewest CIDRs. Large plans are handed to sshuttle through
+--subnets/--exclude-from files instead of the command line.
+"""
+import ipaddress
+import os
+import socket
+import tempfile
+
+from sshvpn.dns import DEFAULT_UPSTREAM
+
+DEFAULT_INCLUDE = ('0.0.0.0/0',)
+LOCAL_NETWORKS = ('10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '127.0.0.0/8',
+                  '169.254.0.0/16', '224.0.0.0/4', 'fe80::/10', 'fc00::/7', '::1/128')
+DEFAULT_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Above this many prefixes the lists go into files rather than argv
+INLINE_LIMIT = 64
+
+
+BITS = {4: 32, 6: 128}
+
+
+def parse_cidr(pattern):
+    """Parse a CIDR or address into (version, first, last) integers, or None"""
+    pattern = pattern.split('#', 1)[0].strip()
+    if not pattern:
+        return None
+    address, _, length = pattern.partition('/')
+    octets = address.split('.')
+    if len(octets) == 4 and ':' not in address:
+        # Plain IPv4 is parsed by hand; ipaddress dominates large lists otherwise
+        try:
+            value = 0
+            for octet in octets:
+                part = int(octet)
+                if not 0 <= part <= 255:
+                    return None
+                value = (value << 8) | part
+            prefix = int(length) if length else 32
+        except ValueError:
+            return None
+        if not 0 <= prefix <= 32:
+            return None
+        size = 1 << (32 - prefix)
+        first = value & ~(size - 1) & 0xFFFFFFFF
+        return 4, first, first + size - 1
+    try:
+        network = ipaddress.ip_network(pattern, strict=False)
+    except ValueError:
+        return None
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def to_intervals(patterns):
+    """Return {version: [(first, last)]} merged, sorted, inclusive intervals"""
+    raw = {}
+    for pattern in patterns:
+        parsed = pattern if isinstance(pattern, tuple) else parse_cidr(pattern)
+        if parsed is not None:
+            raw.setdefault(parsed[0], []).append((parsed[1], parsed[2]))
+    merged = {}
+    for version, intervals in raw.items():
+        intervals.sort()
+        out = [list(intervals[0])]
+        for first, last in intervals[1:]:
+            if first <= out[-1][1] + 1:
+                if last > out[-1][1]:
+                    out[-1][1] = last
+            else:
+                out.append([first, last])
+        merged[version] = [tuple(i) for i in out]
+    return merged
+
+
+def read_list(path, base_dir=None):
+    path = os.path.expanduser(path)
+    if base_dir and not os.path.isabs(path):
+        path = os.path.join(base_dir, path)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+def merge(a, b):
+    """Union of two merged, sorted interval lists"""
+    return to_intervals([(0, first, last) for first, last in a + b]).get(0, [])
+
+
+def subtract(a, b):
+    """Intervals in a but not in b (both merged and sorted)"""
+    result = []
+    j = 0
+    for first, last in a:
+        while j < len(b) and b[j][1] < first:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= last:
+            if b[k][0] > first:
+                result.append((first, b[k][0] - 1))
+            first = max(first, b[k][1] + 1)
+            k += 1
+        if first <= last:
+            result.append((first, last))
+    return result
+
+
+def intersect(a, b):
+    """Intervals present in both a and b (both merged and sorted)"""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        first = max(a[i][0], b[j][0])
+        last = min(a[i][1], b[j][1])
+        if first <= last:
+            result.append((first, last))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def format_address(value, version):
+    if version == 4:
+        return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+    return str(ipaddress.IPv6Address(value))
+
+
+def to_cidrs(intervals, version):
+    """Summarise intervals into the minimal list of CIDR strings"""
+    bits = BITS[version]
+    cidrs = []
+    for first, last in intervals:
+        while first <= last:
+            # Largest aligned block starting at first that fits in the range
+            size = first & -first if first else 1 << bits
+            while size > last - first + 1:
+                size >>= 1
+            cidrs.append(f"{format_address(first, version)}/{bits - size.bit_length() + 1}")
+            first += size
+    return cidrs
+
+
+def server_networks(host):
+    """Host routes for the SSH server so its own connection never loops"""
+    parsed = parse_cidr(host)
+    if parsed is not None:
+        return [parsed]
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    except OSError:
+        return []
+    return [p for p in {parse_cidr(info[4][0].split('%')[0]) for info in infos} if p]
+
+
+def remove_files(paths):
+    """Delete temporary list files, ignoring ones already gone"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class RoutePlan:
+    """Compacted include/exclude subnets plus DNS choice for one sshuttle run"""
+
+    def __init__(self, includes, excludes, dns=False, ns_hosts=()):
+        self.includes = includes
+        self.excludes = excludes
+        self.dns = dns
+        self.ns_hosts = list(ns_hosts)
+        # List files written by args(), for the caller to remove_files()
+        self.files = []
+
+    @classmethod
+    def build(cls, include, exclude=(), auto_exclude=(), dns=False, ns_hosts=()):
+        """Merge, clip and summarise CIDR strings or (version, first, last) tuples
+
+        Auto excludes (server address, local networks) give way to
+        explicit includes narrower than the default route, so a user can
+        still tunnel e.g. a remote 10.0.0.0/8.
+        """
+        inc = to_intervals(include)
+        if not inc:
+            inc = to_intervals(DEFAULT_INCLUDE)
+        explicit = {version: [(a, b) for a, b in intervals if b - a + 1 < 1 << BITS[version]]
+                    for version, intervals in inc.items()}
+        user_exc = to_intervals(exclude)
+        auto_exc = to_intervals(auto_exclude)
+        includes, excludes = [], []
+        for version, inc_iv in sorted(inc.items()):
+            auto = subtract(auto_exc.get(version, []), explicit.get(version, []))
+            exc_iv = intersect(merge(user_exc.get(version, []), auto), inc_iv)
+            includes.extend(to_cidrs(inc_iv, version))
+            excludes.extend(to_cidrs(exc_iv, version))
+        return cls(includes, excludes, dns, ns_hosts)
+
+    @classmethod
+    def from_section(cls, section, server_host, base_dir=None):
+        """Plan routes for a saved VPN's "routes" section
+
+        Relative list paths are resolved against the application
+        directory, where saved_vpns.db lives. DNS is
+        forwarded unless the section turns it off; ns_hosts defaults to
+        the local DNS cache's upstream so its queries are tunnelled too.
+        """
+        section = section or {}
+        base_dir = base_dir or DEFAULT_BASE_DIR
+        include = list(section.get('include', []))
+        exclude = list(section.get('exclude', []))
+        for path in section.get('include_lists', []):
+            include.extend(read_list(path, base_dir))
+        for path in section.get('exclude_lists', []):
+            exclude.extend(read_list(path, base_dir))
+        auto = server_networks(server_host)
+        if section.get('exclude_local', True):
+            auto.extend(LOCAL_NETWORKS)
+        dns = bool(section.get('dns', True))
+        ns_hosts = section.get('ns_hosts', [DEFAULT_UPSTREAM]) if dns else ()
+        return cls.build(include, exclude, auto, dns, ns_hosts)
+
+    def _file(self, networks, prefix):
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix='.txt')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\n'.join(networks) + '\n')
+        self.files.append(path)
+        return path
+
+    def args(self):
+        """sshuttle arguments; long lists are written to temporary files"""
+        args = ['--dns'] if self.dns else []
+        if self.ns_hosts:
+            args += ['--ns-hosts', ','.join(self.ns_hosts)]
+        if len(self.excludes) > INLINE_LIMIT:
+            args += ['--exclude-from', self._file(self.excludes, 'ssh-vpn-exclude-')]
+        else:
+            for network in self.excludes:
+                args += ['-x', network]
+        if len(self.includes) > INLINE_LIMIT:
+            args += ['--subnets', self._file(self.includes, 'ssh-vpn-subnets-')]
+        else:
+            args += self.includes
+        return args
+
+    def summary(self):
+        return (f"{len(self.includes)} tunnelled prefixes, {len(self.excludes)} excluded"
+                f"{', DNS via tunnel' if self.dns else ''}")
@@ -0,0 +1,56 @@
+"""Latency-ranked server selection and failover ordering"""
+import time
+
+# Probe results older than this are ignored when ranking
+DEFAULT_MAX_AGE = 300.0
+# Seconds of RTT charged for a loss fraction of 1.0 (loss is 0..1), so 10% loss adds 0.2 s
+LOSS_PENALTY = 2.0
+
+
+def score(result, now=None, max_age=DEFAULT_MAX_AGE):
+    """Return a sort key for a probe result; lower is better, None is unusable"""
+    if result is None or not result.reachable:
+        return None
+    now = time.time() if now is None else now
+    if now - result.timestamp > max_age:
+        return None
+    return result.median_rtt + result.loss * LOSS_PENALTY
+
+
+def rank_servers(saved_vpns, probe_results, max_age=DEFAULT_MAX_AGE):
+    """Rank saved VPN names by recent latency and success rate
+
+    Servers without a fresh successful probe are excluded.
+    """
+    now = time.time()
+    scored = []
+    for name in saved_vpns:
+        value = score(probe_results.get(name), now, max_age)
+        if value is not None:
+            scored.append((value, name))
+    scored.sort()
+    return [name for _, name in scored]
+
+
+def has_fresh_results(saved_vpns, probe_results, max_age=DEFAULT_MAX_AGE):
+    """Check whether any saved VPN has a usable probe result"""
+    return bool(rank_servers(saved_vpns, probe_results, max_age))
+
+
+class FailoverPool:
+    """Ordered list of candidate servers consumed on each failure"""
+
+    def __init__(self, ranked_names):
+        self.candidates = list(ranked_names)
+        self.failed = []
+        self.current = None
+
+    def next(self):
+        """Advance to the next candidate, or return None when exhausted"""
+        if self.current is not None:
+            self.failed.append(self.current)
+        self.current = self.candidates.pop(0) if self.candidates else None
+        return self.current
+
+    def __len__(self):
+        return len(self.candidates)
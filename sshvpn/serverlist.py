@@ -0,0 +1,206 @@
+"""Filtering, sorting and grouping of the saved server list
+
+Kept free of Kivy so the list logic stays fast and testable; the GUI
+feeds rows() into a RecycleView, which only builds widgets for the
+rows on screen.
+"""
+from sshvpn import store, supervisor
+
+SORT_NAME = 'Name'
+SORT_LATENCY = 'Latency'
+SORT_HEALTH = 'Health'
+SORTS = [SORT_NAME, SORT_LATENCY, SORT_HEALTH]
+
+GROUP_NONE = 'No grouping'
+GROUP_TAG = 'Tag'
+GROUP_HOST = 'Host'
+GROUP_STATE = 'State'
+GROUPS = [GROUP_NONE, GROUP_TAG, GROUP_HOST, GROUP_STATE]
+
+ROW_VIEW = 'VPNRow'
+HEADER_VIEW = 'VPNGroupHeader'
+UP_STATES = (supervisor.RUNNING, supervisor.RESTARTING, supervisor.STARTING)
+
+
+def summaries(saved_vpns):
+    """(name, host, tags) for every saved VPN, cheaply when backed by a store"""
+    if isinstance(saved_vpns, store.VPNMapping):
+        return saved_vpns.summaries()
+    return [(name, str(vpn.get('ip', '')), store.tags_of(vpn)) for name, vpn in saved_vpns.items()]
+
+
+class ServerEntry:
+    """One saved server plus its live probe and tunnel state"""
+
+    __slots__ = ('name', 'host', 'tags', 'search', 'latency', 'loss', 'reachable', 'state', 'socks_port')
+
+    def __init__(self, name, host, tags):
+        self.name = name
+        self.host = host
+        self.tags = list(tags)
+        self.search = ' '.join([name, host, *self.tags]).lower()
+        self.latency = None
+        self.loss = None
+        self.reachable = None
+        self.state = supervisor.STOPPED
+        self.socks_port = None
+
+    @property
+    def up(self):
+        return self.state in UP_STATES
+
+    def health(self):
+        """Lower is healthier: running tunnel, reachable, unknown, unreachable"""
+        if self.up:
+            rank = 0
+        elif self.reachable:
+            rank = 1
+        elif self.reachable is None:
+            rank = 2
+        else:
+            rank = 3
+        return rank, self.loss or 0.0, self.latency if self.latency is not None else float('inf')
+
+    def label(self):
+        parts = [self.name]
+        if self.latency is not None:
+            parts.append(f"{self.latency * 1000:.0f} ms")
+        elif self.reachable is False:
+            parts.append('down')
+        return '  '.join(parts)
+
+    def tunnel_text(self):
+        if self.up:
+            return f"Down :{self.socks_port}" if self.socks_port else 'Down'
+        return 'Up'
+
+
+class ServerList:
+    """Visible rows of the server list for the current query, sort and grouping
+
+    Refining a query (typing more characters) only rescans the previous
+    matches, so filtering a large fleet stays cheap per keystroke.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.query = ''
+        self.matches = None
+        self.sort = SORT_NAME
+        self.group = GROUP_NONE
+        self.selected = None
+        self.index = {}
+
+    def load(self, rows):
+        """Replace all entries from (name, host, tags) tuples, keeping live state"""
+        old = self.entries
+        self.entries = {}
+        for name, host, tags in rows:
+            entry = ServerEntry(name, host, tags)
+            previous = old.get(name)
+            if previous is not None:
+                entry.latency, entry.loss, entry.reachable = previous.latency, previous.loss, previous.reachable
+                entry.state, entry.socks_port = previous.state, previous.socks_port
+            self.entries[name] = entry
+        self.matches = None
+
+    def upsert(self, name, host, tags):
+        previous = self.entries.get(name)
+        entry = ServerEntry(name, host, tags)
+        if previous is not None:
+            entry.latency, entry.loss, entry.reachable = previous.latency, previous.loss, previous.reachable
+            entry.state, entry.socks_port = previous.state, previous.socks_port
+        self.entries[name] = entry
+        self.matches = None
+
+    def remove(self, name):
+        self.entries.pop(name, None)
+        if self.selected == name:
+            self.selected = None
+        self.matches = None
+
+    def set_query(self, query):
+        query = query.strip().lower()
+        if self.matches is not None and query.startswith(self.query):
+            candidates = self.matches
+        else:
+            candidates = list(self.entries)
+        terms = query.split()
+        self.matches = [name for name in candidates
+                        if name in self.entries and all(t in self.entries[name].search for t in terms)]
+        self.query = query
+
+    def set_probe(self, name, result):
+        """Record a ProbeResult; returns True if the row changed"""
+        entry = self.entries.get(name)
+        if entry is None:
+            return False
+        entry.reachable = result.reachable
+        entry.loss = result.loss
+        entry.latency = result.median_rtt if result.reachable else None
+        return True
+
+    def set_tunnel(self, name, state, socks_port=None):
+        """Record a tunnel state; returns True if the row changed"""
+        entry = self.entries.get(name)
+        if entry is None or (entry.state, entry.socks_port) == (state, socks_port):
+            return False
+        entry.state, entry.socks_port = state, socks_port
+        return True
+
+    def order_depends_on_live_state(self):
+        return self.sort != SORT_NAME or self.group == GROUP_STATE
+
+    def _sort_key(self):
+        if self.sort == SORT_LATENCY:
+            return lambda e: (e.latency is None, e.latency or 0.0, e.name.lower())
+        if self.sort == SORT_HEALTH:
+            return lambda e: (e.health(), e.name.lower())
+        return lambda e: e.name.lower()
+
+    def _groups(self, entry):
+        if self.group == GROUP_TAG:
+            return entry.tags or ['untagged']
+        if self.group == GROUP_HOST:
+            return [entry.host or 'no host']
+        if self.group == GROUP_STATE:
+            return ['connected' if entry.up else 'disconnected']
+        return [None]
+
+    def row(self, entry):
+        return {
+            'viewclass': ROW_VIEW,
+            'name': entry.name,
+            'text': entry.label(),
+            'tunnel_text': entry.tunnel_text(),
+            'selected': entry.name == self.selected,
+        }
+
+    def rows(self):
+        """Build RecycleView data for the current view and index rows by name"""
+        if self.matches is None:
+            self.set_query(self.query)
+        visible = sorted((self.entries[name] for name in self.matches if name in self.entries),
+                         key=self._sort_key())
+        grouped = {}
+        for entry in visible:
+            for group in self._groups(entry):
+                grouped.setdefault(group, []).append(entry)
+        data = []
+        self.index = {}
+        for group in sorted(grouped, key=lambda g: (g is None, str(g).lower())):
+            members = grouped[group]
+            if group is not None:
+                data.append({'viewclass': HEADER_VIEW, 'text': f"{group} ({len(members)})"})
+            for entry in members:
+                self.index.setdefault(entry.name, []).append(len(data))
+                data.append(self.row(entry))
+        return data
+
+    def rows_for(self, name):
+        """(index, row) pairs to patch in place after name changed"""
+        entry = self.entries.get(name)
+        if entry is None:
+            return []
+        row = self.row(entry)
+        return [(i, row) for i in self.index.get(name, [])]
@@ -0,0 +1,272 @@
+"""In-process SOCKS5 front-end that spreads clients over several ssh -D backends"""
+import asyncio
+import itertools
+import struct
+import threading
+import time
+
+ROUND_ROBIN = 'Round robin'
+LEAST_CONNECTIONS = 'Least connections'
+LOWEST_LATENCY = 'Lowest latency'
+POLICIES = [ROUND_ROBIN, LEAST_CONNECTIONS, LOWEST_LATENCY]
+
+BUFFER_SIZE = 64 * 1024
+HEALTH_INTERVAL = 5.0
+EJECT_AFTER = 2
+EJECT_SECONDS = 30.0
+LATENCY_ALPHA = 0.3
+
+
+class Backend:
+    """One local ssh -D SOCKS port and its live statistics"""
+
+    def __init__(self, name, port, host='127.0.0.1', probe_target=('127.0.0.1', 22)):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.probe_target = probe_target
+        self.active = 0
+        self.total = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.ejected_until = 0.0
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.ejected_until
+
+    def record_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_ALPHA * (seconds - self.latency)
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= EJECT_AFTER:
+            self.ejected_until = time.monotonic() + EJECT_SECONDS
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'port': self.port,
+            'active': self.active,
+            'total': self.total,
+            'failures': self.failures,
+            'latency': self.latency,
+            'healthy': self.healthy,
+        }
+
+
+async def socks5_connect_rtt(backend, timeout=5.0):
+    """Open a SOCKS5 CONNECT through backend to its probe target and time the reply
+
+    Tunnelled to the server's own loopback, this measures one round trip
+    through the SSH connection.
+    """
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(backend.host, backend.port), timeout)
+    try:
+        writer.write(b'\x05\x01\x00')
+        await writer.drain()
+        if await asyncio.wait_for(reader.readexactly(2), timeout) != b'\x05\x00':
+            raise ConnectionError("SOCKS5 greeting rejected")
+        host, port = backend.probe_target
+        address = host.encode()
+        start = time.perf_counter()
+        writer.write(b'\x05\x01\x00\x03' + bytes([len(address)]) + address + struct.pack('!H', port))
+        await writer.drain()
+        reply = await asyncio.wait_for(reader.readexactly(4), timeout)
+        elapsed = time.perf_counter() - start
+        if reply[1] != 0:
+            raise ConnectionError(f"SOCKS5 CONNECT failed with code {reply[1]}")
+        return elapsed
+    finally:
+        writer.close()
+
+
+async def pipe(reader, writer, counter=None):
+    """Copy bytes from reader to writer until EOF, then half-close writer
+
+    The caller closes both writers once both directions are done, so a
+    client that shuts down its sending side still gets the reply.
+    """
+    try:
+        while True:
+            data = await reader.read(BUFFER_SIZE)
+            if not data:
+                break
+            if counter is not None:
+                counter(len(data))
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+            return
+    except (OSError, asyncio.CancelledError):
+        pass
+    # A broken direction (or a transport without half-close) ends the session
+    _close(writer)
+
+
+def _close(writer):
+    try:
+        writer.close()
+    except Exception:
+        pass
+
+
+class LoadBalancer:
+    """SOCKS5 listener that hands each client connection to one backend
+
+    Clients speak SOCKS5 end to end with the chosen ssh -D backend; the
+    balancer only picks the backend and splices the two sockets.
+    """
+
+    def __init__(self, listen_port, backends, policy=ROUND_ROBIN, listen_host='127.0.0.1',
+                 health_interval=HEALTH_INTERVAL):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown balancing policy: {policy}")
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.backends = list(backends)
+        self.policy = policy
+        self.health_interval = health_interval
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._rr = itertools.count()
+        self._clients = set()
+        self._server = None
+        self._health_task = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def choose(self, exclude=()):
+        """Pick a backend according to the policy, skipping ejected ones"""
+        candidates = [b for b in self.backends if b.healthy and b not in exclude]
+        if not candidates:
+            # Everything is ejected; fall back to anything not yet tried
+            candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        if self.policy == LEAST_CONNECTIONS:
+            return min(candidates, key=lambda b: (b.active, b.total))
+        if self.policy == LOWEST_LATENCY:
+            return min(candidates, key=lambda b: (b.latency is None, b.latency or 0, b.active))
+        return candidates[next(self._rr) % len(candidates)]
+
+    async def handle_client(self, client_reader, client_writer):
+        task = asyncio.current_task()
+        self._clients.add(task)
+        try:
+            await self._serve_client(client_reader, client_writer)
+        finally:
+            self._clients.discard(task)
+
+    async def _serve_client(self, client_reader, client_writer):
+        tried = []
+        while True:
+            backend = self.choose(tried)
+            if backend is None:
+                client_writer.close()
+                return
+            tried.append(backend)
+            try:
+                backend_reader, backend_writer = await asyncio.wait_for(
+                    asyncio.open_connection(backend.host, backend.port), 5.0)
+                break
+            except (OSError, asyncio.TimeoutError):
+                backend.record_failure()
+
+        backend.active += 1
+        backend.total += 1
+        try:
+            await asyncio.gather(
+                pipe(client_reader, backend_writer, self._count_out),
+                pipe(backend_reader, client_writer, self._count_in),
+            )
+        finally:
+            backend.active -= 1
+            _close(backend_writer)
+            _close(client_writer)
+
+    def _count_out(self, n):
+        self.bytes_out += n
+
+    def _count_in(self, n):
+        self.bytes_in += n
+
+    async def check_backends(self):
+        """Measure every backend once, ejecting the ones that fail"""
+        async def check(backend):
+            try:
+                backend.record_latency(await socks5_connect_rtt(backend))
+                backend.record_success()
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                backend.record_failure()
+        await asyncio.gather(*(check(b) for b in self.backends))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_backends()
+            await asyncio.sleep(self.health_interval)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self.handle_client, self.listen_host, self.listen_port)
+        self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def close(self):
+        """Stop listening and cancel health checks and open client sessions"""
+        if self._health_task:
+            self._health_task.cancel()
+        if self._server:
+            self._server.close()
+        for task in list(self._clients):
+            task.cancel()
+        if self._server:
+            await self._server.wait_closed()
+
+    def serve_in_thread(self):
+        """Run the balancer on its own event loop thread; raises if it cannot listen"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self.start())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self.close())
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def stop(self):
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(5)
+
+    def stats(self):
+        return [backend.stats() for backend in self.backends]
@@ -0,0 +1,195 @@
+"""Hot-standby tunnels behind a switchable SOCKS front door
+
+The user's SOCKS port is served by a FrontDoor that splices each client
+to the active tunnel's own (allocated) port. A StandbyPool keeps the
+next-best saved VPNs connected and authenticated but unused, so a switch
+or a failover only repoints the front door: new clients go to the
+promoted tunnel at once, while connections already open finish on the
+old one.
+
+Standbys are capped in number and dropped once nothing has asked for
+them (a connect, switch or refill) for idle_timeout seconds, so an idle
+app does not hold sessions open on servers it is not using. sshuttle
+tunnels are never kept warm, since only one can run at a time.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sshvpn import readiness, socks_lb, supervisor, tunnel
+
+DEFAULT_STANDBY_COUNT = 2
+MAX_STANDBY_COUNT = 8
+DEFAULT_IDLE_TIMEOUT = 600.0
+REAP_INTERVAL = 15.0
+# The front door only has one backend, so probe it rarely
+FRONT_DOOR_HEALTH_INTERVAL = 60.0
+
+
+class FrontDoor(socks_lb.LoadBalancer):
+    """SOCKS5 listener handing every new client to the one active tunnel"""
+
+    def __init__(self, listen_port):
+        super().__init__(listen_port, [], health_interval=FRONT_DOOR_HEALTH_INTERVAL)
+        self.switches = 0
+        self.switched_at = None
+
+    @property
+    def active(self):
+        return self.backends[0].name if self.backends else None
+
+    def switch(self, name, port, ssh_port=22):
+        """Point new clients at name's SOCKS port; open sessions are left alone
+
+        Health checks CONNECT through the tunnel to ssh_port on the
+        server's loopback, so give the VPN's own ssh port.
+        """
+        self.backends = [socks_lb.Backend(name, port, probe_target=('127.0.0.1', ssh_port))]
+        self.switches += 1
+        self.switched_at = time.time()
+
+
+class StandbyPool:
+    """Warm, unused tunnels for the next-best saved VPNs
+
+    connect_args(name) returns the keyword arguments for
+    TunnelRegistry.connect and raises ValueError for unusable configs.
+    """
+
+    def __init__(self, tunnels, connect_args, size=DEFAULT_STANDBY_COUNT,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, on_event=None, log=None):
+        self.tunnels = tunnels
+        self.connect_args = connect_args
+        self.size = max(0, min(int(size), MAX_STANDBY_COUNT))
+        self.idle_timeout = idle_timeout
+        self.on_event = on_event
+        self.log = log or (lambda message: None)
+        # name -> monotonic time it was last wanted, in rank order
+        self.warm = {}
+        self.lock = threading.Lock()
+        self.promotions = 0
+
+    def names(self):
+        with self.lock:
+            return list(self.warm)
+
+    def __contains__(self, name):
+        return name in self.warm
+
+    def _usable(self, name):
+        record = self.tunnels.get(name)
+        return record is not None and record.state == supervisor.RUNNING
+
+    def fill(self, candidates, exclude=()):
+        """Keep the first size usable candidates warm and drop every other standby
+
+        Blocks while missing standbys connect (in parallel). Returns the
+        names that were newly brought up.
+        """
+        wanted = []
+        for name in candidates:
+            if len(wanted) >= self.size:
+                break
+            if name in exclude or name in wanted:
+                continue
+            # Tunnels started elsewhere (rows, the balancer) are not ours to manage
+            if name in self.tunnels and name not in self.warm:
+                continue
+            wanted.append(name)
+
+        for name in self.names():
+            if name not in wanted:
+                self.drop(name)
+
+        missing = [name for name in wanted if not self._usable(name)]
+        started = []
+        if missing:
+            with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                for name, ok in zip(missing, pool.map(self._start, missing)):
+                    if ok:
+                        started.append(name)
+        now = time.monotonic()
+        with self.lock:
+            # Anything taken while this ran has been promoted and stays out
+            self.warm = {name: now for name in wanted
+                         if (name in started or name in self.warm) and self._usable(name)}
+        return started
+
+    def _start(self, name):
+        if name in self.tunnels:
+            # A dead standby left in the registry
+            self.tunnels.disconnect(name)
+        try:
+            args = self.connect_args(name)
+        except (KeyError, ValueError) as e:
+            self.log(f"Standby '{name}' skipped: {e}")
+            return False
+        if args.get('connection_type') == tunnel.SSHUTTLE:
+            return False
+        args['socks_port'] = None
+        try:
+            record = self.tunnels.connect(name, on_event=self.on_event, **args)
+        except (ValueError, RuntimeError, readiness.TunnelNotReady) as e:
+            self.log(f"Standby '{name}' failed: {e}")
+            return False
+        self.log(f"Standby '{name}' warm on port {record.socks_port} in {record.time_to_ready:.2f}s")
+        return True
+
+    def take(self, name):
+        """Remove name from the pool and return its running record, or None if it is not warm"""
+        with self.lock:
+            if self.warm.pop(name, None) is None:
+                return None
+        if not self._usable(name):
+            self.tunnels.disconnect(name)
+            return None
+        self.promotions += 1
+        return self.tunnels.get(name)
+
+    def first(self):
+        """Best-ranked standby that is still running, or None"""
+        for name in self.names():
+            if self._usable(name):
+                return name
+        return None
+
+    def adopt(self, name):
+        """Keep a demoted tunnel warm if there is room; returns False if the caller should stop it"""
+        if not self._usable(name) or self.tunnels.get(name).connection_type == tunnel.SSHUTTLE:
+            return False
+        with self.lock:
+            if len(self.warm) >= self.size:
+                return False
+            self.warm[name] = time.monotonic()
+        return True
+
+    def drop(self, name):
+        with self.lock:
+            if self.warm.pop(name, None) is None:
+                return False
+        self.tunnels.disconnect(name)
+        return True
+
+    def reap(self):
+        """Disconnect standbys nothing has wanted for idle_timeout; returns their names"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self.lock:
+            expired = [name for name, wanted_at in self.warm.items() if wanted_at < cutoff]
+        return [name for name in expired if self.drop(name)]
+
+    def clear(self):
+        """Disconnect every standby; returns their names"""
+        return [name for name in self.names() if self.drop(name)]
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            warm = dict(self.warm)
+        return {
+            'size': self.size,
+            'idle_timeout': self.idle_timeout,
+            'promotions': self.promotions,
+            'standbys': [{'name': name, 'idle': now - wanted_at,
+                          'socks_port': getattr(self.tunnels.get(name), 'socks_port', None)}
+                         for name, wanted_at in warm.items()],
+        }
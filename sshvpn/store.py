@@ -0,0 +1,229 @@
+"""SQLite-backed store for saved VPN configurations
+
+Each VPN is one row, so saving or deleting an entry is a single
+transaction instead of rewriting the whole fleet, and a crash can only
+lose the write in flight. Host and tag columns are indexed for lookups;
+the full config is kept as JSON in the row.
+
+VPNMapping exposes a store through the dict interface the rest of the
+app already uses, loading rows only when they are asked for.
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vpns (
+    name TEXT PRIMARY KEY,
+    host TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    updated REAL NOT NULL DEFAULT (julianday('now'))
+);
+CREATE INDEX IF NOT EXISTS vpns_host ON vpns(host);
+CREATE TABLE IF NOT EXISTS vpn_tags (
+    name TEXT NOT NULL REFERENCES vpns(name) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (name, tag)
+);
+CREATE INDEX IF NOT EXISTS vpn_tags_tag ON vpn_tags(tag);
+"""
+
+
+def tags_of(config):
+    tags = config.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return sorted({tag.strip() for tag in tags if tag.strip()})
+
+
+class VPNStore:
+    """Per-entry persistent storage of VPN configs"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        # Shared by the UI thread, the asyncio loop and the PAC server
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA foreign_keys=ON')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _put(self, name, config):
+        self.db.execute(
+            'INSERT INTO vpns(name, host, data) VALUES (?, ?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET host=excluded.host, data=excluded.data, '
+            "updated=julianday('now')",
+            (name, str(config.get('ip', '')).strip(), json.dumps(config, ensure_ascii=False)))
+        self.db.execute('DELETE FROM vpn_tags WHERE name = ?', (name,))
+        self.db.executemany('INSERT INTO vpn_tags(name, tag) VALUES (?, ?)',
+                            [(name, tag) for tag in tags_of(config)])
+
+    def put(self, name, config):
+        """Insert or replace one VPN atomically"""
+        with self.lock:
+            with self.db:
+                self.db.execute('BEGIN')
+                self._put(name, config)
+
+    def put_many(self, items):
+        """Insert or replace many VPNs in one transaction"""
+        with self.lock:
+            with self.db:
+                self.db.execute('BEGIN')
+                for name, config in items:
+                    self._put(name, config)
+
+    def get(self, name):
+        with self.lock:
+            row = self.db.execute('SELECT data FROM vpns WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, name):
+        """Remove one VPN; returns False if it did not exist"""
+        with self.lock:
+            with self.db:
+                self.db.execute('BEGIN')
+                cursor = self.db.execute('DELETE FROM vpns WHERE name = ?', (name,))
+        return cursor.rowcount > 0
+
+    def names(self):
+        with self.lock:
+            return [row[0] for row in self.db.execute('SELECT name FROM vpns ORDER BY rowid')]
+
+    def count(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM vpns').fetchone()[0]
+
+    def contains(self, name):
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM vpns WHERE name = ?', (name,)).fetchone() is not None
+
+    def items(self):
+        """Every (name, config) pair, in insertion order"""
+        with self.lock:
+            rows = self.db.execute('SELECT name, data FROM vpns ORDER BY rowid').fetchall()
+        return [(name, json.loads(data)) for name, data in rows]
+
+    def summaries(self):
+        """(name, host, tags) for every VPN without decoding the configs"""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT v.name, v.host, group_concat(t.tag) FROM vpns v '
+                'LEFT JOIN vpn_tags t ON t.name = v.name GROUP BY v.name ORDER BY v.rowid').fetchall()
+        return [(name, host, tags.split(',') if tags else []) for name, host, tags in rows]
+
+    def find(self, host=None, tag=None):
+        """Names matching a host and/or tag, using the indexes"""
+        query = 'SELECT v.name FROM vpns v'
+        where, params = [], []
+        if tag is not None:
+            query += ' JOIN vpn_tags t ON t.name = v.name'
+            where.append('t.tag = ?')
+            params.append(tag)
+        if host is not None:
+            where.append('v.host = ?')
+            params.append(host)
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        with self.lock:
+            return [row[0] for row in self.db.execute(query + ' ORDER BY v.rowid', params)]
+
+    def replace_all(self, saved_vpns):
+        """Make the store hold exactly saved_vpns, in one transaction"""
+        with self.lock:
+            with self.db:
+                self.db.execute('BEGIN')
+                self.db.execute('DELETE FROM vpns')
+                for name, config in saved_vpns.items():
+                    self._put(name, config)
+
+    def import_json(self, path):
+        """Merge a saved_vpns.json file into the store; returns the count"""
+        with open(path, 'r', encoding='utf-8') as f:
+            saved_vpns = json.load(f)
+        self.put_many(saved_vpns.items())
+        return len(saved_vpns)
+
+    def export_json(self, path):
+        """Write the store in the saved_vpns.json format via an atomic rename"""
+        data = dict(self.items())
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return len(data)
+
+
+class VPNMapping(MutableMapping):
+    """Dict view of a VPNStore
+
+    Rows are fetched on access and cached. Assignment and deletion write
+    through immediately; flush() persists configs that were changed in
+    place after being read.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.cache = {}
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            config = self.store.get(name)
+            if config is None:
+                raise KeyError(name)
+            self.cache[name] = (config, json.dumps(config, sort_keys=True))
+        return self.cache[name][0]
+
+    def __setitem__(self, name, config):
+        self.store.put(name, config)
+        self.cache[name] = (config, json.dumps(config, sort_keys=True))
+
+    def __delitem__(self, name):
+        self.cache.pop(name, None)
+        if not self.store.delete(name):
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self.cache or self.store.contains(name)
+
+    def __iter__(self):
+        return iter(self.store.names())
+
+    def __len__(self):
+        return self.store.count()
+
+    def items(self):
+        """Load every row in one query, reusing cached (possibly edited) configs"""
+        result = []
+        for name, config in self.store.items():
+            if name not in self.cache:
+                self.cache[name] = (config, json.dumps(config, sort_keys=True))
+            result.append((name, self.cache[name][0]))
+        return result
+
+    def values(self):
+        return [config for _, config in self.items()]
+
+    def summaries(self):
+        return self.store.summaries()
+
+    def flush(self):
+        """Write back cached configs that were modified in place"""
+        dirty = []
+        for name, (config, snapshot) in list(self.cache.items()):
+            current = json.dumps(config, sort_keys=True)
+            if current != snapshot:
+                dirty.append((name, config))
+                self.cache[name] = (config, current)
+        if dirty:
+            self.store.put_many(dirty)
+        return len(dirty)
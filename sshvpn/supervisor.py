@@ -0,0 +1,215 @@
+"""Supervision of tunnel processes with backoff restarts and a circuit breaker"""
+import random
+import threading
+import time
+
+from sshvpn import readiness
+
+# Tunnel states reported to on_event callbacks
+STARTING = 'starting'
+RUNNING = 'running'
+RESTARTING = 'restarting'
+FAILED = 'failed'
+STOPPED = 'stopped'
+
+
+class Backoff:
+    """Jittered exponential backoff; the first retry is immediate"""
+
+    def __init__(self, base=0.25, factor=2.0, maximum=30.0):
+        self.base = base
+        self.factor = factor
+        self.maximum = maximum
+
+    def delay(self, attempt):
+        if attempt <= 0:
+            return 0.0
+        ceiling = min(self.maximum, self.base * self.factor ** (attempt - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+class CircuitBreaker:
+    """Open after max_failures failures within window seconds"""
+
+    def __init__(self, max_failures=5, window=120.0):
+        self.max_failures = max_failures
+        self.window = window
+        self.failures = []
+
+    def record_failure(self):
+        now = time.monotonic()
+        self.failures = [t for t in self.failures if now - t < self.window]
+        self.failures.append(now)
+
+    @property
+    def is_open(self):
+        now = time.monotonic()
+        return len([t for t in self.failures if now - t < self.window]) >= self.max_failures
+
+    def reset(self):
+        self.failures = []
+
+
+class SupervisedTunnel:
+    """Watch one tunnel child process and restart it when it dies or stalls
+
+    launch() must start the child, wait for readiness and return the
+    process, raising on failure. check() is an optional liveness probe
+    run every check_interval seconds; max_stalls consecutive failed
+    checks count as a stall and the child is restarted. stop_process, if
+    given, replaces plain termination of the child when supervision stops.
+    """
+
+    def __init__(self, name, launch, check=None, on_event=None, backoff=None,
+                 breaker=None, check_interval=5.0, max_stalls=3, stable_after=30.0,
+                 stop_process=None):
+        self.name = name
+        self.launch = launch
+        self.check = check
+        self.on_event = on_event
+        self.backoff = backoff or Backoff()
+        self.breaker = breaker or CircuitBreaker()
+        self.check_interval = check_interval
+        self.max_stalls = max_stalls
+        self.stable_after = stable_after
+        self.stop_process = stop_process
+        self.process = None
+        self.state = STOPPED
+        self.restart_count = 0
+        self.stall_count = 0
+        self.launch_count = 0
+        self.launch_seconds = None
+        self.last_error = ''
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, process=None):
+        """Begin supervising, adopting an already-ready process if given"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(process,), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop supervising and terminate the child"""
+        self._stop.set()
+        self._terminate(self.process, timeout)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._set_state(STOPPED)
+
+    def _terminate(self, process, timeout=5):
+        if self.stop_process is not None:
+            self.stop_process(process)
+        elif process is not None and process.poll() is None:
+            try:
+                process.terminate()
+                process.wait(timeout=timeout)
+            except Exception:
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    @property
+    def uptime(self):
+        if self.state != RUNNING or self.started_at is None:
+            return 0.0
+        return time.monotonic() - self.started_at
+
+    def _set_state(self, state, message=''):
+        # Once stopped, a launch or monitor finishing late must not revive the tunnel
+        if self._stop.is_set() and state != STOPPED:
+            return
+        self.state = state
+        if message:
+            self.last_error = message
+        if self.on_event:
+            try:
+                self.on_event(self, state, message)
+            except Exception:
+                pass
+
+    def _run(self, process):
+        attempt = 0
+        while not self._stop.is_set():
+            if process is None:
+                if self.state != RESTARTING:
+                    self._set_state(STARTING)
+                try:
+                    launch_start = time.monotonic()
+                    process = self.launch()
+                    self.launch_seconds = time.monotonic() - launch_start
+                    self.launch_count += 1
+                    # stop() ran while launch() was starting this child
+                    if self._stop.is_set():
+                        break
+                except Exception as e:
+                    if self._stop.is_set():
+                        break
+                    self.breaker.record_failure()
+                    attempt += 1
+                    if self.breaker.is_open:
+                        self._set_state(FAILED, f"circuit open: {e}")
+                        return
+                    self.last_error = str(e)
+                    self._stop.wait(self.backoff.delay(attempt))
+                    continue
+
+            self.process = process
+            self.started_at = time.monotonic()
+            self._set_state(RUNNING)
+            reason = self._monitor(process)
+            self.process = None
+            if self._stop.is_set():
+                break
+            process = None
+
+            # A tunnel that stayed up for a while gets a fresh backoff budget
+            if time.monotonic() - self.started_at >= self.stable_after:
+                attempt = 0
+            self.restart_count += 1
+            self.breaker.record_failure()
+            if self.breaker.is_open:
+                self._set_state(FAILED, f"circuit open: {reason}")
+                return
+            self._set_state(RESTARTING, reason)
+            self._stop.wait(self.backoff.delay(attempt))
+            attempt += 1
+
+        # stop() may have read self.process before this child was published
+        if process is not None:
+            self._terminate(process)
+
+    def _monitor(self, process):
+        """Block until the child exits, stalls or supervision stops"""
+        failed_checks = 0
+        next_check = time.monotonic() + self.check_interval
+        while not self._stop.wait(0.1):
+            if process.poll() is not None:
+                return f"process exited with code {process.returncode}"
+            if self.check is None or time.monotonic() < next_check:
+                continue
+            next_check = time.monotonic() + self.check_interval
+            if self.check():
+                failed_checks = 0
+                continue
+            failed_checks += 1
+            if failed_checks >= self.max_stalls:
+                self.stall_count += 1
+                try:
+                    process.kill()
+                    process.wait(timeout=5)
+                except Exception:
+                    pass
+                return "listener stalled"
+        return "stopped"
+
+
+def socks_check(socks_port):
+    """Return a liveness check that performs a SOCKS5 greeting on socks_port"""
+    return lambda: readiness.socks5_handshake(socks_port)
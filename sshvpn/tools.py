@@ -0,0 +1,113 @@
+"""Cached discovery of the external programs the app relies on"""
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+KNOWN_TOOLS = {
+    'ssh': ['-V'],
+    'sshuttle': ['--version'],
+    'gsettings': ['--version'],
+    'nmcli': ['--version'],
+}
+VERSION_PATTERN = re.compile(r'(\d+(?:\.\d+)+[\w.-]*)')
+
+
+class ToolInfo:
+    """Resolved location of one program, plus its version once probed"""
+
+    def __init__(self, name, path, mtime):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.version = None
+        self.version_text = None
+
+    @property
+    def available(self):
+        return self.path is not None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+class ToolRegistry:
+    """Resolve programs with a PATH lookup and cache the result
+
+    Lookups never execute the program. Entries are invalidated when PATH
+    changes or the resolved binary's mtime changes. Versions are probed
+    lazily, once per binary, or ahead of time with warm_up().
+    """
+
+    def __init__(self, version_args=None):
+        self.version_args = dict(KNOWN_TOOLS if version_args is None else version_args)
+        self.cache = {}
+        self.path_env = os.environ.get('PATH', '')
+        self.lock = threading.Lock()
+
+    def _check_path_env(self):
+        current = os.environ.get('PATH', '')
+        if current != self.path_env:
+            self.path_env = current
+            self.cache.clear()
+
+    def resolve(self, name):
+        """Return the cached ToolInfo for name, refreshing it if stale"""
+        with self.lock:
+            self._check_path_env()
+            info = self.cache.get(name)
+            if info is not None and (info.path is None or _mtime(info.path) == info.mtime):
+                return info
+            path = shutil.which(name)
+            info = ToolInfo(name, path, _mtime(path))
+            self.cache[name] = info
+            return info
+
+    def available(self, name):
+        return self.resolve(name).available
+
+    def path(self, name):
+        return self.resolve(name).path
+
+    def version(self, name):
+        """Return the program's version string, running it at most once per binary"""
+        info = self.resolve(name)
+        if not info.available or info.version_text is not None:
+            return info.version
+        args = self.version_args.get(name, ['--version'])
+        try:
+            result = subprocess.run([info.path, *args], capture_output=True, text=True, timeout=5)
+            text = (result.stdout + result.stderr).strip()
+        except (OSError, subprocess.TimeoutExpired):
+            text = ''
+        match = VERSION_PATTERN.search(text)
+        info.version_text = text
+        info.version = match.group(1) if match else None
+        return info.version
+
+    def warm_up(self, names=None, versions=True):
+        """Resolve (and optionally version-probe) tools ahead of first use"""
+        for name in names or self.version_args:
+            if versions:
+                self.version(name)
+            else:
+                self.resolve(name)
+
+    def warm_up_in_background(self, names=None, versions=True):
+        thread = threading.Thread(target=self.warm_up, args=(names, versions), daemon=True)
+        thread.start()
+        return thread
+
+    def snapshot(self):
+        """Return {name: (path, version)} for every tool resolved so far"""
+        with self.lock:
+            return {name: (info.path, info.version) for name, info in self.cache.items()}
+
+
+# Process-wide registry shared by the GUI, CLI and proxy helpers
+default_registry = ToolRegistry()
@@ -0,0 +1,330 @@
+"""In-process SSH transport serving SOCKS5 over one asyncssh connection
+
+Instead of spawning `ssh -D`, the app holds the SSH connection itself
+and opens a direct-tcpip channel per SOCKS client. Every channel's
+bytes, open latency and flow-control waits are visible, and any number
+of channels share the one connection.
+
+asyncssh is optional; InProcessTunnel raises RuntimeError when it is
+missing. The tunnel object looks enough like a Popen (poll, terminate,
+kill, wait, returncode) for SupervisedTunnel to restart it.
+"""
+import asyncio
+import ipaddress
+import shlex
+import socket
+import struct
+import threading
+import time
+
+from sshvpn import aioloop, auth, readiness
+from sshvpn.probe import percentile
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+CHUNK = 64 * 1024
+# Drain waits longer than this count as the SSH window pushing back
+FLOW_WAIT_THRESHOLD = 0.005
+MAX_CLOSED_CHANNELS = 256
+
+SOCKS_VERSION = 5
+CMD_CONNECT = 1
+ATYP_IPV4, ATYP_DOMAIN, ATYP_IPV6 = 1, 3, 4
+REPLY_OK, REPLY_FAILURE, REPLY_UNREACHABLE, REPLY_CMD_UNSUPPORTED = 0, 1, 4, 7
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def shared_loop():
+    """The event loop every in-process tunnel runs on, started on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = aioloop.BackgroundLoop().start()
+        return _loop
+
+
+def available():
+    return asyncssh is not None
+
+
+def ssh_option(ssh_options, key, default=None):
+    """Value of a -o Key=Value entry in an ssh options string"""
+    tokens = shlex.split(ssh_options or '')
+    wanted = key.lower()
+    for i, token in enumerate(tokens):
+        value = None
+        if token == '-o' and i + 1 < len(tokens):
+            value = tokens[i + 1]
+        elif token.startswith('-o') and len(token) > 2:
+            value = token[2:]
+        if value and '=' in value:
+            name, _, option = value.partition('=')
+            if name.strip().lower() == wanted:
+                return option.strip()
+    return default
+
+
+def connect_kwargs(username, credentials, ssh_options):
+    """asyncssh.connect() keyword arguments for credentials and ssh options"""
+    kwargs = {'username': username}
+    if credentials.method == auth.PASSWORD:
+        kwargs.update(password=credentials.password, client_keys=None, agent_path=None)
+    elif credentials.method == auth.KEY:
+        kwargs.update(client_keys=[credentials.key_file], passphrase=credentials.password or None,
+                      agent_path=None)
+    if (ssh_option(ssh_options, 'StrictHostKeyChecking', 'ask') or '').lower() == 'no':
+        kwargs['known_hosts'] = None
+    interval = ssh_option(ssh_options, 'ServerAliveInterval')
+    if interval and interval.isdigit():
+        kwargs['keepalive_interval'] = int(interval)
+    count = ssh_option(ssh_options, 'ServerAliveCountMax')
+    if count and count.isdigit():
+        kwargs['keepalive_count_max'] = int(count)
+    compression = ssh_option(ssh_options, 'Compression')
+    if compression and compression.lower() == 'yes':
+        kwargs['compression_algs'] = ['zlib@openssh.com', 'zlib', 'none']
+    ciphers = ssh_option(ssh_options, 'Ciphers')
+    if ciphers:
+        kwargs['encryption_algs'] = ciphers.split(',')
+    return kwargs
+
+
+class ChannelStats:
+    """Counters for one direct-tcpip channel"""
+
+    def __init__(self, channel_id, target):
+        self.id = channel_id
+        self.target = target
+        self.opened_at = time.time()
+        self.open_latency = None
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.flow_waits = 0
+        self.flow_wait_seconds = 0.0
+        self.closed_at = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'target': self.target,
+            'open_latency_ms': None if self.open_latency is None else self.open_latency * 1000,
+            'bytes_up': self.bytes_up,
+            'bytes_down': self.bytes_down,
+            'flow_waits': self.flow_waits,
+            'flow_wait_seconds': self.flow_wait_seconds,
+            'open': self.closed_at is None,
+            'error': self.error,
+        }
+
+
+async def _read_socks_request(reader, writer):
+    """Run the no-auth SOCKS5 handshake and return (host, port) or None"""
+    version, count = await reader.readexactly(2)
+    methods = await reader.readexactly(count)
+    if version != SOCKS_VERSION or 0 not in methods:
+        writer.write(b'\x05\xff')
+        return None
+    writer.write(b'\x05\x00')
+    version, command, _, atyp = await reader.readexactly(4)
+    if atyp == ATYP_IPV4:
+        host = socket.inet_ntoa(await reader.readexactly(4))
+    elif atyp == ATYP_IPV6:
+        host = str(ipaddress.IPv6Address(await reader.readexactly(16)))
+    elif atyp == ATYP_DOMAIN:
+        length = (await reader.readexactly(1))[0]
+        host = (await reader.readexactly(length)).decode('idna')
+    else:
+        _reply(writer, REPLY_FAILURE)
+        return None
+    port = struct.unpack('!H', await reader.readexactly(2))[0]
+    if command != CMD_CONNECT:
+        _reply(writer, REPLY_CMD_UNSUPPORTED)
+        return None
+    return host, port
+
+
+def _reply(writer, code):
+    writer.write(struct.pack('!BBBB4sH', SOCKS_VERSION, code, 0, ATYP_IPV4, b'\0' * 4, 0))
+
+
+class InProcessTunnel:
+    """One asyncssh connection with a local SOCKS5 listener on top"""
+
+    def __init__(self, ip, port, username, credentials, socks_port, ssh_options='', on_line=None,
+                 loop=None):
+        if asyncssh is None:
+            raise RuntimeError("asyncssh is not installed (pip install asyncssh)")
+        self.ip = ip
+        self.port = int(port)
+        self.username = username
+        self.credentials = credentials
+        self.socks_port = socks_port
+        self.ssh_options = ssh_options
+        self.on_line = on_line
+        self.loop = loop or shared_loop()
+        self.pid = None
+        self.returncode = None
+        self.time_to_ready = None
+        self.connection = None
+        self.server = None
+        self.channels = {}
+        self.closed_channels = []
+        self.next_channel = 0
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.channel_errors = 0
+        self._client_tasks = set()
+        self._watch_task = None
+        self._closed = threading.Event()
+
+    def _log(self, message):
+        if self.on_line:
+            self.on_line(message)
+
+    # Popen-like interface used by SupervisedTunnel and TunnelRegistry
+
+    def start(self, deadline=readiness.DEFAULT_DEADLINE):
+        """Connect and start the SOCKS listener; returns seconds to ready"""
+        start = time.monotonic()
+        try:
+            self.loop.run(asyncio.wait_for(self._start(), deadline), timeout=deadline + 5)
+        except (asyncio.TimeoutError, TimeoutError):
+            self.kill()
+            raise readiness.TunnelNotReady(f"SSH connection not ready after {deadline:.0f}s")
+        except (OSError, asyncssh.Error) as e:
+            self.kill()
+            raise readiness.TunnelNotReady(str(e) or e.__class__.__name__)
+        self.time_to_ready = time.monotonic() - start
+        return self.time_to_ready
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            self.loop.submit(self._close(0))
+
+    def kill(self):
+        self.terminate()
+
+    def wait(self, timeout=None):
+        self._closed.wait(timeout)
+        return self.returncode
+
+    # Connection handling, all on the shared loop
+
+    async def _start(self):
+        kwargs = connect_kwargs(self.username, self.credentials, self.ssh_options)
+        self.connection = await asyncssh.connect(self.ip, self.port, **kwargs)
+        self._log(f"Connected to {self.ip}:{self.port} in-process "
+                  f"({self.connection.get_extra_info('server_version', '')})")
+        self.server = await asyncio.start_server(self._handle_client, '127.0.0.1', self.socks_port)
+        self._watch_task = asyncio.get_running_loop().create_task(self._watch_connection())
+
+    async def _watch_connection(self):
+        await self.connection.wait_closed()
+        if self.returncode is None:
+            self._log("SSH connection closed by peer")
+            await self._close(255)
+
+    async def _close(self, code):
+        if self.returncode is not None:
+            return
+        self.returncode = code
+        if self._watch_task is not None and self._watch_task is not asyncio.current_task():
+            self._watch_task.cancel()
+        if self.server is not None:
+            self.server.close()
+        for task in list(self._client_tasks):
+            task.cancel()
+        if self._client_tasks:
+            await asyncio.gather(*self._client_tasks, return_exceptions=True)
+        if self.connection is not None:
+            self.connection.close()
+        self._closed.set()
+
+    async def _handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self._client_tasks.add(task)
+        stats = None
+        try:
+            target = await _read_socks_request(reader, writer)
+            if target is None:
+                return
+            self.next_channel += 1
+            stats = ChannelStats(self.next_channel, f"{target[0]}:{target[1]}")
+            self.channels[stats.id] = stats
+            started = time.perf_counter()
+            try:
+                remote_reader, remote_writer = await self.connection.open_connection(*target)
+            except (OSError, asyncssh.Error) as e:
+                stats.error = str(e)
+                self.channel_errors += 1
+                _reply(writer, REPLY_UNREACHABLE)
+                await writer.drain()
+                return
+            stats.open_latency = time.perf_counter() - started
+            _reply(writer, REPLY_OK)
+            await writer.drain()
+            await asyncio.gather(self._pipe(reader, remote_writer, stats, True),
+                                 self._pipe(remote_reader, writer, stats, False))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._client_tasks.discard(task)
+            if stats is not None:
+                stats.closed_at = time.time()
+                self.channels.pop(stats.id, None)
+                self.closed_channels.append(stats)
+                del self.closed_channels[:-MAX_CLOSED_CHANNELS]
+
+    async def _pipe(self, reader, writer, stats, upstream):
+        """Copy one direction; drain() waits on the SSH window for flow control"""
+        try:
+            while True:
+                data = await reader.read(CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                waited = time.perf_counter()
+                await writer.drain()
+                waited = time.perf_counter() - waited
+                if waited > FLOW_WAIT_THRESHOLD:
+                    stats.flow_waits += 1
+                    stats.flow_wait_seconds += waited
+                if upstream:
+                    stats.bytes_up += len(data)
+                    self.bytes_up += len(data)
+                else:
+                    stats.bytes_down += len(data)
+                    self.bytes_down += len(data)
+        except (ConnectionError, OSError, asyncssh.Error):
+            pass
+        finally:
+            try:
+                writer.write_eof()
+            except (OSError, asyncssh.Error, AttributeError, RuntimeError):
+                pass
+
+    def stats(self):
+        """Connection-level counters plus per-channel detail"""
+        open_channels = list(self.channels.values())
+        latencies = [c.open_latency for c in open_channels + self.closed_channels if c.open_latency is not None]
+        p50 = percentile(latencies, 50)
+        return {
+            'channels_open': len(open_channels),
+            'channels_total': self.next_channel,
+            'channel_errors': self.channel_errors,
+            'bytes_up': self.bytes_up,
+            'bytes_down': self.bytes_down,
+            'open_latency_p50_ms': None if p50 is None else p50 * 1000,
+            'flow_waits': sum(c.flow_waits for c in open_channels + self.closed_channels),
+            'channels': [c.to_dict() for c in open_channels],
+        }
@@ -0,0 +1,92 @@
+"""Tunnel command construction and process launch"""
+import shlex
+import subprocess
+
+from sshvpn import readiness, routes as route_planner
+
+SSH_TUNNEL = "SSH Tunnel"
+SSHUTTLE = "Full VPN (sshuttle)"
+# SOCKS served by the app itself over one asyncssh connection (sshvpn.transport)
+IN_PROCESS = "SSH Tunnel (in-process)"
+CONNECTION_TYPES = [SSH_TUNNEL, SSHUTTLE, IN_PROCESS]
+
+
+def build_command(ip, port, username, credentials, ssh_options, connection_type, socks_port,
+                  routes=None, temp_files=None):
+    """Build the ssh or sshuttle command line for a tunnel
+
+    credentials is an auth.Credentials; secrets are passed through the
+    environment from credentials.env(), never on the command line.
+    routes is a saved VPN's "routes" section; sshuttle only tunnels the
+    subnets it plans (see sshvpn.routes). Long subnet lists go into
+    temporary files whose paths are appended to temp_files, if given;
+    the caller removes them (routes.remove_files) once the tunnel is gone.
+    """
+    if connection_type == SSHUTTLE:
+        plan = route_planner.RoutePlan.from_section(routes, ip)
+        cmd = [
+            "sshuttle",
+            "-r", f"{username}@{ip}:{port}",
+            # sshuttle shlex-splits -e, so the options string is passed through as quoted
+            "-e", f"{shlex.join(['ssh', *credentials.ssh_args()])} {ssh_options}".strip(),
+            *plan.args()
+        ]
+        if temp_files is not None:
+            temp_files.extend(plan.files)
+        return cmd
+    # Standard SSH tunnel (SOCKS proxy)
+    return [
+        "ssh",
+        *credentials.ssh_args(),
+        *shlex.split(ssh_options),
+        "-D", str(socks_port),  # SOCKS proxy on specified port
+        "-N",  # No remote command
+        "-p", str(port),
+        f"{username}@{ip}"
+    ]
+
+
+def launch(cmd, connection_type, socks_port, deadline=readiness.DEFAULT_DEADLINE, on_line=None, env=None):
+    """Start a tunnel process and wait until it is usable
+
+    Returns (process, collector, time_to_ready). The process is killed and
+    TunnelNotReady raised if it does not become ready before the deadline.
+    Every stdout/stderr line of the child is passed to on_line if given.
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE if on_line else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        env=env
+    )
+    if on_line:
+        readiness.StreamCollector(process.stdout, max_lines=1, on_line=on_line)
+    try:
+        if connection_type == SSHUTTLE:
+            collector = readiness.StreamCollector(process.stderr, readiness.SSHUTTLE_READY_MARKER,
+                                                  on_line=on_line)
+            time_to_ready = readiness.wait_for_marker(process, collector, deadline)
+        else:
+            collector = readiness.StreamCollector(process.stderr, on_line=on_line)
+            time_to_ready = readiness.wait_for_socks(process, socks_port, deadline, collector)
+    except BaseException:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        raise
+    return process, collector, time_to_ready
+
+
+def terminate(process, timeout=5):
+    """Terminate a tunnel process, killing it if it does not exit in time"""
+    if process is None or process.poll() is not None:
+        return
+    try:
+        process.terminate()
+        process.wait(timeout=timeout)
+    except (subprocess.TimeoutExpired, ProcessLookupError):
+        try:
+            process.kill()
+        except OSError:
+            pass
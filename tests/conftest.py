@@ -0,0 +1,106 @@
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from sshvpn import aioloop, socks_lb
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+PASSWORD = 'secret'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def loop():
+    """A background event loop for servers the code under test talks to"""
+    background = aioloop.BackgroundLoop().start()
+    yield background
+    background.stop()
+
+
+async def _socks_client(reader, writer):
+    """Minimal SOCKS5 CONNECT (IPv4 only) splicing with socks_lb.pipe"""
+    try:
+        greeting = await reader.readexactly(2)
+        await reader.readexactly(greeting[1])
+        writer.write(b'\x05\x00')
+        request = await reader.readexactly(10)
+        host, port = socket.inet_ntoa(request[4:8]), struct.unpack('!H', request[8:])[0]
+        target_reader, target_writer = await asyncio.open_connection(host, port)
+    except (OSError, asyncio.IncompleteReadError):
+        writer.close()
+        return
+    writer.write(b'\x05\x00\x00\x01' + request[4:])
+    await writer.drain()
+    await asyncio.gather(socks_lb.pipe(reader, target_writer), socks_lb.pipe(target_reader, writer))
+    target_writer.close()
+    writer.close()
+
+
+@pytest.fixture
+def socks_port(loop):
+    """Port of a plain SOCKS5 proxy running on the background loop"""
+    sessions = set()
+
+    async def serve(reader, writer):
+        sessions.add(asyncio.current_task())
+        try:
+            await _socks_client(reader, writer)
+        finally:
+            sessions.discard(asyncio.current_task())
+
+    async def close(server):
+        server.close()
+        for task in list(sessions):
+            task.cancel()
+        await asyncio.gather(*sessions, return_exceptions=True)
+
+    server = loop.run(asyncio.start_server(serve, '127.0.0.1', 0))
+    yield server.sockets[0].getsockname()[1]
+    loop.run(close(server))
+
+
+if asyncssh is not None:
+    class _Server(asyncssh.SSHServer):
+        connections = []
+
+        def connection_made(self, connection):
+            self.connections.append(connection)
+
+        def begin_auth(self, username):
+            return True
+
+        def password_auth_supported(self):
+            return True
+
+        def validate_password(self, username, password):
+            return password == PASSWORD
+
+        def connection_requested(self, dest_host, dest_port, orig_host, orig_port):
+            return True
+
+
+@pytest.fixture
+def ssh_server(loop):
+    """(port, connections) of a local asyncssh server allowing direct-tcpip anywhere"""
+    if asyncssh is None:
+        pytest.skip("asyncssh not installed")
+
+    async def start():
+        key = asyncssh.generate_private_key('ssh-ed25519')
+        return await asyncssh.create_server(_Server, '127.0.0.1', 0, server_host_keys=[key])
+
+    _Server.connections = []
+    acceptor = loop.run(start())
+    yield acceptor.sockets[0].getsockname()[1], _Server.connections
+    acceptor.close()
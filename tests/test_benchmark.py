@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from sshvpn import benchmark
+from conftest import free_port
+
+
+@pytest.fixture
+def target(loop):
+    """The benchmark's echo/sink server on the background loop"""
+    server = loop.run(asyncio.start_server(benchmark.handle_target, '127.0.0.1', 0))
+    yield server.sockets[0].getsockname()
+    server.close()
+
+
+def test_bench_bulk_counts_every_byte(socks_port, target):
+    result = asyncio.run(benchmark.bench_bulk(socks_port, target, 3_000_000, 3))
+    assert result['bytes'] == 3_000_000
+    assert result['streams'] == 3
+    assert result['mb_per_s'] > 0
+
+
+def test_bench_requests_echoes_every_request(socks_port, target):
+    result = asyncio.run(benchmark.bench_requests(socks_port, target, 50, 10, 4096))
+    assert result['errors'] == 0
+    assert result['connections_per_s'] > 0
+    assert result['latency_p50_ms'] <= result['latency_p99_ms']
+
+
+def test_bench_requests_counts_refused_connections(target):
+    result = asyncio.run(benchmark.bench_requests(free_port(), target, 5, 5, 64))
+    assert result['errors'] == 5
+    assert result['latency_p50_ms'] is None
+
+
+def test_main_without_tunnel_reports_json(socks_port, capsys):
+    status = benchmark.main(['--no-tunnel', '--socks-port', str(socks_port), '--bulk-mb', '1',
+                             '--requests', '10', '--concurrency', '2'])
+    assert status == 0
+    assert '"mb_per_s"' in capsys.readouterr().out
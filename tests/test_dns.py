@@ -0,0 +1,7 @@
+from sshvpn import dns
+
+
+def test_cache_is_opt_in():
+    assert dns.stub_for({}, 1080) is None
+    assert dns.stub_for({'dns': {'cache': True}}, 1080) is not None
+    assert dns.stub_for({}, 1080, force=True).port == dns.DEFAULT_DNS_PORT
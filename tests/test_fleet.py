@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from sshvpn import auth, fleet, transport
+
+
+def entry(name, port, **kwargs):
+    return fleet.ImportEntry(name, fleet.make_config('127.0.0.1', port, 'tester', **kwargs), 'test')
+
+
+async def banner_server():
+    """A listener that only sends an SSH banner, enough to pass the probe"""
+    async def greet(reader, writer):
+        writer.write(b'SSH-2.0-test\r\n')
+        await writer.drain()
+        writer.close()
+    server = await asyncio.start_server(greet, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+@pytest.mark.skipif(not transport.available(), reason="asyncssh not installed")
+def test_bad_key_file_fails_only_its_entry(tmp_path):
+    key_file = tmp_path / 'id_broken'
+    key_file.write_text('not a private key\n')
+
+    async def run():
+        server, port = await banner_server()
+        async with server:
+            entries = [entry('broken', port, key_file=str(key_file), auth_method=auth.KEY),
+                       entry('other', port, password='secret', auth_method=auth.PASSWORD)]
+            return await fleet.validate(entries, timeout=2)
+
+    broken, other = asyncio.run(run())
+    assert broken.status == fleet.AUTH_FAILED
+    assert broken.error
+    # The second entry was still checked rather than cancelled by the first
+    assert other.status != fleet.NEW
+
+
+def test_unexpected_error_is_recorded_per_entry(monkeypatch):
+    async def check_entry(item, timeout, check_auth):
+        if item.name == 'boom':
+            raise RuntimeError("unexpected")
+        item.status = fleet.OK
+
+    monkeypatch.setattr(fleet, 'check_entry', check_entry)
+    seen = []
+    entries = [entry('boom', 22), entry('fine', 22)]
+    asyncio.run(fleet.validate(entries, on_result=seen.append))
+    assert [(e.status, e.error) for e in entries] == [(fleet.CHECK_FAILED, 'unexpected'), (fleet.OK, None)]
+    assert len(seen) == 2
+
+
+def parse(tmp_path, text):
+    path = tmp_path / 'config'
+    path.write_text(text)
+    return {name: config for name, config, _ in fleet.parse_ssh_config(str(path))}
+
+
+def test_ssh_config_wildcards_apply_only_to_matching_hosts(tmp_path):
+    hosts = parse(tmp_path, """
+Host web1 web2 db1
+    HostName %h.example.com
+
+Host web*
+    User deploy
+    Port 2222
+
+Host * !db1
+    IdentityFile /keys/default
+""")
+    assert hosts['web1']['username'] == 'deploy'
+    assert hosts['web1']['port'] == '2222'
+    assert hosts['web1']['key_file'] == '/keys/default'
+    assert hosts['db1']['port'] == '22'
+    assert hosts['db1']['username'] != 'deploy'
+    assert hosts['db1']['key_file'] != '/keys/default'
+
+
+def test_ssh_config_first_value_wins_in_file_order(tmp_path):
+    hosts = parse(tmp_path, """
+User everyone
+
+Host *
+    Port 2200
+
+Host app
+    HostName 10.0.0.5
+    Port 22
+    User admin
+""")
+    assert hosts['app']['ip'] == '10.0.0.5'
+    assert hosts['app']['port'] == '2200'
+    assert hosts['app']['username'] == 'everyone'
+
+
+def test_ssh_config_relative_include_resolves_against_ssh_dir(tmp_path, monkeypatch):
+    ssh_dir = tmp_path / 'ssh'
+    (ssh_dir / 'config.d').mkdir(parents=True)
+    (ssh_dir / 'config.d' / 'lab').write_text("Host lab\n    HostName 192.0.2.7\n")
+    monkeypatch.setattr(fleet, 'SSH_DIR', str(ssh_dir))
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    hosts = parse(elsewhere, "Include config.d/*\n")
+    assert hosts['lab']['ip'] == '192.0.2.7'
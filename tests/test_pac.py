@@ -0,0 +1,14 @@
+from sshvpn import pac
+
+
+def source(vpn, ports):
+    return pac.PacSource(lambda: vpn, lambda: ports)
+
+
+def test_etag_follows_the_script_not_the_process():
+    vpn = {'pac': {'direct': ['.lan']}}
+    first_script, first = source(vpn, (1080, {})).current()
+    # A new process compiling the same rules serves the same ETag
+    assert source(dict(vpn), (1080, {})).current() == (first_script, first)
+    assert source({'pac': {'direct': ['.corp']}}, (1080, {})).current()[1] != first
+    assert source(vpn, (1081, {})).current()[1] != first
@@ -0,0 +1,10 @@
+import shlex
+
+from sshvpn import profiles, transport
+
+
+def test_merge_options_keeps_quoted_values_intact():
+    merged = profiles.merge_options('-o "ProxyCommand=nc -X 5 %h %p" -o Compression=no -4',
+                                    {'Compression': 'yes'})
+    assert shlex.split(merged) == ['-o', 'ProxyCommand=nc -X 5 %h %p', '-4', '-o', 'Compression=yes']
+    assert transport.ssh_option(merged, 'ProxyCommand') == 'nc -X 5 %h %p'
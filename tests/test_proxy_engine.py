@@ -0,0 +1,28 @@
+import sys
+
+import pytest
+
+from sshvpn import proxy_engine
+
+
+@pytest.fixture
+def command_loop(loop):
+    proxy_engine.use_loop(loop)
+    yield loop
+    proxy_engine.use_loop(None)
+
+
+def test_commands_run_on_the_loop(command_loop):
+    script = 'import sys; sys.stdout.write(sys.stdin.read().upper())'
+    assert proxy_engine._run([sys.executable, '-c', script], input='proxy') == 'PROXY'
+
+
+def test_failed_command_raises_proxy_error(command_loop):
+    with pytest.raises(proxy_engine.ProxyError):
+        proxy_engine._run([sys.executable, '-c', 'import sys; sys.exit("no schema")'])
+
+
+def test_on_the_loop_thread_it_falls_back_to_subprocess(command_loop):
+    async def run_inline():
+        return proxy_engine._run([sys.executable, '-c', 'print("inline")'])
+    assert command_loop.run(run_inline(), timeout=10).strip() == 'inline'
@@ -0,0 +1,58 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from sshvpn import readiness, registry, tunnel
+
+SLEEPER = [sys.executable, '-c', 'import time; time.sleep(60)']
+
+
+def test_disconnect_while_launching_stops_the_new_child(monkeypatch):
+    launching = threading.Event()
+    release = threading.Event()
+    children = []
+
+    def launch(cmd, connection_type, socks_port, deadline, on_line=None, env=None):
+        launching.set()
+        release.wait(5)
+        children.append(subprocess.Popen(SLEEPER))
+        return children[-1], None, 0.1
+
+    monkeypatch.setattr(tunnel, 'launch', launch)
+    tunnels = registry.TunnelRegistry()
+    errors = []
+
+    def connect():
+        try:
+            tunnels.connect('vpn', '192.0.2.1', 22, 'me', 'secret', '', tunnel.SSH_TUNNEL)
+        except readiness.TunnelNotReady as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=connect)
+    worker.start()
+    assert launching.wait(5)
+    port = tunnels.get('vpn').socks_port
+    assert tunnels.disconnect('vpn')
+    # The launching child still owns the port until connect() has stopped it
+    assert port in tunnels.allocator.reserved
+    release.set()
+    worker.join(10)
+
+    assert len(errors) == 1
+    assert children[0].poll() is not None
+    assert 'vpn' not in tunnels
+    assert port not in tunnels.allocator.reserved
+
+
+def test_failed_launch_releases_the_port(monkeypatch):
+    def launch(*args, **kwargs):
+        raise readiness.TunnelNotReady("refused")
+
+    monkeypatch.setattr(tunnel, 'launch', launch)
+    tunnels = registry.TunnelRegistry()
+    with pytest.raises(readiness.TunnelNotReady):
+        tunnels.connect('vpn', '192.0.2.1', 22, 'me', 'secret', '', tunnel.SSH_TUNNEL)
+    assert 'vpn' not in tunnels
+    assert not tunnels.allocator.reserved
@@ -0,0 +1,32 @@
+import os
+
+from sshvpn import auth, registry, routes, supervisor, tunnel
+
+
+def many_networks(count):
+    return [f"10.{i // 256}.{i % 256}.0/24" for i in range(0, count * 2, 2)]
+
+
+def test_long_lists_go_to_files_the_caller_can_remove():
+    section = {'exclude': many_networks(routes.INLINE_LIMIT + 1), 'exclude_local': False}
+    temp_files = []
+    cmd = tunnel.build_command('192.0.2.1', 22, 'me', auth.Credentials(), '', tunnel.SSHUTTLE, None,
+                               section, temp_files)
+    assert len(temp_files) == 1
+    assert cmd[cmd.index('--exclude-from') + 1] == temp_files[0]
+    with open(temp_files[0]) as f:
+        assert len(f.read().split()) > routes.INLINE_LIMIT
+    routes.remove_files(temp_files)
+    assert not os.path.exists(temp_files[0])
+
+
+def test_forgetting_a_tunnel_removes_its_list_files(tmp_path):
+    path = tmp_path / 'subnets.txt'
+    path.write_text('10.0.0.0/8\n')
+    tunnels = registry.TunnelRegistry()
+    record = registry.TunnelRecord('vpn', tunnel.SSHUTTLE, None)
+    record.temp_files.append(str(path))
+    record.supervisor = supervisor.SupervisedTunnel('vpn', lambda: None)
+    tunnels.tunnels['vpn'] = record
+    assert tunnels.disconnect('vpn')
+    assert not path.exists()
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from sshvpn import benchmark, socks_lb, standby
+
+
+async def upper_after_eof(reader, writer):
+    """Reply only once the client has half-closed its side"""
+    data = await reader.read()
+    writer.write(data.upper())
+    await writer.drain()
+    writer.close()
+
+
+def test_pipe_half_closes_instead_of_closing():
+    async def run():
+        target = await asyncio.start_server(upper_after_eof, '127.0.0.1', 0)
+        target_port = target.sockets[0].getsockname()[1]
+
+        async def splice(reader, writer):
+            target_reader, target_writer = await asyncio.open_connection('127.0.0.1', target_port)
+            await asyncio.gather(socks_lb.pipe(reader, target_writer), socks_lb.pipe(target_reader, writer))
+            target_writer.close()
+            writer.close()
+
+        front = await asyncio.start_server(splice, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', front.sockets[0].getsockname()[1])
+        writer.write(b'half closed')
+        writer.write_eof()
+        reply = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        front.close()
+        target.close()
+        return reply
+
+    assert asyncio.run(run()) == b'HALF CLOSED'
+
+
+@pytest.fixture
+def target(loop):
+    server = loop.run(asyncio.start_server(benchmark.handle_target, '127.0.0.1', 0))
+    yield server.sockets[0].getsockname()
+    server.close()
+
+
+@pytest.mark.parametrize('make_balancer', [
+    lambda port: socks_lb.LoadBalancer(0, [socks_lb.Backend('a', port), socks_lb.Backend('b', port)]),
+    lambda port: _front_door(port),
+], ids=['balancer', 'front door'])
+def test_bulk_upload_through_balancer_gets_its_reply(loop, socks_port, target, make_balancer):
+    balancer = make_balancer(socks_port)
+    loop.run(balancer.start())
+    try:
+        listen_port = balancer._server.sockets[0].getsockname()[1]
+        result = asyncio.run(benchmark.bench_bulk(listen_port, target, 2_000_000, 4))
+    finally:
+        loop.run(balancer.close())
+    # Each stream half-closes after sending and waits for the byte count
+    assert result['bytes'] == 2_000_000
+    assert balancer.bytes_out >= 2_000_000
+
+
+def _front_door(port):
+    door = standby.FrontDoor(0)
+    door.switch('active', port)
+    return door
+
+
+def test_front_door_probes_the_active_vpns_ssh_port():
+    door = standby.FrontDoor(0)
+    door.switch('active', 1081, 2222)
+    assert door.active == 'active'
+    assert door.backends[0].probe_target == ('127.0.0.1', 2222)
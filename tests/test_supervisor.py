@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import threading
+import time
+
+from sshvpn import registry, supervisor
+
+SLEEPER = [sys.executable, '-c', 'import time; time.sleep(60)']
+
+
+def test_stop_during_launch_terminates_the_new_child():
+    launched = []
+    launching = threading.Event()
+
+    def launch():
+        launching.set()
+        time.sleep(0.5)
+        process = subprocess.Popen(SLEEPER)
+        launched.append(process)
+        return process
+
+    states = []
+    tunnel = supervisor.SupervisedTunnel('race', launch, on_event=lambda t, state, message: states.append(state))
+    tunnel.start()
+    assert launching.wait(5)
+    tunnel.stop(timeout=0.1)
+    tunnel._thread.join(5)
+
+    assert launched[0].wait(5) is not None
+    assert tunnel.state == supervisor.STOPPED
+    assert supervisor.RUNNING not in states
+
+
+def test_stop_terminates_the_running_child():
+    process = subprocess.Popen(SLEEPER)
+    tunnel = supervisor.SupervisedTunnel('running', lambda: subprocess.Popen(SLEEPER))
+    tunnel.start(process)
+    time.sleep(0.2)
+    assert tunnel.state == supervisor.RUNNING
+    tunnel.stop()
+    assert process.poll() is not None
+    assert tunnel.state == supervisor.STOPPED
+
+
+def test_disconnect_releases_the_port_after_the_child_is_gone():
+    tunnels = registry.TunnelRegistry()
+    record = registry.TunnelRecord('vpn', 'SSH Tunnel', tunnels.allocator.allocate(None))
+    tunnels.tunnels['vpn'] = record
+    reserved_during_stop = []
+
+    class Recorder(supervisor.SupervisedTunnel):
+        def stop(self, timeout=5):
+            reserved_during_stop.append(record.socks_port in tunnels.allocator.reserved)
+            super().stop(timeout)
+
+    record.supervisor = Recorder('vpn', lambda: None)
+    assert tunnels.disconnect('vpn')
+    assert reserved_during_stop == [True]
+    assert record.socks_port not in tunnels.allocator.reserved
+    assert not tunnels.disconnect('vpn')
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from sshvpn import auth, benchmark, readiness, transport
+from conftest import PASSWORD, free_port
+
+OPTIONS = '-o StrictHostKeyChecking=no'
+
+
+def make_tunnel(port, password=PASSWORD):
+    credentials = auth.Credentials(auth.PASSWORD, password)
+    return transport.InProcessTunnel('127.0.0.1', port, 'tester', credentials, free_port(), OPTIONS)
+
+
+def test_socks_traffic_through_in_process_tunnel(ssh_server):
+    port, _ = ssh_server
+    tunnel = make_tunnel(port)
+    tunnel.start(10)
+    try:
+        assert tunnel.poll() is None
+        assert readiness.socks5_handshake(tunnel.socks_port)
+        results = asyncio.run(benchmark.run_suite(tunnel.socks_port, 1_000_000, 2, 20, 5, 512))
+        assert results['bulk']['bytes'] == 1_000_000
+        assert results['requests']['errors'] == 0
+        stats = tunnel.stats()
+        assert stats['channels_total'] >= 22
+        assert tunnel.bytes_up >= 1_000_000
+    finally:
+        tunnel.terminate()
+    assert tunnel.wait(5) == 0
+    assert tunnel._watch_task.done()
+
+
+def test_wrong_password_is_not_ready(ssh_server):
+    port, _ = ssh_server
+    tunnel = make_tunnel(port, password='wrong')
+    with pytest.raises(readiness.TunnelNotReady):
+        tunnel.start(10)
+    assert tunnel.wait(5) is not None
+
+
+def test_server_closing_the_connection_ends_the_tunnel(ssh_server, loop):
+    port, connections = ssh_server
+    tunnel = make_tunnel(port)
+    tunnel.start(10)
+    for connection in connections:
+        loop.loop.call_soon_threadsafe(connection.close)
+    assert tunnel.wait(5) == 255
+    assert tunnel.poll() == 255